@@ -0,0 +1,455 @@
+"""
+Benchmark the clone -> analyze -> format -> enhance pipeline.
+
+A synthetic git repository is generated, then every stage is timed on its
+own, `--repeat` times, in a scratch directory that never touches the real
+caches. Enhancement runs against a local stub of the Ollama API.
+
+    python -m benchmarks.run --files 2000 --save benchmarks/baselines/2000.json
+    python -m benchmarks.run --files 2000 --compare benchmarks/baselines/2000.json
+
+With --compare, the exit status is 1 when a stage's median wall time is
+more than --tolerance slower than the baseline's.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from benchmarks.stub_ollama import StubOllama
+from benchmarks.synthetic import RepoSpec, generate_repo
+from utils.analyzer import CustomAnalyzer, shutdown_parse_pool
+from utils.cache import AnalysisCache, DiskCache
+from utils.enhancer import AIEnhancer
+from utils.mirrors import MirrorPool
+from utils.ollama import OllamaClient
+from utils.repository import normalize_repo_url, run_git
+from utils.retrieval import Embedder, module_documents, retrieval_available
+from utils.settings import BASE_DIR, DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Bump when stages or their metrics change; other versions are not compared
+BENCHMARK_VERSION = 1
+
+STAGES = (
+    "clone",
+    "analyze",
+    "analyze_warm",
+    "format",
+    "cache_set",
+    "cache_get_memory",
+    "cache_get_disk",
+    "enhance",
+    "embed",
+)
+
+
+def _reset_peak_rss() -> None:
+    """Reset the kernel's resident set high-water mark (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss() -> int:
+    """Peak resident set size in bytes, since the last reset where supported."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _directory_bytes(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Recorder:
+    """Wall time, peak RSS and units of work of every run of every stage."""
+
+    def __init__(self, stages: List[str]):
+        self.stages = stages
+        self.runs: Dict[str, List[Dict[str, Any]]] = {}
+
+    @contextmanager
+    def measure(self, name: str, work: float, unit: str) -> Iterator[Dict[str, Any]]:
+        """Time the block as one run of a stage; the block may update "work"."""
+        run = {"work": work, "unit": unit}
+        if name not in self.stages:
+            yield run
+            return
+        _reset_peak_rss()
+        start = time.perf_counter()
+        yield run
+        run["seconds"] = time.perf_counter() - start
+        run["peak_rss"] = _peak_rss()
+        self.runs.setdefault(name, []).append(run)
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        for name in STAGES:
+            runs = self.runs.get(name)
+            if not runs:
+                continue
+            seconds = [run["seconds"] for run in runs]
+            median = statistics.median(seconds)
+            work = statistics.median(run["work"] for run in runs)
+            results[name] = {
+                "runs": len(runs),
+                "median_s": round(median, 6),
+                "min_s": round(min(seconds), 6),
+                "max_s": round(max(seconds), 6),
+                "throughput": round(work / median, 2) if median else None,
+                "unit": f"{runs[0]['unit']}/s",
+                "work": work,
+                "peak_rss_mb": round(max(run["peak_rss"] for run in runs) / 2**20, 1),
+            }
+        return results
+
+
+def _analyzer(path: str, revision: Optional[str], repo_url: str) -> CustomAnalyzer:
+    return CustomAnalyzer(
+        path,
+        max_files=sys.maxsize,
+        ignore_tests=True,
+        ignore=DEFAULT_CONFIG["ignore_patterns"],
+        revision=revision,
+        repo_key=normalize_repo_url(repo_url),
+    )
+
+
+def run_benchmark(spec: RepoSpec, args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="cca-bench-")
+    # Scratch caches, so nothing is read from or left in the real ones
+    DEFAULT_CONFIG["cache_dir"] = os.path.join(workdir, "cache")
+    if args.parse_workers is not None:
+        DEFAULT_CONFIG["parse_workers"] = args.parse_workers
+    recorder = Recorder(args.stages)
+    pool: Optional[MirrorPool] = None
+    checkout = None
+    try:
+        repo = os.path.join(workdir, "repo")
+        print(f"Generating {spec.files} files in {repo}", file=sys.stderr)
+        size = generate_repo(repo, spec)
+        repo_url = f"file://{repo}"
+        files = size["files"]
+
+        # Clone: a cold mirror plus a worktree, in a fresh pool each run
+        for i in range(args.repeat):
+            if checkout is not None:
+                pool.release(checkout)
+            pool = MirrorPool(root=os.path.join(workdir, f"mirrors{i}"), max_bytes=0)
+            with recorder.measure("clone", files, "files"):
+                checkout = pool.acquire(repo_url, "main")
+        size["mirror_bytes"] = _directory_bytes(checkout.mirror)
+
+        # Analyze: parse and format every file, first without the parse cache
+        DEFAULT_CONFIG["parse_cache"] = False
+        for _ in range(args.repeat):
+            analyzer = _analyzer(checkout.path, checkout.revision, repo_url)
+            with recorder.measure("analyze", files, "files"):
+                analyzer.run_analysis()
+        DEFAULT_CONFIG["parse_cache"] = True
+        _analyzer(checkout.path, checkout.revision, repo_url).run_analysis()
+        for _ in range(args.repeat):
+            analyzer = _analyzer(checkout.path, checkout.revision, repo_url)
+            with recorder.measure("analyze_warm", files, "files"):
+                analyzer.run_analysis()
+        table = analyzer.table
+        size["symbols"] = len(table)
+
+        formatter = analyzer.get_formatter()
+        for _ in range(args.repeat):
+            with recorder.measure("format", files, "files"):
+                report = formatter.format(table)
+        size["report_chars"] = sum(
+            len(report[name]) for name in ("heading", "tree", "dependencies", "details")
+        )
+
+        # Cache: both tiers of AnalysisCache, over a dedicated SQLite file
+        disk = DiskCache(
+            os.path.join(workdir, "analysis.sqlite3"),
+            ttl=DEFAULT_CONFIG["cache_ttl"],
+        )
+        entries = args.cache_entries
+        keys = [f"bench:{i}" for i in range(entries)]
+        for _ in range(args.repeat):
+            cache = AnalysisCache(disk=disk)
+            with recorder.measure("cache_set", entries, "entries"):
+                for key in keys:
+                    cache.set(key, report, repo_url)
+            with recorder.measure("cache_get_memory", entries, "entries"):
+                for key in keys:
+                    cache.get(key)
+            cache = AnalysisCache(disk=disk)
+            with recorder.measure("cache_get_disk", entries, "entries"):
+                for key in keys:
+                    cache.get(key)
+
+        # Enhance: the full prompt flow against a local stub of the Ollama API
+        if {"enhance", "embed"} & set(args.stages):
+            _run_stub_stages(recorder, args, report, table)
+
+        return {
+            "benchmark_version": BENCHMARK_VERSION,
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": _package_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "spec": spec.to_dict(),
+            "repository": size,
+            "config": {
+                "repeat": args.repeat,
+                "parse_workers": DEFAULT_CONFIG["parse_workers"],
+                "cache_entries": args.cache_entries,
+                "enhancer_mode": args.enhancer_mode,
+                "stub_tokens": args.stub_tokens,
+                "stub_token_latency": args.stub_token_latency,
+            },
+            "stages": recorder.results(),
+        }
+    finally:
+        shutdown_parse_pool()
+        if checkout is not None:
+            pool.release(checkout)
+        if args.keep:
+            print(f"Kept {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _run_stub_stages(
+    recorder: Recorder, args: argparse.Namespace, report: Dict[str, Any], table
+) -> None:
+    loop = asyncio.new_event_loop()
+    with StubOllama(args.stub_tokens, args.stub_token_latency) as stub:
+        client = OllamaClient(host=stub.url)
+        try:
+            enhancer = AIEnhancer(
+                model="stub",
+                ollama_host=stub.url,
+                client=client,
+                stream=True,
+                cache=False,
+                mode=args.enhancer_mode,
+                max_prompt_chars=DEFAULT_CONFIG["enhancer_max_prompt_chars"],
+                map_concurrency=DEFAULT_CONFIG["enhancer_map_concurrency"],
+            )
+            for _ in range(args.repeat):
+                before = stub.stats["tokens"]
+                with recorder.measure("enhance", 0, "tokens") as run:
+                    result = loop.run_until_complete(enhancer.enhance(report))
+                if result.get("error"):
+                    raise RuntimeError(f"Enhancement failed: {result['error']}")
+                run["work"] = stub.stats["tokens"] - before
+
+            if "embed" in args.stages and retrieval_available():
+                embedder = Embedder(client, model="stub-embed")
+                texts = [text for _, text in module_documents(table)]
+                for _ in range(args.repeat):
+                    with recorder.measure("embed", len(texts), "modules"):
+                        loop.run_until_complete(embedder.embed(texts, memoize=False))
+        finally:
+            loop.run_until_complete(client.close())
+            # Like asyncio.run: finalize httpx's nested stream generators
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+
+def _package_revision() -> Optional[str]:
+    try:
+        return run_git(["rev-parse", "--short", "HEAD"], cwd=str(BASE_DIR))
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+def compare(
+    current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """Stages whose median wall time regressed by more than tolerance."""
+    if baseline.get("benchmark_version") != current["benchmark_version"]:
+        print("Baseline is from another benchmark version; not compared")
+        return []
+    if baseline.get("spec") != current["spec"]:
+        print("Warning: baseline was recorded with a different repository spec")
+
+    regressions = []
+    print(f"\n{'stage':<18}{'baseline s':>12}{'current s':>12}{'change':>10}")
+    for name, stage in current["stages"].items():
+        before = baseline.get("stages", {}).get(name)
+        if not before or not before["median_s"]:
+            continue
+        ratio = stage["median_s"] / before["median_s"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<18}{before['median_s']:>12.4f}{stage['median_s']:>12.4f}"
+            f"{ratio - 1:>+10.1%}{flag}"
+        )
+    return regressions
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    repository = results["repository"]
+    print(
+        f"{repository['files']} files, {repository['bytes']} bytes, "
+        f"{repository['symbols']} symbols; "
+        f"{results['config']['repeat']} runs per stage"
+    )
+    print(
+        f"\n{'stage':<18}{'median s':>10}{'min s':>10}"
+        f"{'throughput':>22}{'peak RSS MB':>13}"
+    )
+    for name, stage in results["stages"].items():
+        throughput = (
+            f"{stage['throughput']:.1f} {stage['unit']}"
+            if stage["throughput"] is not None
+            else "-"
+        )
+        print(
+            f"{name:<18}{stage['median_s']:>10.4f}{stage['min_s']:>10.4f}"
+            f"{throughput:>22}{stage['peak_rss_mb']:>13.1f}"
+        )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    defaults = RepoSpec()
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Benchmark each stage of the analysis pipeline",
+    )
+    parser.add_argument("--files", type=int, default=defaults.files)
+    parser.add_argument(
+        "--classes-per-file", type=int, default=defaults.classes_per_file
+    )
+    parser.add_argument(
+        "--methods-per-class", type=int, default=defaults.methods_per_class
+    )
+    parser.add_argument(
+        "--functions-per-file", type=int, default=defaults.functions_per_file
+    )
+    parser.add_argument("--depth", type=int, default=defaults.depth)
+    parser.add_argument(
+        "--packages-per-level", type=int, default=defaults.packages_per_level
+    )
+    parser.add_argument(
+        "--imports-per-file", type=int, default=defaults.imports_per_file
+    )
+    parser.add_argument("--js-ratio", type=float, default=defaults.js_ratio)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage")
+    parser.add_argument(
+        "--stages",
+        default=",".join(STAGES),
+        help=f"Comma-separated stages to record (default: all of {', '.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=None,
+        help="Parse pool size (default: CCA_PARSE_WORKERS)",
+    )
+    parser.add_argument(
+        "--cache-entries", type=int, default=50, help="Reports per cache run"
+    )
+    parser.add_argument(
+        "--enhancer-mode",
+        default="auto",
+        choices=("auto", "single", "map_reduce"),
+    )
+    parser.add_argument(
+        "--stub-tokens", type=int, default=200, help="Tokens per stub generation"
+    )
+    parser.add_argument(
+        "--stub-token-latency",
+        type=float,
+        default=0.0,
+        help="Seconds the stub waits per generated token",
+    )
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare against this JSON baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown against the baseline (default: 0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the scratch directory"
+    )
+    args = parser.parse_args(argv)
+    args.stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+    args.repeat = max(args.repeat, 1)
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    spec = RepoSpec(
+        files=args.files,
+        classes_per_file=args.classes_per_file,
+        methods_per_class=args.methods_per_class,
+        functions_per_file=args.functions_per_file,
+        depth=args.depth,
+        packages_per_level=args.packages_per_level,
+        imports_per_file=args.imports_per_file,
+        js_ratio=args.js_ratio,
+        seed=args.seed,
+    )
+    results = run_benchmark(spec, args)
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""A local stand-in for the Ollama HTTP API, so enhancement can be timed offline."""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+EMBEDDING_DIM = 256
+
+WORD_RE = re.compile(r"[a-z]+")
+
+
+class StubOllama:
+    """
+    Serves /api/generate (streamed or not) and /api/embed on a free local
+    port. Every generation answers with a JSON object of `tokens` tokens,
+    followed by `trailing` tokens of chatter, one NDJSON line per token
+    when streaming, after `token_latency` seconds per token. Embeddings
+    are hashed bags of words, so similar texts get similar vectors.
+    """
+
+    def __init__(
+        self, tokens: int = 200, token_latency: float = 0.0, trailing: int = 0
+    ):
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.trailing = trailing
+        self.stats: Dict[str, int] = {
+            "generate_requests": 0,
+            "embed_requests": 0,
+            "prompt_chars": 0,
+            "tokens": 0,
+            "embedded": 0,
+        }
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubOllama":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def response_tokens(self) -> List[str]:
+        words = [f" word{i}" for i in range(max(self.tokens - 2, 0))]
+        return ['{"summary": "', *words, '"}', *[" Hope this helps!"] * self.trailing]
+
+    @staticmethod
+    def embedding(text: str) -> List[float]:
+        vector = [0.0] * EMBEDDING_DIM
+        for word in WORD_RE.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % EMBEDDING_DIM] += 1.0
+        return vector
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                payload = json.loads(body or b"{}")
+                if self.path == "/api/generate":
+                    self._generate(payload)
+                elif self.path == "/api/embed":
+                    self._embed(payload)
+                else:
+                    self.send_error(404)
+
+            def _generate(self, payload: Dict) -> None:
+                tokens = stub.response_tokens()
+                stub._count(
+                    generate_requests=1,
+                    prompt_chars=len(payload.get("prompt", "")),
+                )
+                if not payload.get("stream", True):
+                    time.sleep(stub.token_latency * len(tokens))
+                    stub._count(tokens=len(tokens))
+                    self._send_json({"response": "".join(tokens), "done": True})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i, token in enumerate(tokens):
+                        time.sleep(stub.token_latency)
+                        line = json.dumps(
+                            {"response": token, "done": i == len(tokens) - 1}
+                        )
+                        self._chunk(f"{line}\n".encode())
+                        stub._count(tokens=1)
+                    self._chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client stops reading once the JSON object closes
+                    pass
+
+            def _embed(self, payload: Dict) -> None:
+                inputs = payload.get("input", [])
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                stub._count(embed_requests=1, embedded=len(inputs))
+                self._send_json(
+                    {
+                        "model": payload.get("model"),
+                        "embeddings": [stub.embedding(text) for text in inputs],
+                    }
+                )
+
+            def _chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, value: Dict) -> None:
+                data = json.dumps(value).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
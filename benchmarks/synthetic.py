@@ -0,0 +1,148 @@
+"""Deterministic synthetic git repositories for the benchmarks."""
+
+import os
+import random
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+from utils.repository import run_git
+
+WORDS = (
+    "cache config parse token report module graph symbol batch queue "
+    "stage mirror commit index vector score render filter schedule job"
+).split()
+
+
+@dataclass
+class RepoSpec:
+    files: int = 200
+    classes_per_file: int = 3
+    methods_per_class: int = 5
+    functions_per_file: int = 4
+    depth: int = 2  # directory levels below the root
+    packages_per_level: int = 4
+    imports_per_file: int = 3  # imports of other generated modules
+    js_ratio: float = 0.1  # share of files written as JavaScript
+    seed: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _name(rng: random.Random, parts: int = 2) -> str:
+    return "_".join(rng.choice(WORDS) for _ in range(parts))
+
+
+def _directories(spec: RepoSpec) -> List[str]:
+    """Every package directory, `depth` levels deep, root first."""
+    level = [""]
+    directories = [""]
+    for _ in range(spec.depth):
+        level = [
+            os.path.join(parent, f"pkg{i}")
+            for parent in level
+            for i in range(spec.packages_per_level)
+        ]
+        directories.extend(level)
+    return directories
+
+
+def _python_module(
+    spec: RepoSpec, rng: random.Random, index: int, imports: List[str]
+) -> str:
+    lines = [f'"""Synthetic module {index}."""', ""]
+    lines += [f"import {module}" for module in imports]
+    lines += ["", f"LIMIT_{index} = {rng.randint(1, 1000)}", ""]
+    for f in range(spec.functions_per_file):
+        name = f"{_name(rng)}_{f}"
+        lines += [
+            "",
+            f"def {name}(value, *, retries: int = 3) -> int:",
+            f'    """{name.replace("_", " ").capitalize()} for the given value."""',
+            "    return value + retries",
+            "",
+        ]
+    for c in range(spec.classes_per_file):
+        base = "Exception" if c % 4 == 3 else "object"
+        class_name = f"{_name(rng, 1).capitalize()}{_name(rng, 1).capitalize()}{c}"
+        lines += ["", f"class {class_name}({base}):", f'    """A {class_name}."""', ""]
+        for m in range(spec.methods_per_class):
+            method = f"{_name(rng)}_{m}"
+            lines += [
+                f"    def {method}(self, item, limit=None):",
+                f'        """{method.replace("_", " ").capitalize()}."""',
+                "        return item",
+                "",
+            ]
+    return "\n".join(lines) + "\n"
+
+
+def _js_module(spec: RepoSpec, rng: random.Random, imports: List[str]) -> str:
+    lines = [f"import {{ helper }} from './{module}';" for module in imports]
+    for f in range(spec.functions_per_file):
+        lines.append(f"export function {_name(rng).replace('_', '')}{f}(value) {{")
+        lines.append("  return value;")
+        lines.append("}")
+    for c in range(spec.classes_per_file):
+        lines.append(f"class {_name(rng, 1).capitalize()}{c} {{")
+        lines.append("  render() { return null; }")
+        lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_repo(path: str, spec: RepoSpec) -> Dict[str, int]:
+    """
+    Write spec.files modules spread over a package tree under path, commit
+    them on branch main and return the file and byte counts. The same
+    spec always produces the same tree.
+    """
+    rng = random.Random(spec.seed)
+    directories = _directories(spec)
+    os.makedirs(path, exist_ok=True)
+    for directory in directories[1:]:
+        os.makedirs(os.path.join(path, directory), exist_ok=True)
+        with open(os.path.join(path, directory, "__init__.py"), "w") as f:
+            f.write("")
+
+    python_modules: List[str] = []
+    js_modules: Dict[str, List[str]] = {}
+    total_bytes = 0
+    for index in range(spec.files):
+        directory = directories[index % len(directories)]
+        if rng.random() < spec.js_ratio:
+            # Relative imports of earlier scripts in the same directory
+            siblings = js_modules.setdefault(directory, [])
+            imports = rng.sample(siblings, min(len(siblings), spec.imports_per_file))
+            source = _js_module(spec, rng, imports)
+            siblings.append(f"m{index}")
+            rel_path = os.path.join(directory, f"m{index}.js")
+        else:
+            imports = rng.sample(
+                python_modules, min(len(python_modules), spec.imports_per_file)
+            )
+            source = _python_module(spec, rng, index, imports)
+            python_modules.append(
+                ".".join([*directory.split(os.sep), f"m{index}"]).lstrip(".")
+            )
+            rel_path = os.path.join(directory, f"m{index}.py")
+        with open(os.path.join(path, rel_path), "w") as f:
+            f.write(source)
+        total_bytes += len(source)
+
+    run_git(["init", "-q", "-b", "main"], cwd=path)
+    run_git(["add", "-A"], cwd=path, timeout=600)
+    run_git(
+        [
+            "-c",
+            "user.name=bench",
+            "-c",
+            "user.email=bench@localhost",
+            "commit",
+            "-q",
+            "-m",
+            "Synthetic repository",
+        ],
+        cwd=path,
+        timeout=600,
+    )
+    return {"files": spec.files + len(directories) - 1, "bytes": total_bytes}
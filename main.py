@@ -1,33 +1,128 @@
 import asyncio
+import bisect
+import difflib
 import functools
+import hashlib
+import json
 import logging
 import os
 import time
+from contextlib import asynccontextmanager
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
-from code_context_analyzer.repo_system import RepositorySession
 from mcp.server.fastmcp import Context, FastMCP
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 
-from utils.analyzer import CustomAnalyzer
-from utils.cache import AnalysisCache
+from utils.analyzer import CustomAnalyzer, shutdown_parse_pool
+from utils.cache import AnalysisCache, build_cache_key, get_store
 from utils.enhancer import AIEnhancer
+from utils.formatter import (
+    estimate_tokens,
+    first_page_room,
+    paginate,
+    paginate_block,
+    tokenizer_name,
+)
+from utils.imports import ImportGraph
+from utils.jobs import FAILED, FINISHED, SUCCEEDED, JobQueue, QueueFullError
+from utils.metrics import metrics, resident_memory_bytes
+from utils.mirrors import Checkout, MirrorPool
+from utils.models import BatchTarget
+from utils.ollama import OllamaClient
+from utils.repository import (
+    is_remote_url,
+    normalize_repo_url,
+    normalize_subpath,
+    resolve_revision,
+)
+from utils.retrieval import (
+    DOCUMENT_VERSION,
+    Embedder,
+    VectorStore,
+    module_documents,
+    retrieval_available,
+    top_k,
+)
+from utils.scheduler import (
+    PRIORITY_ANALYSIS,
+    PRIORITY_DIRECTORY,
+    PRIORITY_OVERVIEW,
+    Scheduler,
+    WaitCallback,
+)
 from utils.settings import DEFAULT_CONFIG
+from utils.singleflight import ProgressCallback, SingleFlight
+from utils.symbols import KIND_NAMES, SYMBOL_KINDS, SymbolIndex, SymbolTable
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Initialize cache
+cache = AnalysisCache()
+
+# Bare mirrors of remote repositories, shared by every tool
+mirrors = MirrorPool()
+
+# In-flight analyses, keyed like the cache
+inflight = SingleFlight()
+
+# Pooled connections to the Ollama host, shared by every enhancement
+ollama = OllamaClient()
+
+# Background analyses submitted through submit_analysis
+jobs = JobQueue()
+
+# Per-stage admission control for clone, parse and enhance work
+scheduler = Scheduler()
+
+# Per-commit symbol tables behind find_symbol and list_module_symbols
+symbols = SymbolIndex()
+
+# Module embeddings behind search_context, memoized by content and per commit
+embedder = Embedder(ollama)
+vectors = VectorStore()
+
+# Analysis parameters that decide which files are parsed
+INDEX_PARAMS = (
+    "max_files",
+    "ignore_tests",
+    "ignore_patterns",
+    "include_patterns",
+    "exclude_patterns",
+)
+
+
+@asynccontextmanager
+async def lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Release long-lived resources when the server shuts down."""
+    try:
+        yield
+    finally:
+        await jobs.stop()
+        await ollama.close()
+        shutdown_parse_pool()
+
+
 # Create an MCP server
 mcp = FastMCP(
     name="Code Context Analyzer (CCA)",
     host=DEFAULT_CONFIG["server_host"],
     port=DEFAULT_CONFIG["server_port"],
+    lifespan=lifespan,
 )
 
-# Initialize cache
-cache = AnalysisCache()
-
 
 class AnalysisType(Enum):
     FULL_REPO = "full_repository"
@@ -42,9 +137,12 @@ async def analyze_repository(
     max_files: int = 1000,
     ignore_tests: bool = True,
     ignore_patterns: List[str] = [],
+    include_patterns: List[str] = [],
+    exclude_patterns: List[str] = [],
     use_cache: bool = True,
     enhance_with_ai: bool = True,
     model: str = DEFAULT_CONFIG["model"],
+    token_budget: Optional[int] = None,
     ctx: Context = None,
 ) -> Dict[str, Any]:
     """
@@ -54,57 +152,394 @@ async def analyze_repository(
     -param branch: Branch to analyze (default: "main")
     -param max_files: Maximum number of files to process
     -param ignore_tests: Whether to ignore test files
-    -param include_patterns: File patterns to include in analysis
-    -param exclude_patterns: File patterns to exclude from analysis
+    -param ignore_patterns: Additional glob patterns to ignore
+    -param include_patterns: Gitignore-style patterns; only matching files are analyzed
+    -param exclude_patterns: Gitignore-style patterns to exclude ("!" re-includes)
     -param use_cache: Whether to use cached results if available
     -param enhance_with_ai: Whether to enhance with AI insights
     -param model: AI model to use for enhancement
+    -param token_budget: Return the report as pages of at most this many tokens,
+        most important packages first; fetch further pages with get_report_page
 
     -return: Structured analysis results with repository context
     """
-    await ctx.report_progress(0, 100, "Starting repository analysis")
-
     try:
-        # Check cache first
-        cache_key = f"{repo_url}:{branch}:{max_files}"
-        if use_cache:
-            cached_result = cache.get(cache_key)
-            if cached_result:
-                await ctx.report_progress(100, 100, "Returning cached results")
-                return cached_result
-
-        await ctx.report_progress(10, 100, "Cloning repository")
-        with RepositorySession(repo_url, branch) as session:
-            await ctx.report_progress(30, 100, "Analyzing code structure")
+        params = _analysis_params(
+            max_files,
+            ignore_tests,
+            ignore_patterns,
+            include_patterns,
+            exclude_patterns,
+            enhance_with_ai,
+            model,
+        )
+        result = await _analyze(
+            repo_url, branch, params, use_cache, ctx.report_progress
+        )
+        if token_budget and "error" not in result:
+            return await _paginated(result, token_budget)
+        return result
+
+    except Exception as e:
+        logger.error(f"Analysis failed: {str(e)}")
+        await ctx.report_progress(100, 100, f"Error: {str(e)}")
+        return {"error": str(e), "repo_url": repo_url}
+
+
+def _report_pages():
+    return get_store(
+        "report_pages",
+        ttl=DEFAULT_CONFIG["cache_ttl"],
+        max_bytes=DEFAULT_CONFIG["report_pages_max_bytes"],
+    )
+
+
+async def _paginated(result: Dict[str, Any], token_budget: int) -> Dict[str, Any]:
+    """
+    First page of a report laid out under token_budget. The remaining pages
+    are stored for get_report_page, so paging never re-runs the analysis.
+    An AI enhancement too large to share the first page is sent as pages
+    of its own ahead of the report instead.
+    """
+    extras = {key: result[key] for key in ("ai_enhancement",) if key in result}
+    reserved = estimate_tokens(json.dumps(extras)) if extras else 0
+    if reserved > first_page_room(token_budget):
+        enhancement = paginate_block(
+            "AI Enhancement",
+            json.dumps(extras["ai_enhancement"], indent=2),
+            token_budget,
+        )
+        pages = enhancement + paginate(result, token_budget)
+        extras = {"ai_enhancement_pages": len(enhancement)}
+    else:
+        pages = paginate(result, token_budget, reserved)
+    report_id = hashlib.sha256(
+        json.dumps(
+            [
+                result.get(key)
+                for key in ("heading", "tree", "details", "ranking", "ai_enhancement")
+            ]
+            + [token_budget],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()[:32]
+
+    stored = len(pages) == 1
+    if not stored:
+        store = _report_pages()
+        if store is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, store.set, report_id, pages)
+            stored = True
+        else:
+            logger.warning("Disk cache disabled; later report pages are dropped")
+    return {**_page(report_id, pages, 0, stored), **extras}
+
+
+def _page(
+    report_id: str, pages: List[str], index: int, resumable: bool = True
+) -> Dict[str, Any]:
+    has_next = index + 1 < len(pages)
+    return {
+        "page": pages[index],
+        "page_index": index,
+        "pages": len(pages),
+        "tokens": estimate_tokens(pages[index]),
+        "tokenizer": tokenizer_name(),
+        "next_cursor": f"{report_id}:{index + 1}" if has_next and resumable else None,
+        "truncated": has_next and not resumable,
+    }
+
+
+def _analysis_params(
+    max_files: int,
+    ignore_tests: bool,
+    ignore_patterns: List[str],
+    include_patterns: List[str],
+    exclude_patterns: List[str],
+    enhance_with_ai: bool,
+    model: str,
+) -> Dict[str, Any]:
+    """Every parameter that affects the result; hashed into the cache key."""
+    return {
+        "max_files": max_files,
+        "ignore_tests": ignore_tests,
+        "ignore_patterns": sorted(set(ignore_patterns)),
+        # Order matters for "!" rules, so these are kept as given
+        "include_patterns": list(include_patterns),
+        "exclude_patterns": list(exclude_patterns),
+        "enhance_with_ai": enhance_with_ai,
+        "model": model if enhance_with_ai else None,
+    }
+
+
+async def _analyze(
+    repo_url: str,
+    branch: str,
+    params: Dict[str, Any],
+    use_cache: bool,
+    progress: ProgressCallback,
+) -> Dict[str, Any]:
+    """Serve an analysis from the cache, an in-flight job or a new job."""
+    await progress(0, 100, "Starting repository analysis")
+    loop = asyncio.get_event_loop()
+
+    # Resolve the commit cheaply so the cache can hit before cloning
+    revision = await loop.run_in_executor(None, resolve_revision, repo_url, branch)
+    cache_key = build_cache_key(repo_url, branch, revision, params)
+    if use_cache:
+        cached_result = await loop.run_in_executor(None, cache.get, cache_key)
+        if cached_result:
+            await progress(100, 100, "Returning cached results")
+            return cached_result
+
+    # Identical concurrent requests share one clone, analysis and prompt
+    async def run(publish: ProgressCallback) -> Dict[str, Any]:
+        return await _analyze_repository_job(
+            repo_url, branch, revision, params, publish
+        )
+
+    return await inflight.do(cache_key, run, progress)
+
+
+async def _analyze_repository_job(
+    repo_url: str,
+    branch: str,
+    revision: Optional[str],
+    params: Dict[str, Any],
+    progress: ProgressCallback,
+) -> Dict[str, Any]:
+    """Clone, analyze, enhance and cache one repository; shared by waiters."""
+    cache_key = build_cache_key(repo_url, branch, revision, params)
+
+    await progress(10, 100, "Cloning repository")
+    clone_slot = scheduler.stage(
+        "clone", PRIORITY_ANALYSIS, _report_queued(progress, 10, "clone")
+    )
+    async with mirrors.open_async(repo_url, branch, clone_slot) as session:
+        # The branch may have moved between ls-remote and fetch
+        if session.revision != revision:
+            cache_key = build_cache_key(repo_url, branch, session.revision, params)
+        return await _analyze_checkout(repo_url, session, params, cache_key, progress)
+
+
+async def _analyze_checkout(
+    repo_url: str,
+    session: Checkout,
+    params: Dict[str, Any],
+    cache_key: str,
+    progress: ProgressCallback,
+) -> Dict[str, Any]:
+    """Analyze, enhance and cache a whole repository that is checked out."""
+    loop = asyncio.get_event_loop()
+    await progress(30, 100, "Analyzing code structure")
+
+    analyzer = CustomAnalyzer(
+        session.path,
+        max_files=params["max_files"],
+        ignore_tests=params["ignore_tests"],
+        ignore=params["ignore_patterns"],
+        include_patterns=params["include_patterns"],
+        exclude_patterns=params["exclude_patterns"],
+        revision=session.revision,
+        repo_key=normalize_repo_url(repo_url),
+    )
+
+    # Run analysis in thread pool
+    async with scheduler.stage(
+        "parse", PRIORITY_ANALYSIS, _report_queued(progress, 30, "parse")
+    ):
+        result = await loop.run_in_executor(None, analyzer.run_analysis)
+    await loop.run_in_executor(
+        None, _index_symbols, repo_url, session, params, analyzer.table
+    )
+
+    if params["enhance_with_ai"]:
+        await progress(70, 100, "Enhancing with AI insights")
+
+        # Map streamed tokens onto the 70-90% band
+        async def report_tokens(tokens: int) -> None:
+            done = min(tokens / DEFAULT_CONFIG["enhancer_expected_tokens"], 1.0)
+            await progress(
+                70 + 19 * done, 100, f"Enhancing with AI insights ({tokens} tokens)"
+            )
+
+        enhancer = AIEnhancer(
+            model=params["model"],
+            ollama_host=DEFAULT_CONFIG["ollama_host"],
+            timeout=DEFAULT_CONFIG["enhancer_timeout"],
+            stream=DEFAULT_CONFIG["enhancer_stream"],
+            client=ollama,
+            mode=DEFAULT_CONFIG["enhancer_mode"],
+            max_prompt_chars=DEFAULT_CONFIG["enhancer_max_prompt_chars"],
+            map_concurrency=DEFAULT_CONFIG["enhancer_map_concurrency"],
+        )
+        async with scheduler.stage(
+            "enhance", PRIORITY_ANALYSIS, _report_queued(progress, 70, "enhance")
+        ):
+            enhanced_result = await enhancer.enhance(result, progress=report_tokens)
+        result["ai_enhancement"] = enhanced_result
+
+    # Cache the result
+    await progress(90, 100, "Caching results")
+    await loop.run_in_executor(None, cache.set, cache_key, result, repo_url)
+
+    await progress(100, 100, "Analysis complete")
+    return result
+
+
+async def _analyze_subtree(
+    repo_url: str,
+    session: Checkout,
+    subpath: str,
+    params: Dict[str, Any],
+    max_depth: Optional[int],
+    progress: ProgressCallback,
+) -> Dict[str, Any]:
+    """Analyze one directory of a checkout; results are not cached."""
+    tg_path = os.path.join(session.path, subpath)
+    if not os.path.isdir(tg_path):
+        raise ValueError(f"Directory not found in repository: {subpath}")
+    await progress(40, 100, f"Analyzing directory >> {tg_path}")
+    analyzer = CustomAnalyzer(
+        tg_path,
+        max_files=params["max_files"],
+        ignore_tests=params["ignore_tests"],
+        ignore=params["ignore_patterns"],
+        revision=session.revision,
+        repo_root=session.path,
+        include_patterns=params["include_patterns"],
+        exclude_patterns=params["exclude_patterns"],
+        repo_key=normalize_repo_url(repo_url),
+        max_depth=max_depth,
+    )
+    loop = asyncio.get_event_loop()
+
+    async with scheduler.stage(
+        "parse", PRIORITY_DIRECTORY, _report_queued(progress, 40, "parse")
+    ):
+        return await loop.run_in_executor(None, analyzer.run_analysis)
+
+
+def _index_key(
+    repo_url: str, revision: Optional[str], params: Dict[str, Any]
+) -> Optional[str]:
+    """Symbol index key; only committed trees are indexed."""
+    if not revision:
+        return None
+    return build_cache_key(
+        repo_url, "", revision, {key: params[key] for key in INDEX_PARAMS}
+    )
+
+
+def _index_symbols(
+    repo_url: str,
+    session: Checkout,
+    params: Dict[str, Any],
+    table: Optional[SymbolTable],
+) -> Optional[SymbolTable]:
+    """Store the symbols of a whole-repository analysis in the index."""
+    if table is None:
+        return None
+    # Discovered paths are resolved, so the root must be too
+    table = table.relative_to(os.path.realpath(session.path))
+    key = _index_key(repo_url, session.revision, params)
+    if key:
+        symbols.set(key, table, repo=normalize_repo_url(repo_url))
+    return table
+
 
+async def _symbol_table(
+    repo_url: str, branch: str, params: Dict[str, Any], progress: ProgressCallback
+) -> Tuple[SymbolTable, Optional[str]]:
+    """
+    The indexed symbols of a repository's commit, and the commit. A missing
+    table is built by parsing a checkout, without formatting or enhancing.
+    """
+    loop = asyncio.get_event_loop()
+    revision = await loop.run_in_executor(None, resolve_revision, repo_url, branch)
+    key = _index_key(repo_url, revision, params)
+    table = await loop.run_in_executor(None, symbols.get, key) if key else None
+    if table is not None:
+        return table, revision
+
+    async def run(publish: ProgressCallback) -> Tuple[SymbolTable, Optional[str]]:
+        await publish(10, 100, "Indexing symbols")
+        clone_slot = scheduler.stage(
+            "clone", PRIORITY_DIRECTORY, _report_queued(publish, 10, "clone")
+        )
+        async with mirrors.open_async(repo_url, branch, clone_slot) as session:
             analyzer = CustomAnalyzer(
                 session.path,
-                max_files=max_files,
-                ignore_tests=ignore_tests,
-                ignore=ignore_patterns,
+                max_files=params["max_files"],
+                ignore_tests=params["ignore_tests"],
+                ignore=params["ignore_patterns"],
+                include_patterns=params["include_patterns"],
+                exclude_patterns=params["exclude_patterns"],
+                revision=session.revision,
+                repo_key=normalize_repo_url(repo_url),
             )
+            async with scheduler.stage(
+                "parse", PRIORITY_DIRECTORY, _report_queued(publish, 40, "parse")
+            ):
+                await publish(40, 100, "Parsing files")
+                table = await loop.run_in_executor(None, analyzer.parse_symbols)
+            table = await loop.run_in_executor(
+                None, _index_symbols, repo_url, session, params, table
+            )
+            return table, session.revision
 
-            # Run analysis in thread pool
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, analyzer.run_analysis)
+    return await inflight.do(f"symbols:{key or repo_url + '@' + branch}", run, progress)
 
-            if enhance_with_ai:
-                await ctx.report_progress(70, 100, "Enhancing with AI insights")
-                enhancer = AIEnhancer(model=model)
-                enhanced_result = await enhancer.enhance(result)
-                result["ai_enhancement"] = enhanced_result
 
-            # Cache the result
-            await ctx.report_progress(90, 100, "Caching results")
-            cache.set(cache_key, result)
+async def _module_vectors(
+    repo_url: str,
+    params: Dict[str, Any],
+    table: SymbolTable,
+    revision: Optional[str],
+    progress: ProgressCallback,
+) -> Tuple[Any, List[str]]:
+    """
+    The embedding matrix of an indexed table's modules and the path of each
+    row, computed once per commit and model. Only modules whose details
+    are new to the embeddings cache are sent to the Ollama host.
+    """
+    loop = asyncio.get_event_loop()
+    index_key = _index_key(repo_url, revision, params)
+    key = f"{index_key}:{embedder.model}:{DOCUMENT_VERSION}" if index_key else None
+    found = await loop.run_in_executor(None, vectors.get, key) if key else None
+    if found is not None:
+        return found
 
-            await ctx.report_progress(100, 100, "Analysis complete")
-            return result
+    async def run(publish: ProgressCallback) -> Tuple[Any, List[str]]:
+        await publish(50, 100, "Embedding modules")
+        documents = await loop.run_in_executor(None, module_documents, table)
 
-    except Exception as e:
-        logger.error(f"Analysis failed: {str(e)}")
-        await ctx.report_progress(100, 100, f"Error: {str(e)}")
-        return {"error": str(e), "repo_url": repo_url}
+        async def embedded(done: int, total: int) -> None:
+            await publish(
+                50 + 40 * done / total, 100, f"Embedded {done}/{total} modules"
+            )
+
+        matrix = await embedder.embed([text for _, text in documents], embedded)
+        paths = [table.path(module) for module, _ in documents]
+        if key is None:
+            return matrix, paths
+        return await loop.run_in_executor(
+            None, vectors.set, key, matrix, paths, normalize_repo_url(repo_url)
+        )
+
+    return await inflight.do(f"vectors:{key or repo_url}", run, progress)
+
+
+def _report_queued(
+    progress: ProgressCallback, value: float, stage: str
+) -> WaitCallback:
+    """Tell the caller that a stage is at capacity and the request is queued."""
+
+    async def on_wait(queued: int) -> None:
+        await progress(value, 100, f"Waiting for a free {stage} slot ({queued} queued)")
+
+    return on_wait
 
 
 @mcp.tool()
@@ -114,6 +549,9 @@ async def analyze_directory(
     branch: str = "main",
     max_depth: int = 3,
     ignore_patterns: Optional[List[str]] = None,
+    include_patterns: Optional[List[str]] = None,
+    exclude_patterns: Optional[List[str]] = None,
+    token_budget: Optional[int] = None,
     ctx: Context = None,
 ) -> Dict[str, Any]:
     """
@@ -122,9 +560,12 @@ async def analyze_directory(
     -param repo_url: GitHub URL or local path to repository
     -param directory_path: Path to directory within repository
     -param branch: Branch to analyze (default: "main")
-    -param max_depth: Maximum depth to traverse in directory
-    -param include_patterns: File patterns to include in analysis
-    -param exclude_patterns: File patterns to exclude from analysis
+    -param max_depth: Directory levels below directory_path to descend into
+    -param ignore_patterns: Additional glob patterns to ignore
+    -param include_patterns: Gitignore-style patterns; only matching files are analyzed
+    -param exclude_patterns: Gitignore-style patterns to exclude ("!" re-includes)
+    -param token_budget: Return the report as pages of at most this many tokens,
+        most important packages first; fetch further pages with get_report_page
     -return: Structured analysis results for the specific directory
     """
 
@@ -132,24 +573,34 @@ async def analyze_directory(
         await ctx.report_progress(
             0, 100, f"Starting directory analysis: {directory_path}"
         )
-        with RepositorySession(repo_url, branch) as session:
+        subpath = normalize_subpath(directory_path)
+        clone_slot = scheduler.stage(
+            "clone",
+            PRIORITY_DIRECTORY,
+            _report_queued(ctx.report_progress, 0, "clone"),
+        )
+        # Only the target subtree is checked out (and, for a new mirror,
+        # downloaded)
+        async with mirrors.open_async(
+            repo_url, branch, clone_slot, sparse_paths=[subpath] if subpath else None
+        ) as session:
             await ctx.report_progress(30, 100, "Analyzing directory structure")
-
-            tg_path = os.path.join(session.path, directory_path)
-            await ctx.report_progress(40, 100, f"Analyzing directory >> {tg_path}")
-            analyzer = CustomAnalyzer(
-                tg_path,
-                max_files=500,  # Lower limit for directory analysis
-                ignore_tests=True,
-                ignore=ignore_patterns,
-                # target_path=directory_path,
-                # max_depth=max_depth
+            params = _analysis_params(
+                500,  # Lower limit for directory analysis
+                True,
+                ignore_patterns or [],
+                include_patterns or [],
+                exclude_patterns or [],
+                False,
+                None,
+            )
+            result = await _analyze_subtree(
+                repo_url, session, subpath, params, max_depth, ctx.report_progress
             )
-            loop = asyncio.get_event_loop()
-
-            result = await loop.run_in_executor(None, analyzer.run_analysis)
 
             await ctx.report_progress(100, 100, "Directory analysis complete")
+            if token_budget:
+                return await _paginated(result, token_budget)
             return result
 
     except Exception as e:
@@ -158,30 +609,246 @@ async def analyze_directory(
         return {"error": str(e), "repo_url": repo_url, "directory": directory_path}
 
 
+@mcp.tool()
+async def analyze_batch(
+    targets: List[BatchTarget],
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ignore_patterns: List[str] = [],
+    include_patterns: List[str] = [],
+    exclude_patterns: List[str] = [],
+    use_cache: bool = True,
+    enhance_with_ai: bool = False,
+    model: str = DEFAULT_CONFIG["model"],
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    Analyze several repositories or directories in one call.
+
+    -param targets: Repositories to analyze, each with repo_url, optional branch
+        (default "main") and optional directory (whole repository if omitted)
+    -param max_files: Maximum number of files to process per target
+    -param ignore_tests: Whether to ignore test files
+    -param ignore_patterns: Additional glob patterns to ignore
+    -param include_patterns: Gitignore-style patterns; only matching files are analyzed
+    -param exclude_patterns: Gitignore-style patterns to exclude ("!" re-includes)
+    -param use_cache: Whether to use cached results for whole repositories
+    -param enhance_with_ai: Whether to enhance whole-repository targets with AI insights
+    -param model: AI model to use for enhancement
+    -return: One entry per target, in order, each with its result or error
+    """
+    if len(targets) > DEFAULT_CONFIG["batch_max_targets"]:
+        return {
+            "error": f"Too many targets: {len(targets)} "
+            f"(at most {DEFAULT_CONFIG['batch_max_targets']})"
+        }
+    params = _analysis_params(
+        max_files,
+        ignore_tests,
+        ignore_patterns,
+        include_patterns,
+        exclude_patterns,
+        enhance_with_ai,
+        model,
+    )
+
+    # Targets in the same repository and branch share one checkout
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for index, target in enumerate(targets):
+        key = (normalize_repo_url(target.repo_url), target.branch)
+        groups.setdefault(key, []).append(index)
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(targets)
+    await ctx.report_progress(
+        0,
+        len(targets),
+        f"Analyzing {len(targets)} targets in {len(groups)} repositories",
+    )
+
+    async def finish(index: int, outcome: Dict[str, Any]) -> None:
+        target = targets[index]
+        results[index] = {
+            "repo_url": target.repo_url,
+            "branch": target.branch,
+            "directory": target.directory,
+            **outcome,
+        }
+        done = sum(result is not None for result in results)
+        label = target.repo_url + (f" {target.directory}" if target.directory else "")
+        await ctx.report_progress(
+            done, len(targets), f"Finished {label} ({done}/{len(targets)})"
+        )
+
+    limit = asyncio.Semaphore(DEFAULT_CONFIG["batch_concurrency"])
+
+    async def run_group(indexes: List[int]) -> None:
+        async with limit:
+            await _analyze_batch_group(
+                [(index, targets[index]) for index in indexes],
+                params,
+                use_cache,
+                finish,
+            )
+
+    await asyncio.gather(*(run_group(indexes) for indexes in groups.values()))
+    return {
+        "targets": results,
+        "repositories": len(groups),
+        "succeeded": sum(result["status"] == SUCCEEDED for result in results),
+        "failed": sum(result["status"] == FAILED for result in results),
+    }
+
+
+async def _analyze_batch_group(
+    items: List[Tuple[int, BatchTarget]],
+    params: Dict[str, Any],
+    use_cache: bool,
+    finish: Callable[[int, Dict[str, Any]], Awaitable[None]],
+) -> None:
+    """
+    Analyze every target of one repository and branch. A whole-repository
+    target runs like analyze_repository: through the cache, and as a job
+    with its own checkout that identical concurrent requests can join.
+    Directory targets share one sparse checkout. Failures are reported
+    per target.
+    """
+    repo_url, branch = items[0][1].repo_url, items[0][1].branch
+    loop = asyncio.get_event_loop()
+
+    # Identical targets are analyzed once
+    subpaths: Dict[str, List[int]] = {}
+    for index, target in items:
+        try:
+            subpath = normalize_subpath(target.directory or "")
+        except ValueError as e:
+            await finish(index, {"status": FAILED, "error": str(e)})
+            continue
+        subpaths.setdefault(subpath, []).append(index)
+
+    reported = set()
+
+    async def finish_all(indexes: List[int], outcome: Dict[str, Any]) -> None:
+        for index in indexes:
+            reported.add(index)
+            await finish(index, outcome)
+
+    async def quiet(
+        value: float, total: Optional[float] = None, message: Optional[str] = None
+    ) -> None:
+        pass
+
+    try:
+        revision = await loop.run_in_executor(None, resolve_revision, repo_url, branch)
+        cache_key = build_cache_key(repo_url, branch, revision, params)
+        whole = subpaths.pop("", None)
+        if whole is not None:
+            try:
+                result = None
+                if use_cache:
+                    result = await loop.run_in_executor(None, cache.get, cache_key)
+                if not result:
+                    # The job owns its checkout, so a joined waiter is not cut
+                    # short if this batch is cancelled
+                    async def run(publish: ProgressCallback) -> Dict[str, Any]:
+                        return await _analyze_repository_job(
+                            repo_url, branch, revision, params, publish
+                        )
+
+                    result = await inflight.do(cache_key, run, quiet)
+            except Exception as e:
+                logger.error(f"Batch target {repo_url} failed: {str(e)}")
+                await finish_all(whole, {"status": FAILED, "error": str(e)})
+            else:
+                await finish_all(whole, {"status": SUCCEEDED, "result": result})
+        if not subpaths:
+            return
+
+        clone_slot = scheduler.stage(
+            "clone", PRIORITY_DIRECTORY, _report_queued(quiet, 0, "clone")
+        )
+        async with mirrors.open_async(
+            repo_url, branch, clone_slot, sparse_paths=sorted(subpaths)
+        ) as session:
+            for subpath, indexes in subpaths.items():
+                try:
+                    result = await _analyze_subtree(
+                        repo_url, session, subpath, params, None, quiet
+                    )
+                except Exception as e:
+                    logger.error(f"Batch target {repo_url} {subpath} failed: {str(e)}")
+                    await finish_all(indexes, {"status": FAILED, "error": str(e)})
+                else:
+                    await finish_all(indexes, {"status": SUCCEEDED, "result": result})
+    except Exception as e:
+        logger.error(f"Batch analysis of {repo_url} failed: {str(e)}")
+        for indexes in subpaths.values():
+            await finish_all(
+                [index for index in indexes if index not in reported],
+                {"status": FAILED, "error": str(e)},
+            )
+
+
 @mcp.tool()
 async def get_repository_overview(
     repo_url: str,
     branch: str = "main",
+    ignore_tests: bool = True,
+    ignore_patterns: List[str] = [],
+    include_patterns: List[str] = [],
+    exclude_patterns: List[str] = [],
+    count_lines: bool = False,
     ctx: Context = None,
 ) -> Dict[str, Any]:
     """
-    Get a high-level overview of a repository without detailed analysis.
+    Get a high-level overview of a repository without detailed analysis:
+    file, byte and line counts per language, main directories, build tools
+    and declared dependencies. Cheap enough to call before deciding on a
+    full analysis.
+
+    Remote repositories are read straight from git objects without a
+    checkout, so line counts are omitted unless count_lines is set.
 
     -param repo_url: GitHub URL or local path to repository
     -param branch: Branch to analyze (default: "main")
+    -param ignore_tests: Whether to ignore test files
+    -param ignore_patterns: Additional glob patterns to ignore
+    -param include_patterns: Gitignore-style patterns; only matching files are counted
+    -param exclude_patterns: Gitignore-style patterns to exclude ("!" re-includes)
+    -param count_lines: Check out a worktree of remote repositories to count lines
     -return: High-level repository overview
     """
     await ctx.report_progress(0, 100, "Starting repository analysis")
 
     try:
         await ctx.report_progress(20, 100, "Cloning repository")
-        with RepositorySession(repo_url, branch) as session:
+        clone_slot = scheduler.stage(
+            "clone",
+            PRIORITY_OVERVIEW,
+            _report_queued(ctx.report_progress, 20, "clone"),
+        )
+        from_git = is_remote_url(repo_url) and not count_lines
+        async with mirrors.open_async(
+            repo_url, branch, clone_slot, bare=from_git
+        ) as session:
             await ctx.report_progress(50, 100, "Generating overview")
 
-            analyzer = CustomAnalyzer(session.path, max_files=100)
-            overview = await asyncio.get_event_loop().run_in_executor(
-                None, analyzer.generate_overview
+            analyzer = CustomAnalyzer(
+                session.path,
+                max_files=DEFAULT_CONFIG["max_files"],
+                ignore_tests=ignore_tests,
+                ignore=ignore_patterns,
+                revision=session.revision,
+                include_patterns=include_patterns,
+                exclude_patterns=exclude_patterns,
             )
+            async with scheduler.stage(
+                "parse",
+                PRIORITY_OVERVIEW,
+                _report_queued(ctx.report_progress, 50, "parse"),
+            ):
+                overview = await asyncio.get_event_loop().run_in_executor(
+                    None, analyzer.generate_overview, from_git
+                )
 
             await ctx.report_progress(100, 100, "Overview complete")
             return overview
@@ -192,6 +859,333 @@ async def get_repository_overview(
         return {"error": str(e), "repo_url": repo_url}
 
 
+@mcp.tool()
+async def get_report_page(cursor: str, ctx: Context = None) -> Dict[str, Any]:
+    """
+    Fetch a further page of a report requested with a token_budget.
+
+    -param cursor: next_cursor of analyze_repository, analyze_directory or a
+        previous get_report_page call
+    -return: The page and the cursor of the following page, if any
+    """
+    report_id, _, index = cursor.rpartition(":")
+    store = _report_pages()
+    pages = None
+    if store is not None and report_id:
+        loop = asyncio.get_running_loop()
+        pages = await loop.run_in_executor(None, store.get, report_id)
+    if not pages or not index.isdigit() or int(index) >= len(pages):
+        return {"error": f"Unknown or expired cursor: {cursor}", "cursor": cursor}
+    return _page(report_id, pages, int(index))
+
+
+@mcp.tool()
+async def find_symbol(
+    repo_url: str,
+    query: str,
+    branch: str = "main",
+    kind: Optional[str] = None,
+    limit: int = 20,
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    Find where classes, functions, methods and constants are defined,
+    without fetching a report. Matches are exact, then by prefix, then by
+    substring, then fuzzy; "Class.method" searches the members of Class.
+    Answers come from the repository's symbol index, built on first use.
+
+    -param repo_url: GitHub URL or local path to repository
+    -param query: Symbol name, name prefix, or "Owner.name"
+    -param branch: Branch to search (default: "main")
+    -param kind: Only return symbols of this kind: class, method, function,
+        constant or module
+    -param limit: Maximum number of matches
+    -param max_files: Maximum number of files indexed
+    -param ignore_tests: Whether to ignore test files
+    -return: Matching symbols with file, line, kind, parent, signature and
+        docstring, best first
+    """
+    try:
+        if kind is not None and kind not in SYMBOL_KINDS:
+            raise ValueError(
+                f"Unknown kind {kind!r}; expected one of {', '.join(SYMBOL_KINDS)}"
+            )
+        params = _analysis_params(max_files, ignore_tests, [], [], [], False, None)
+        table, revision = await _symbol_table(
+            repo_url, branch, params, ctx.report_progress
+        )
+        kind_id = KIND_NAMES.index(kind) if kind is not None else None
+        matches = []
+        for symbol, match in table.find(query, kind_id, max(limit, 1)):
+            matches.append({**table.record(symbol), "match": match})
+        await ctx.report_progress(100, 100, f"Found {len(matches)} symbols")
+        return {
+            "repo_url": repo_url,
+            "revision": revision,
+            "query": query,
+            "matches": matches,
+        }
+
+    except Exception as e:
+        logger.error(f"Symbol search failed: {str(e)}")
+        await ctx.report_progress(100, 100, f"Error: {str(e)}")
+        return {"error": str(e), "repo_url": repo_url, "query": query}
+
+
+@mcp.tool()
+async def list_module_symbols(
+    repo_url: str,
+    module_path: str,
+    branch: str = "main",
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    List every symbol defined in one file, in source order, from the
+    repository's symbol index.
+
+    -param repo_url: GitHub URL or local path to repository
+    -param module_path: Path of the file, relative to the repository root
+    -param branch: Branch to read (default: "main")
+    -param max_files: Maximum number of files indexed
+    -param ignore_tests: Whether to ignore test files
+    -return: The module's classes, methods, functions, constants and imports
+        with their lines, signatures and docstrings
+    """
+    try:
+        path = normalize_subpath(module_path)
+        params = _analysis_params(max_files, ignore_tests, [], [], [], False, None)
+        table, revision = await _symbol_table(
+            repo_url, branch, params, ctx.report_progress
+        )
+        module = _indexed_module(table, path)
+
+        members = []
+        symbols_in_order = sorted(
+            table.module_symbols(module), key=table.line.__getitem__
+        )
+        for symbol in symbols_in_order:
+            record = table.record(symbol)
+            del record["path"]
+            members.append(record)
+        await ctx.report_progress(100, 100, f"Listed {len(members)} symbols")
+        result = {
+            "repo_url": repo_url,
+            "revision": revision,
+            "module": path,
+            "symbols": members,
+        }
+        if module in table.errors:
+            result["parse_error"] = table.errors[module]
+        return result
+
+    except Exception as e:
+        logger.error(f"Listing module symbols failed: {str(e)}")
+        await ctx.report_progress(100, 100, f"Error: {str(e)}")
+        return {"error": str(e), "repo_url": repo_url, "module": module_path}
+
+
+def _indexed_module(table: SymbolTable, path: str) -> int:
+    """Symbol id of an indexed module, or a ValueError with suggestions."""
+    module = table.module(path)
+    if module is None:
+        suggestions = difflib.get_close_matches(path, table.module_paths(), n=5)
+        raise ValueError(
+            f"Module not indexed: {path}"
+            + (f" (did you mean {', '.join(suggestions)}?)" if suggestions else "")
+        )
+    return module
+
+
+@mcp.tool()
+async def get_module_dependencies(
+    repo_url: str,
+    module_path: str,
+    branch: str = "main",
+    transitive: bool = False,
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    Show which files of the repository a module imports and which import
+    it, resolved from its import statements.
+
+    -param repo_url: GitHub URL or local path to repository
+    -param module_path: Path of the file, relative to the repository root
+    -param branch: Branch to read (default: "main")
+    -param transitive: Also list every module depending on it indirectly
+    -param max_files: Maximum number of files indexed
+    -param ignore_tests: Whether to ignore test files
+    -return: The module's imports and dependents with fan-out and fan-in
+    """
+    try:
+        path = normalize_subpath(module_path)
+        params = _analysis_params(max_files, ignore_tests, [], [], [], False, None)
+        table, revision = await _symbol_table(
+            repo_url, branch, params, ctx.report_progress
+        )
+        graph = await asyncio.get_event_loop().run_in_executor(
+            None, ImportGraph.of, table
+        )
+        node = bisect.bisect_left(table.module_ids, _indexed_module(table, path))
+        paths = table.module_paths()
+
+        result = {
+            "repo_url": repo_url,
+            "revision": revision,
+            "module": path,
+            "imports": [paths[target] for target in graph.imports(node)],
+            "dependents": [paths[source] for source in graph.dependents(node)],
+            "fan_out": graph.fan_out(node),
+            "fan_in": graph.fan_in(node),
+            "entry_point": node in graph.entry_points,
+        }
+        if transitive:
+            result["transitive_dependents"] = [
+                paths[source] for source in graph.transitive_dependents(node)
+            ]
+        await ctx.report_progress(100, 100, "Dependencies resolved")
+        return result
+
+    except Exception as e:
+        logger.error(f"Dependency lookup failed: {str(e)}")
+        await ctx.report_progress(100, 100, f"Error: {str(e)}")
+        return {"error": str(e), "repo_url": repo_url, "module": module_path}
+
+
+@mcp.tool()
+async def get_import_graph(
+    repo_url: str,
+    branch: str = "main",
+    limit: int = 20,
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    Summarize the repository's import graph: entry points, the most
+    imported and most importing modules, imports between packages and
+    the most used external imports.
+
+    -param repo_url: GitHub URL or local path to repository
+    -param branch: Branch to read (default: "main")
+    -param limit: Maximum number of items per list
+    -param max_files: Maximum number of files indexed
+    -param ignore_tests: Whether to ignore test files
+    -return: Import graph summary, largest items first
+    """
+    try:
+        params = _analysis_params(max_files, ignore_tests, [], [], [], False, None)
+        table, revision = await _symbol_table(
+            repo_url, branch, params, ctx.report_progress
+        )
+        graph = await asyncio.get_event_loop().run_in_executor(
+            None, ImportGraph.of, table
+        )
+        paths = table.module_paths()
+        package_edges = sorted(
+            graph.package_edges().items(), key=lambda item: (-item[1], item[0])
+        )
+        external = sorted(graph.external.items(), key=lambda item: (-item[1], item[0]))
+
+        await ctx.report_progress(100, 100, "Import graph summarized")
+        return {
+            "repo_url": repo_url,
+            "revision": revision,
+            "modules": len(graph),
+            "imports": graph.edge_count(),
+            "entry_points": [paths[i] for i in graph.entry_points[:limit]],
+            "most_imported": [
+                {"module": paths[i], "fan_in": graph.fan_in(i)}
+                for i in graph.most_imported(limit)
+            ],
+            "most_importing": [
+                {"module": paths[i], "fan_out": graph.fan_out(i)}
+                for i in graph.most_importing(limit)
+            ],
+            "package_dependencies": [
+                {"importer": importer, "imported": imported, "imports": count}
+                for (importer, imported), count in package_edges[:limit]
+            ],
+            "external": [
+                {"name": name, "imports": count} for name, count in external[:limit]
+            ],
+        }
+
+    except Exception as e:
+        logger.error(f"Import graph summary failed: {str(e)}")
+        await ctx.report_progress(100, 100, f"Error: {str(e)}")
+        return {"error": str(e), "repo_url": repo_url}
+
+
+@mcp.tool()
+async def search_context(
+    repo_url: str,
+    query: str,
+    k: int = 20,
+    branch: str = "main",
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    Find the modules most relevant to a task, by meaning rather than by
+    name, instead of reading the whole report. Each module's details are
+    embedded once per commit on the Ollama host and ranked by cosine
+    similarity to the query. Requires numpy.
+
+    -param repo_url: GitHub URL or local path to repository
+    -param query: What you are looking for, in plain words
+    -param k: Number of modules to return
+    -param branch: Branch to search (default: "main")
+    -param max_files: Maximum number of files indexed
+    -param ignore_tests: Whether to ignore test files
+    -return: The k most similar modules with their score and formatted
+        details, best first
+    """
+    try:
+        if not retrieval_available():
+            raise RuntimeError("Semantic search needs numpy and CCA_RETRIEVAL=True")
+        params = _analysis_params(max_files, ignore_tests, [], [], [], False, None)
+        table, revision = await _symbol_table(
+            repo_url, branch, params, ctx.report_progress
+        )
+        matrix, paths = await _module_vectors(
+            repo_url, params, table, revision, ctx.report_progress
+        )
+        await ctx.report_progress(90, 100, "Ranking modules")
+        query_vector = (await embedder.embed([query], memoize=False))[0]
+        hits = top_k(matrix, query_vector, k)
+
+        modules = [table.module(paths[row]) for row, _ in hits]
+        details = dict(module_documents(table, [m for m in modules if m is not None]))
+        matches = [
+            {
+                "module": paths[row],
+                "score": round(score, 4),
+                "details": details.get(module, ""),
+            }
+            for (row, score), module in zip(hits, modules)
+        ]
+        await ctx.report_progress(100, 100, f"Found {len(matches)} modules")
+        return {
+            "repo_url": repo_url,
+            "revision": revision,
+            "query": query,
+            "model": embedder.model,
+            "matches": matches,
+        }
+
+    except Exception as e:
+        logger.error(f"Context search failed: {str(e)}")
+        await ctx.report_progress(100, 100, f"Error: {str(e)}")
+        return {"error": str(e), "repo_url": repo_url, "query": query}
+
+
 @mcp.tool()
 async def clear_cache(
     repo_url: Optional[str] = None,
@@ -206,11 +1200,16 @@ async def clear_cache(
         if repo_url:
             await ctx.report_progress(0, 100, f"Clearing cache for {repo_url}")
             cache.clear_repository(repo_url)
+            symbols.clear_repository(normalize_repo_url(repo_url))
+            vectors.clear_repository(normalize_repo_url(repo_url))
             await ctx.report_progress(100, 100, "Cache cleared")
             return {"status": "success", "message": f"Cache cleared for {repo_url}"}
         else:
             await ctx.report_progress(0, 100, "Clearing all cache")
             cache.clear_all()
+            symbols.clear()
+            vectors.clear()
+            embedder.clear()
             await ctx.report_progress(100, 100, "All cache cleared")
             return {"status": "success", "message": "All cache cleared"}
     except Exception as e:
@@ -218,6 +1217,183 @@ async def clear_cache(
         return {"status": "error", "message": str(e)}
 
 
+@mcp.tool()
+async def submit_analysis(
+    repo_url: str,
+    branch: str = "main",
+    max_files: int = 1000,
+    ignore_tests: bool = True,
+    ignore_patterns: List[str] = [],
+    include_patterns: List[str] = [],
+    exclude_patterns: List[str] = [],
+    use_cache: bool = True,
+    enhance_with_ai: bool = True,
+    model: str = DEFAULT_CONFIG["model"],
+    ctx: Context = None,
+) -> Dict[str, Any]:
+    """
+    Queue a repository analysis and return its job id immediately.
+    Takes the same arguments as analyze_repository; poll the job with
+    get_job_status and fetch it with get_job_result.
+
+    -param repo_url: GitHub URL or local path to repository
+    -param branch: Branch to analyze (default: "main")
+    -param max_files: Maximum number of files to process
+    -param ignore_tests: Whether to ignore test files
+    -param ignore_patterns: Additional glob patterns to ignore
+    -param include_patterns: Gitignore-style patterns; only matching files are analyzed
+    -param exclude_patterns: Gitignore-style patterns to exclude ("!" re-includes)
+    -param use_cache: Whether to use cached results if available
+    -param enhance_with_ai: Whether to enhance with AI insights
+    -param model: AI model to use for enhancement
+    -return: Job id and initial status
+    """
+    params = _analysis_params(
+        max_files,
+        ignore_tests,
+        ignore_patterns,
+        include_patterns,
+        exclude_patterns,
+        enhance_with_ai,
+        model,
+    )
+
+    async def run(progress: ProgressCallback) -> Dict[str, Any]:
+        return await _analyze(repo_url, branch, params, use_cache, progress)
+
+    try:
+        job = jobs.submit(
+            "analyze_repository", run, {"repo_url": repo_url, "branch": branch}
+        )
+    except QueueFullError as e:
+        return {"error": str(e), "repo_url": repo_url}
+    return job.status_dict()
+
+
+@mcp.tool()
+async def get_job_status(job_id: str, ctx: Context = None) -> Dict[str, Any]:
+    """
+    Report the status, current stage and percent complete of a job.
+
+    -param job_id: Id returned by submit_analysis
+    -return: Job status
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job: {job_id}", "job_id": job_id}
+    return job.status_dict()
+
+
+@mcp.tool()
+async def get_job_result(job_id: str, ctx: Context = None) -> Dict[str, Any]:
+    """
+    Return the result of a finished job, or its status if it is still running.
+
+    -param job_id: Id returned by submit_analysis
+    -return: Analysis results, or the job status and error
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job: {job_id}", "job_id": job_id}
+    if job.status == SUCCEEDED:
+        return job.result
+    if job.status not in FINISHED:
+        return {**job.status_dict(), "error": "Job has not finished yet"}
+    return job.status_dict()
+
+
+@mcp.tool()
+async def cancel_job(job_id: str, ctx: Context = None) -> Dict[str, Any]:
+    """
+    Cancel a queued or running job. A running job is given up to
+    CCA_JOB_CANCEL_WAIT seconds to release its checkout; if it has not
+    finished by then, the returned status is still "running" and becomes
+    "cancelled" once it does.
+
+    -param job_id: Id returned by submit_analysis
+    -return: Job status after the cancellation request
+    """
+    job = jobs.cancel(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired job: {job_id}", "job_id": job_id}
+    await jobs.wait(job, DEFAULT_CONFIG["job_cancel_wait"])
+    return job.status_dict()
+
+
+@mcp.tool()
+async def get_queue_stats(ctx: Context = None) -> Dict[str, Any]:
+    """
+    Report load on the server: running and queued requests and wait times
+    for the clone, parse and enhance stages, plus background jobs.
+
+    -return: Per-stage queue depth, wait times and shed counts
+    """
+    return {
+        "stages": scheduler.stats(),
+        "jobs": jobs.stats(),
+        "in_flight_analyses": inflight.in_flight(),
+    }
+
+
+def _refresh_gauges() -> None:
+    """Sample the current load into the metrics' gauges."""
+    for stage, stats in scheduler.stats().items():
+        metrics.set_gauge("cca_stage_running", stats["running"], stage=stage)
+        metrics.set_gauge("cca_stage_queued", stats["queued"], stage=stage)
+    job_stats = jobs.stats()
+    for status in job_stats.keys() - {"workers", "max_queued"}:
+        metrics.set_gauge("cca_jobs", job_stats[status], status=status)
+    for model, stats in ollama.stats().items():
+        metrics.set_gauge("cca_ollama_in_flight", stats["in_flight"], model=model)
+        metrics.set_gauge("cca_ollama_waiting", stats["waiting"], model=model)
+    metrics.set_gauge("cca_in_flight_analyses", inflight.in_flight())
+    metrics.set_gauge("cca_cache_memory_entries", len(cache.cache))
+    metrics.set_gauge("cca_cache_memory_bytes", cache.total_bytes)
+    rss = resident_memory_bytes()
+    if rss is not None:
+        metrics.set_gauge("cca_process_resident_memory_bytes", rss)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Stage timings, counters and load in the Prometheus text format."""
+    _refresh_gauges()
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@mcp.tool()
+async def get_server_stats(
+    recent_spans: int = 20, ctx: Context = None
+) -> Dict[str, Any]:
+    """
+    Report where the server spends its time. For clone, analyze, format,
+    enhance, embed and cache: run and error counts, total and mean
+    durations, median and 95th percentile estimates, and the bytes, files
+    and tokens processed. Also cache hit ratios, current load and the
+    most recent stage spans.
+
+    -param recent_spans: Number of most recent spans to include
+    -return: Stage statistics, cache hit ratios, current load and recent spans
+    """
+    _refresh_gauges()
+    return {
+        **metrics.snapshot(recent_spans),
+        "load": {
+            "stages": scheduler.stats(),
+            "jobs": jobs.stats(),
+            "ollama": ollama.stats(),
+            "in_flight_analyses": inflight.in_flight(),
+        },
+        "memory": {
+            "resident_bytes": resident_memory_bytes(),
+            "analysis_cache_entries": len(cache.cache),
+            "analysis_cache_bytes": cache.total_bytes,
+        },
+    }
+
+
 if __name__ == "__main__":
     transport = DEFAULT_CONFIG["transport"]
     mcp.run(transport=transport)
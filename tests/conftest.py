@@ -0,0 +1,65 @@
+import os
+import subprocess
+from typing import Dict
+
+import pytest
+
+from utils import cache
+from utils.repository import run_git
+from utils.settings import DEFAULT_CONFIG
+
+
+class GitRepo:
+    """A local repository on branch main, reachable over file://."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.url = f"file://{path}"
+        run_git(["init", "-q", "-b", "main"], cwd=path)
+        # Serve partial clones like a hosted remote does
+        run_git(["config", "uploadpack.allowFilter", "true"], cwd=path)
+        run_git(["config", "uploadpack.allowAnySHA1InWant", "true"], cwd=path)
+
+    def commit(self, files: Dict[str, str]) -> str:
+        """Write files (relative path -> content), commit them, return the SHA."""
+        for rel_path, content in files.items():
+            full_path = os.path.join(self.path, rel_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "w") as f:
+                f.write(content)
+        run_git(["add", "-A"], cwd=self.path)
+        run_git(
+            [
+                "-c",
+                "user.name=test",
+                "-c",
+                "user.email=test@localhost",
+                "commit",
+                "-q",
+                "-m",
+                "Update",
+            ],
+            cwd=self.path,
+        )
+        return run_git(["rev-parse", "HEAD"], cwd=self.path)
+
+    def git(self, *args: str) -> str:
+        return run_git(list(args), cwd=self.path)
+
+
+@pytest.fixture(autouse=True)
+def scratch_dirs(tmp_path, monkeypatch):
+    """Keep every cache, mirror and vector file inside the test's tmp_path."""
+    for key in ("cache_dir", "mirror_dir", "vector_dir"):
+        monkeypatch.setitem(DEFAULT_CONFIG, key, str(tmp_path / key))
+    monkeypatch.setattr(cache, "_stores", {})
+
+
+@pytest.fixture
+def git_repo(tmp_path) -> GitRepo:
+    path = tmp_path / "origin"
+    path.mkdir()
+    try:
+        return GitRepo(str(path))
+    except (subprocess.SubprocessError, OSError):
+        pytest.skip("git is not available")
@@ -0,0 +1,71 @@
+import sqlite3
+
+from utils.cache import AnalysisCache, build_cache_key, get_store
+
+
+def test_clear_repository_drops_both_tiers_of_promoted_entries():
+    cache = AnalysisCache()
+    cache.set("rev-a:1", {"n": 1}, "https://github.com/org/a")
+    cache.set("rev-b:1", {"n": 2}, "https://github.com/org/b")
+
+    # A fresh process promotes the disk copy with its repository tag
+    reloaded = AnalysisCache()
+    assert reloaded.get("rev-a:1") == {"n": 1}
+
+    assert reloaded.clear_repository("https://github.com/org/a.git") == 1
+    assert reloaded.get("rev-a:1") is None
+    assert reloaded.get("rev-b:1") == {"n": 2}
+
+
+def test_evicted_entries_leave_no_tags_behind(monkeypatch):
+    cache = AnalysisCache()
+    monkeypatch.setitem(cache.config, "max_cache_size", 2)
+
+    for i in range(10):
+        cache.set(f"rev-{i}:1", {"n": i}, f"https://github.com/org/repo{i}")
+
+    assert list(cache.cache) == ["rev-8:1", "rev-9:1"]
+    assert cache.clear_repository("https://github.com/org/repo9") == 1
+    assert list(cache.cache) == ["rev-8:1"]
+
+
+def test_corrupt_disk_entry_is_a_miss_and_is_dropped():
+    cache = AnalysisCache()
+    store = get_store("analysis")
+    store.set_raw("rev-a:1", b"not zlib", repo="github.com/org/a")
+
+    assert cache.get("rev-a:1") is None
+    assert store.get_entry("rev-a:1") is None
+
+
+def test_disk_errors_are_logged_not_raised(monkeypatch):
+    cache = AnalysisCache()
+    cache.set("rev-a:1", {"n": 1}, "https://github.com/org/a")
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    for name in ("get_entry", "delete", "delete_repository", "clear"):
+        monkeypatch.setattr(cache.disk, name, locked)
+    # Expired in memory, so the entry is deleted from both tiers
+    monkeypatch.setitem(cache.config, "cache_ttl", -1)
+
+    assert cache.get("rev-a:1") is None
+    assert cache.clear_repository("https://github.com/org/a") == 0
+    assert cache.clear_all() == 0
+
+
+def test_cache_keys_are_shared_by_url_spellings_not_forks():
+    params = {"max_files": 10}
+    key = build_cache_key("https://github.com/org/repo", "main", "abc123", params)
+
+    assert key.startswith("abc123:")
+    assert key == build_cache_key(
+        "https://github.com/org/repo.git", "develop", "abc123", params
+    )
+    assert key != build_cache_key(
+        "https://github.com/fork/repo", "main", "abc123", params
+    )
+    assert key != build_cache_key(
+        "https://github.com/org/repo", "main", "abc123", {"max_files": 20}
+    )
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+from benchmarks.stub_ollama import StubOllama
+from utils.enhancer import AIEnhancer, JsonObjectScanner
+from utils.ollama import OllamaClient
+
+
+def test_scanner_stops_at_the_end_of_the_first_object():
+    scanner = JsonObjectScanner()
+    chunks = ["Sure! ```json\n", '{"a": "}{",', ' "b": {"c": "\\"}"}', "}", " done"]
+    complete = [scanner.feed(chunk) for chunk in chunks[:4]]
+
+    assert complete == [False, False, False, True]
+    assert json.loads(scanner.obj_text) == {"a": "}{", "b": {"c": '"}'}}
+
+
+def test_scanner_skips_braces_in_prose():
+    scanner = JsonObjectScanner()
+
+    assert not scanner.feed("Use {braces} like this: ")
+    assert scanner.feed('{"ok": true}')
+    assert scanner.obj_text == '{"ok": true}'
+
+
+def test_scanner_finds_an_object_inside_rejected_text():
+    scanner = JsonObjectScanner()
+
+    assert scanner.feed('{note {"a": 1}} trailing')
+    assert scanner.obj_text == '{"a": 1}'
+
+    scanner = JsonObjectScanner()
+    assert not scanner.feed('Say "{hi" then ')
+    assert scanner.feed('{"a": "}"}')
+    assert json.loads(scanner.obj_text) == {"a": "}"}
+
+
+def test_stream_stops_once_the_object_closes():
+    with StubOllama(tokens=40, trailing=200, token_latency=0.002) as stub:
+        client = OllamaClient(host=stub.url)
+        enhancer = AIEnhancer(
+            model="stub", ollama_host=stub.url, client=client, cache=False
+        )
+        reported = []
+
+        async def progress(tokens: int) -> None:
+            reported.append(tokens)
+
+        async def scenario() -> str:
+            try:
+                return await enhancer._call_ollama_api("Describe it", progress)
+            finally:
+                await client.close()
+
+        text = asyncio.run(scenario())
+
+    assert json.loads(text)["summary"].startswith(" word0")
+    assert reported[-1] == 40
+    # The connection was closed long before the chatter was generated
+    assert stub.stats["tokens"] < 40 + 200
+
+
+def test_map_progress_adds_up_across_concurrent_units():
+    details = "\n".join(
+        f"├── Package: pkg{i}\n│   ├── Module: pkg{i}/core.py\n│   │   def run_{i}()"
+        for i in range(3)
+    )
+    with StubOllama(tokens=40, token_latency=0.001) as stub:
+        client = OllamaClient(host=stub.url)
+        enhancer = AIEnhancer(
+            model="stub",
+            ollama_host=stub.url,
+            client=client,
+            cache=False,
+            mode="map_reduce",
+            map_concurrency=3,
+            progress_every=4,
+        )
+        reported = []
+
+        async def progress(tokens: int) -> None:
+            reported.append(tokens)
+
+        async def scenario():
+            try:
+                return await enhancer.enhance(
+                    {"heading": "Project: demo", "details": details}, progress
+                )
+            finally:
+                await client.close()
+
+        result = asyncio.run(scenario())
+
+    assert "error" not in result
+    assert result["units"]["generated"] == 3
+    assert reported == sorted(reported)
+    # Three package summaries and the reduce step, 40 tokens each
+    assert reported[-1] == 4 * 40
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+import main
+from utils.formatter import (
+    MIN_PAGE_TOKENS,
+    MODULE_MARKERS,
+    PACKAGE_MARKER,
+    estimate_tokens,
+    paginate,
+    split_details,
+)
+
+
+def package(name: str, modules: int, members: int = 3) -> str:
+    """One package section in the formatter's layout."""
+    lines = [f"{PACKAGE_MARKER}{name} ({modules} modules, 0 classes)"]
+    for i in range(modules):
+        lines.append(f"{MODULE_MARKERS[i == modules - 1]}module_{i}.py")
+        lines.extend(
+            f"│   │   ├── Function: {name}_handler_{i}_{j}(request, response)"
+            for j in range(members)
+        )
+    return "\n".join(lines)
+
+
+def make_report(packages, ranking=None):
+    details = "\n".join(package(name, modules) for name, modules in packages)
+    return {
+        "heading": "# Project: demo",
+        "tree": "```\ndemo/\n├── core/\n└── web/\n```",
+        "dependencies": "```\nweb -> core (2)\n```",
+        "details": f"```\ndemo/\n{details}\n```",
+        "ranking": [{"package": name} for name in ranking or []],
+    }
+
+
+def test_split_details_yields_one_chunk_per_package():
+    chunks = split_details(make_report([("core", 1), ("web", 2)])["details"])
+
+    assert [name for name, _ in chunks] == ["core", "web"]
+    assert chunks[1][1].count("Module: ") == 2
+    assert "```" not in chunks[0][1]
+
+
+def test_pages_stay_within_the_budget():
+    report = make_report([(f"pkg{i}", 6) for i in range(8)])
+
+    pages = paginate(report, MIN_PAGE_TOKENS)
+
+    assert len(pages) > 1
+    assert all(estimate_tokens(page) <= MIN_PAGE_TOKENS for page in pages)
+    assert pages[0].startswith("# Project: demo")
+
+
+def test_packages_are_split_at_module_boundaries():
+    report = make_report([("big", 12)])
+
+    pages = paginate(report, MIN_PAGE_TOKENS)
+
+    continued = [page for page in pages if "big (continued)" in page]
+    assert continued
+    for page in pages:
+        details = page.split("## Detailed Description:\n```\n", 1)[-1]
+        lines = [line for line in details.splitlines() if "Module: " in line]
+        # Every module on a page keeps all of its members
+        for line in lines:
+            name = line.split("Module: ")[1].removesuffix(".py")
+            index = name.rsplit("_", 1)[1]
+            assert page.count(f"big_handler_{index}_") == 3
+
+
+def test_packages_follow_the_ranking():
+    report = make_report([("alpha", 1), ("beta", 1), ("gamma", 1)], ["gamma", "alpha"])
+
+    text = "\n".join(paginate(report, 4096))
+
+    positions = [text.index(f"{PACKAGE_MARKER}{name}") for name in ("gamma", "alpha")]
+    assert positions == sorted(positions)
+    # Unranked packages come last
+    assert text.index(f"{PACKAGE_MARKER}beta") > positions[-1]
+
+
+def test_reserved_tokens_must_leave_room_on_the_first_page():
+    report = make_report([("core", 2)])
+
+    with pytest.raises(ValueError, match="Cannot reserve"):
+        paginate(report, MIN_PAGE_TOKENS, reserved=MIN_PAGE_TOKENS)
+
+    pages = paginate(report, MIN_PAGE_TOKENS, reserved=MIN_PAGE_TOKENS // 2)
+    assert estimate_tokens(pages[0]) <= MIN_PAGE_TOKENS // 2
+
+
+def test_cursor_round_trips_through_get_report_page():
+    report = make_report([(f"pkg{i}", 6) for i in range(8)])
+    enhancement = {"summary": " ".join(["word"] * 400)}
+
+    async def scenario():
+        first = await main._paginated(
+            {**report, "ai_enhancement": enhancement}, MIN_PAGE_TOKENS
+        )
+        pages = [first]
+        while pages[-1]["next_cursor"]:
+            pages.append(await main.get_report_page(pages[-1]["next_cursor"]))
+        return pages
+
+    pages = asyncio.run(scenario())
+
+    # The enhancement does not fit next to the report, so it is paged first
+    assert "ai_enhancement" not in pages[0]
+    count = pages[0]["ai_enhancement_pages"]
+    assert pages[0]["page"].startswith("## AI Enhancement:")
+    assert pages[count]["page"].startswith("# Project: demo")
+    assert [page["page_index"] for page in pages] == list(range(len(pages)))
+    assert all(page["tokens"] <= MIN_PAGE_TOKENS for page in pages)
+    # Long lines are wrapped, not cut
+    text = "\n".join(page["page"] for page in pages[:count])
+    assert text.count("word") == 400
+
+    missing = asyncio.run(main.get_report_page("unknown:1"))
+    assert missing["error"].startswith("Unknown or expired cursor")
@@ -0,0 +1,114 @@
+from collections import Counter
+
+import pytest
+
+from utils.imports import ImportGraph
+from utils.parsers import PARSERS, module_rows
+from utils.symbols import SymbolTable
+
+FILES = {
+    "__init__.py": "",
+    "main.py": (
+        "from .core import engine\n"
+        "import requests\n"
+        "\n"
+        "def main():\n"
+        "    engine.run()\n"
+    ),
+    "cli.py": "from demo.util.helpers import *\n",
+    "core/__init__.py": "from .engine import run\n",
+    "core/engine.py": "import json\nfrom ..util import helpers\n\ndef run():\n    pass\n",
+    "util/__init__.py": "",
+    "util/helpers.py": "import os\n",
+    "web/index.js": (
+        "import { api } from './api';\n"
+        "const components = require('./components');\n"
+        "import React from 'react';\n"
+    ),
+    "web/api.js": "export function api() {}\n",
+    "web/components/index.js": "import { api } from '../api.js';\n",
+}
+
+
+@pytest.fixture
+def graph(tmp_path) -> ImportGraph:
+    root = tmp_path / "demo"
+    table = SymbolTable()
+    for rel_path, content in FILES.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        parser = PARSERS["javascript" if rel_path.endswith(".js") else "python"]
+        table.add_module(str(path), module_rows(parser.parse_file(str(path))))
+    return ImportGraph.of(table)
+
+
+def edges(graph: ImportGraph):
+    return {
+        graph.paths[source]: sorted(graph.paths[t] for t in graph.imports(source))
+        for source in range(len(graph))
+        if graph.fan_out(source)
+    }
+
+
+def test_resolves_python_and_js_imports(graph):
+    assert edges(graph) == {
+        # Relative: "from .core import engine" names a submodule
+        "main.py": ["core/engine.py"],
+        # Absolute, under the root package's name; "*" falls back to the module
+        "cli.py": ["util/helpers.py"],
+        "core/__init__.py": ["core/engine.py"],
+        # Two levels up
+        "core/engine.py": ["util/helpers.py"],
+        # Extensionless and directory index imports
+        "web/index.js": ["web/api.js", "web/components/index.js"],
+        "web/components/index.js": ["web/api.js"],
+    }
+    assert graph.external == Counter({"requests": 1, "json": 1, "os": 1, "react": 1})
+    assert graph.edge_count() == 7
+
+
+def test_fan_in_and_dependents(graph):
+    index = {path: i for i, path in enumerate(graph.paths)}
+    helpers = index["util/helpers.py"]
+
+    assert graph.fan_in(index["core/engine.py"]) == 2
+    assert graph.fan_in(index["web/api.js"]) == 2
+    assert graph.fan_out(index["__init__.py"]) == 0
+    assert [graph.paths[i] for i in graph.dependents(helpers)] == [
+        "cli.py",
+        "core/engine.py",
+    ]
+    # Nearest first: direct importers, then theirs
+    assert [graph.paths[i] for i in graph.transitive_dependents(helpers)] == [
+        "cli.py",
+        "core/engine.py",
+        "main.py",
+        "core/__init__.py",
+    ]
+    assert [graph.paths[i] for i in graph.most_imported(2)] == [
+        "core/engine.py",
+        "util/helpers.py",
+    ]
+
+
+def test_entry_points_and_package_edges(graph):
+    assert [graph.paths[i] for i in graph.entry_points] == [
+        "main.py",
+        "cli.py",
+        # Entry points are recognised by file name in any directory
+        "web/index.js",
+        "web/components/index.js",
+    ]
+    assert graph.package_edges() == Counter(
+        {
+            ("Root", "core"): 1,
+            ("Root", "util"): 1,
+            ("core", "util"): 1,
+            ("web", "web/components"): 1,
+            ("web/components", "web"): 1,
+        }
+    )
+    assert graph.package_fan_in() == Counter(
+        {"core": 1, "util": 2, "web": 1, "web/components": 1}
+    )
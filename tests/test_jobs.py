@@ -0,0 +1,78 @@
+import asyncio
+
+from utils.jobs import CANCELLED, RUNNING, SUCCEEDED, JobQueue
+
+
+def run_queue(scenario):
+    async def main():
+        queue = JobQueue(workers=1, max_queued=4, ttl=60)
+        try:
+            return await scenario(queue)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(main())
+
+
+def test_cancelled_job_is_final_once_cleanup_finishes():
+    cleaned_up = []
+
+    async def slow_cleanup(publish):
+        try:
+            await asyncio.sleep(60)
+        finally:
+            # Like releasing a worktree in an executor
+            await asyncio.sleep(0.05)
+            cleaned_up.append(True)
+
+    async def scenario(queue):
+        job = queue.submit("test", slow_cleanup)
+        await asyncio.sleep(0.01)
+        assert job.status == RUNNING
+
+        queue.cancel(job.id)
+        assert await queue.wait(job, 5)
+        return job
+
+    job = run_queue(scenario)
+
+    assert job.status == CANCELLED
+    assert cleaned_up == [True]
+
+
+def test_wait_times_out_on_a_running_job():
+    async def scenario(queue):
+        job = queue.submit("test", lambda publish: asyncio.sleep(60))
+        await asyncio.sleep(0.01)
+        return await queue.wait(job, 0.01), job.status
+
+    assert run_queue(scenario) == (False, RUNNING)
+
+
+def test_queued_job_is_cancelled_immediately():
+    async def scenario(queue):
+        blocker = queue.submit("test", lambda publish: asyncio.sleep(60))
+        job = queue.submit("test", lambda publish: asyncio.sleep(0))
+        queue.cancel(job.id)
+        finished = await queue.wait(job, 0)
+        queue.cancel(blocker.id)
+        return finished, job.status
+
+    assert run_queue(scenario) == (True, CANCELLED)
+
+
+def test_wait_returns_the_result_of_a_finished_job():
+    async def answer(publish):
+        await publish(50, 100, "Halfway")
+        return {"answer": 42}
+
+    async def scenario(queue):
+        job = queue.submit("test", answer)
+        assert await queue.wait(job, 5)
+        return job
+
+    job = run_queue(scenario)
+
+    assert job.status == SUCCEEDED
+    assert job.result == {"answer": 42}
+    assert job.progress == 100.0
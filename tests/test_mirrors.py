@@ -0,0 +1,112 @@
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from utils.mirrors import MirrorPool
+from utils.repository import is_partial_clone, run_git
+
+
+@pytest.fixture
+def pool(tmp_path) -> MirrorPool:
+    return MirrorPool(root=str(tmp_path / "mirrors"), max_bytes=0)
+
+
+def test_checkout_is_a_detached_worktree_of_the_branch(pool, git_repo):
+    revision = git_repo.commit({"app.py": "print('hi')\n"})
+
+    with pool.open(git_repo.url, "main") as checkout:
+        assert checkout.revision == revision
+        assert sorted(os.listdir(checkout.path)) == [".git", "app.py"]
+        path = checkout.path
+
+    assert not os.path.exists(path)
+    # Only the bare mirror itself is left
+    worktrees = run_git(["worktree", "list", "--porcelain"], cwd=checkout.mirror)
+    assert worktrees.count("worktree ") == 1
+
+
+def test_mirror_is_updated_incrementally(pool, git_repo):
+    git_repo.commit({"app.py": "v1\n"})
+    with pool.open(git_repo.url, "main"):
+        pass
+    mirror = pool.mirror_path(git_repo.url)
+    inode = os.stat(mirror).st_ino
+
+    revision = git_repo.commit({"app.py": "v2\n"})
+    with pool.open(git_repo.url, "main") as checkout:
+        assert checkout.revision == revision
+        with open(os.path.join(checkout.path, "app.py")) as f:
+            assert f.read() == "v2\n"
+
+    # Fetched into the same mirror rather than cloned again
+    assert os.stat(mirror).st_ino == inode
+
+
+def test_mirror_fetches_branches_and_tags_only(pool, git_repo):
+    git_repo.commit({"app.py": "v1\n"})
+    git_repo.git("tag", "v1")
+    git_repo.git("update-ref", "refs/pull/1/head", "HEAD")
+
+    with pool.open(git_repo.url, "v1") as checkout:
+        refs = run_git(["for-each-ref", "--format=%(refname)"], cwd=checkout.mirror)
+
+    assert refs.splitlines() == ["refs/heads/main", "refs/tags/v1"]
+
+
+def test_sparse_checkout_of_a_blobless_mirror(pool, git_repo):
+    git_repo.commit(
+        {"src/core/a.py": "a = 1\n", "docs/guide.md": "# Guide\n", "setup.py": ""}
+    )
+
+    checkout = pool.acquire(git_repo.url, "main", sparse_paths=["src/core"])
+    try:
+        assert os.path.isfile(os.path.join(checkout.path, "src", "core", "a.py"))
+        assert not os.path.exists(os.path.join(checkout.path, "docs"))
+        assert is_partial_clone(checkout.mirror)
+    finally:
+        pool.release(checkout)
+
+    # A full checkout completes the mirror
+    with pool.open(git_repo.url, "main") as checkout:
+        assert os.path.isfile(os.path.join(checkout.path, "docs", "guide.md"))
+    assert not is_partial_clone(checkout.mirror)
+
+
+def test_unknown_branch_is_rejected(pool, git_repo):
+    git_repo.commit({"app.py": ""})
+
+    with pytest.raises(ValueError, match="Unknown branch"):
+        pool.acquire(git_repo.url, "missing")
+
+
+def test_open_async_releases_the_worktree(pool, git_repo):
+    git_repo.commit({"app.py": ""})
+
+    async def scenario() -> str:
+        async with pool.open_async(git_repo.url, "main") as checkout:
+            assert os.path.isfile(os.path.join(checkout.path, "app.py"))
+            return checkout.path
+
+    assert not os.path.exists(asyncio.run(scenario()))
+
+
+def test_mirror_evicted_before_checkout_is_fetched_again(pool, git_repo, monkeypatch):
+    git_repo.commit({"app.py": ""})
+    ensure_mirror = pool.ensure_mirror
+    calls = []
+
+    def evicted_once(repo_url, blobless=False):
+        mirror = ensure_mirror(repo_url, blobless)
+        calls.append(mirror)
+        if len(calls) == 1:
+            # Another process evicts it before the checkout takes the lock
+            shutil.rmtree(mirror)
+        return mirror
+
+    monkeypatch.setattr(pool, "ensure_mirror", evicted_once)
+
+    with pool.open(git_repo.url, "main") as checkout:
+        assert os.path.isfile(os.path.join(checkout.path, "app.py"))
+    assert len(calls) == 2
@@ -0,0 +1,49 @@
+import asyncio
+
+from benchmarks.stub_ollama import StubOllama
+from utils.ollama import OllamaClient
+
+
+def test_slots_queue_per_model_in_fifo_order():
+    with StubOllama() as stub:
+        client = OllamaClient(host=stub.url, max_inflight_per_model=1)
+
+        async def scenario():
+            order = []
+            release = asyncio.Event()
+
+            async def generate(model: str, name: str) -> None:
+                async with client.slot(model) as http:
+                    order.append(name)
+                    await release.wait()
+                    resp = await http.post(
+                        "/api/embed", json={"model": model, "input": name}
+                    )
+                    assert resp.status_code == 200
+
+            tasks = [
+                asyncio.create_task(generate("a", name)) for name in ("a1", "a2", "a3")
+            ]
+            tasks.append(asyncio.create_task(generate("b", "b1")))
+            await asyncio.sleep(0.05)
+
+            # One generation per model runs, the others wait their turn
+            assert sorted(order) == ["a1", "b1"]
+            assert client.stats() == {
+                "a": {"in_flight": 1, "waiting": 2},
+                "b": {"in_flight": 1, "waiting": 0},
+            }
+
+            release.set()
+            await asyncio.gather(*tasks)
+            await client.close()
+            return order
+
+        order = asyncio.run(scenario())
+
+    assert [name for name in order if name.startswith("a")] == ["a1", "a2", "a3"]
+    assert client.stats() == {
+        "a": {"in_flight": 0, "waiting": 0},
+        "b": {"in_flight": 0, "waiting": 0},
+    }
+    assert stub.stats["embed_requests"] == 4
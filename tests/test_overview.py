@@ -0,0 +1,80 @@
+import pytest
+
+from utils.mirrors import MirrorPool
+from utils.overview import OverviewScanner
+from utils.repository import is_partial_clone, run_git
+
+FILES = {
+    "requirements.txt": "requests>=2\nhttpx\n",
+    "web/package.json": '{"dependencies": {"react": "^18"}}',
+    "scripts/tool": "#!/usr/bin/env python3\nprint('hi')\n",
+    **{f"pkg/module_{i}.py": f"VALUE = {i}\n" * 50 for i in range(30)},
+}
+
+
+@pytest.fixture
+def pool(tmp_path) -> MirrorPool:
+    return MirrorPool(root=str(tmp_path / "mirrors"), max_bytes=0)
+
+
+def local_blobs(mirror: str) -> int:
+    """Blobs present in the mirror; listing them never fetches."""
+    output = run_git(
+        ["cat-file", "--batch-all-objects", "--batch-check=%(objecttype)"],
+        cwd=mirror,
+    )
+    return output.split().count("blob")
+
+
+def overview(pool: MirrorPool, url: str):
+    checkout = pool.acquire_bare(url, "main")
+    try:
+        result = OverviewScanner(checkout.path).scan_git(
+            checkout.path, checkout.revision
+        )
+    finally:
+        pool.release(checkout)
+    return result, checkout.mirror
+
+
+def test_cold_overview_fetches_only_build_files(pool, git_repo):
+    git_repo.commit(FILES)
+
+    result, mirror = overview(pool, git_repo.url)
+
+    assert result["file_count"] == len(FILES)
+    assert result["total_bytes"] is None
+    assert result["languages"]["python"]["files"] == 30
+    assert result["dependencies"] == {
+        "javascript": ["react"],
+        "python": ["httpx", "requests"],
+    }
+    assert is_partial_clone(mirror)
+    assert local_blobs(mirror) == 2
+
+
+def test_overview_never_completes_a_blobless_mirror(pool, git_repo):
+    git_repo.commit(FILES)
+    checkout = pool.acquire(git_repo.url, "main", sparse_paths=["pkg"])
+    pool.release(checkout)
+    before = local_blobs(checkout.mirror)
+
+    result, mirror = overview(pool, git_repo.url)
+
+    assert "error" not in result
+    assert is_partial_clone(mirror)
+    # Only web/package.json was missing
+    assert local_blobs(mirror) == before + 1
+
+
+def test_overview_of_a_full_mirror_counts_bytes(pool, git_repo):
+    git_repo.commit(FILES)
+    with pool.open(git_repo.url, "main"):
+        pass
+
+    result, mirror = overview(pool, git_repo.url)
+
+    assert not is_partial_clone(mirror)
+    assert result["total_bytes"] == sum(len(text) for text in FILES.values())
+    # The extensionless script is classified by its shebang
+    assert result["languages"]["python"]["files"] == 31
@@ -0,0 +1,58 @@
+import os
+
+from utils.pathfilter import PathFilter
+
+
+def write(root, files):
+    for rel_path, content in files.items():
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def walked(path_filter):
+    return sorted(rel_path for rel_path, _ in path_filter.walk())
+
+
+def test_gitignore_negation_cannot_reinclude_ignore_patterns(tmp_path):
+    write(
+        tmp_path,
+        {
+            ".gitignore": "*.log\n!keep.log\n!generated/\n",
+            "app.py": "",
+            "keep.log": "",
+            "debug.log": "",
+            "generated/schema.py": "",
+        },
+    )
+
+    path_filter = PathFilter(
+        str(tmp_path),
+        ignore_patterns=["keep.log", "generated"],
+        detect=False,
+    )
+
+    assert walked(path_filter) == ["app.py"]
+
+
+def test_exclude_patterns_override_ignore_patterns(tmp_path):
+    write(tmp_path, {"app.py": "", "keep.log": "", "debug.log": ""})
+
+    path_filter = PathFilter(
+        str(tmp_path),
+        exclude_patterns=["debug.log", "!keep.log"],
+        ignore_patterns=["*.log"],
+        detect=False,
+    )
+
+    assert walked(path_filter) == ["app.py", "keep.log"]
+
+
+def test_gitignore_negation_still_applies_to_its_own_rules(tmp_path):
+    write(
+        tmp_path,
+        {".gitignore": "*.txt\n!notes.txt\n", "notes.txt": "", "other.txt": ""},
+    )
+
+    assert walked(PathFilter(str(tmp_path), detect=False)) == ["notes.txt"]
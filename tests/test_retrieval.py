@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from benchmarks.stub_ollama import StubOllama
+from utils.ollama import OllamaClient
+
+np = pytest.importorskip("numpy")
+
+from utils.retrieval import Embedder, VectorStore, normalize, top_k  # noqa: E402
+
+
+def embed_commits(commits, batch_size=2):
+    """Embed each commit's texts in turn; return the matrices and the stub."""
+    with StubOllama() as stub:
+        client = OllamaClient(host=stub.url)
+        embedder = Embedder(client, model="stub-embed", batch_size=batch_size)
+
+        async def scenario():
+            try:
+                return [await embedder.embed(texts) for texts in commits]
+            finally:
+                await client.close()
+
+        return asyncio.run(scenario()), stub
+
+
+def test_embedder_reuses_vectors_of_unchanged_modules():
+    first = ["pkg/cache.py\nclass Cache", "pkg/queue.py\nclass Queue", "main.py"]
+    second = [first[0], first[1], "main.py\ndef serve"]
+
+    (before, after), stub = embed_commits([first, second])
+
+    # Only the changed module is embedded again
+    assert stub.stats["embedded"] == len(first) + 1
+    assert np.array_equal(before[:2], after[:2])
+    assert not np.array_equal(before[2], after[2])
+    assert np.allclose(np.linalg.norm(after, axis=1), 1.0)
+
+
+def test_embedder_sends_duplicates_once():
+    (matrix,), stub = embed_commits([["same text", "same text", "other"]])
+
+    assert stub.stats["embedded"] == 2
+    assert matrix.shape[0] == 3
+    assert np.array_equal(matrix[0], matrix[1])
+
+
+def test_top_k_orders_by_similarity():
+    matrix = normalize(
+        np.array(
+            [[1.0, 0.0], [0.6, 0.8], [0.0, 1.0], [-1.0, 0.0], [0.8, 0.6]],
+            dtype=np.float32,
+        )
+    )
+    query = normalize(np.array([[1.0, 0.0]], dtype=np.float32))[0]
+
+    ranked = top_k(matrix, query, 3)
+
+    assert [row for row, _ in ranked] == [0, 4, 1]
+    assert ranked[0][1] == pytest.approx(1.0)
+    assert [row for row, _ in top_k(matrix, query, 10)] == [0, 4, 1, 2, 3]
+    assert top_k(matrix, query, 0) == []
+
+
+def test_vector_store_round_trips_memory_mapped(tmp_path):
+    store = VectorStore(root=str(tmp_path / "vectors"), max_bytes=0)
+    matrix = normalize(np.random.default_rng(0).random((4, 8), dtype=np.float32))
+
+    store.set("commit-a", matrix, ["a.py", "b.py", "c.py", "d.py"], repo="repo")
+    loaded, paths = VectorStore(root=store.root).get("commit-a")
+
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, matrix)
+    assert paths == ["a.py", "b.py", "c.py", "d.py"]
+    assert store.clear_repository("repo") == 1
+    assert store.get("commit-a") is None
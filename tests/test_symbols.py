@@ -0,0 +1,163 @@
+import pytest
+
+from utils.symbols import (
+    CLASS,
+    CONSTANT,
+    FUNCTION,
+    IMPORT,
+    METHOD,
+    MODULE,
+    SymbolIndex,
+    SymbolTable,
+)
+
+
+def make_table(root: str = "/checkout") -> SymbolTable:
+    table = SymbolTable()
+    table.add_module(
+        f"{root}/pkg/cache.py",
+        [
+            [IMPORT, "json", -1, 1, None, None, ["dumps"]],
+            [CONSTANT, "CACHE_TTL", -1, 3, None, None, None],
+            [CLASS, "DiskCache", -1, 5, None, "SQLite tier.", ["BaseCache"]],
+            [METHOD, "get", 2, 6, "(self, key)", None, None],
+            [METHOD, "get_entry", 2, 9, "(self, key)", None, None],
+            [FUNCTION, "get_store", -1, 20, "(namespace)", None, None],
+        ],
+    )
+    table.add_module(
+        f"{root}/pkg/queue.py",
+        [
+            [CLASS, "JobQueue", -1, 1, None, None, []],
+            [METHOD, "get", 0, 2, "(self, job_id)", None, None],
+            [FUNCTION, "make_cache", -1, 10, "()", None, None],
+        ],
+    )
+    table.add_module(f"{root}/broken.py", [], error="SyntaxError")
+    return table
+
+
+def names(table, matches):
+    return [(table.record(symbol)["name"], tier) for symbol, tier in matches]
+
+
+def test_columns_and_interned_strings():
+    table = make_table()
+
+    assert len(table) == 12
+    cache, queue, broken = table.modules()
+    assert table.kind[cache] == MODULE
+    assert table.symbol_name(cache) == "cache.py"
+    assert table.errors == {broken: "SyntaxError"}
+    # Every string is stored once; "get" names two methods, "(self, key)"
+    # is the signature of two
+    assert table.strings.count("get") == 1
+    assert table.strings.count("(self, key)") == 1
+    assert table.strings[0] is None
+
+    disk_cache = next(table.members(cache, CLASS))
+    assert [table.symbol_name(m) for m in table.members(disk_cache)] == [
+        "get",
+        "get_entry",
+    ]
+    assert [table.symbol_name(m) for m in table.members(cache)] == [
+        "json",
+        "CACHE_TTL",
+        "DiskCache",
+        "get_store",
+    ]
+    assert table.record(disk_cache) == {
+        "kind": "class",
+        "name": "DiskCache",
+        "path": "/checkout/pkg/cache.py",
+        "line": 5,
+        "doc": "SQLite tier.",
+        "bases": ["BaseCache"],
+    }
+    assert table.record(cache + 1)["names"] == ["dumps"]
+    assert table.record(disk_cache + 1)["parent"] == "DiskCache"
+
+
+def test_bytes_round_trip():
+    table = make_table()
+
+    loaded = SymbolTable.from_bytes(table.to_bytes())
+
+    assert loaded.strings == table.strings
+    for column in SymbolTable._columns() + ("module_ids",):
+        assert getattr(loaded, column) == getattr(table, column), column
+    assert loaded.errors == table.errors
+    assert [loaded.record(s) for s in range(len(loaded))] == [
+        table.record(s) for s in range(len(table))
+    ]
+    # The string pool is rebuilt, so the copy keeps interning
+    assert loaded.intern("DiskCache") == table.intern("DiskCache")
+
+
+def test_unknown_format_version_is_rejected():
+    data = bytearray(make_table().to_bytes())
+    data[4:20] = data[4:20].replace(b'"version": 2', b'"version": 9')
+
+    with pytest.raises(ValueError, match="Unsupported symbol table version"):
+        SymbolTable.from_bytes(bytes(data))
+
+
+def test_relative_to_rewrites_module_paths_only():
+    table = make_table()
+
+    relative = table.relative_to("/checkout")
+
+    assert relative.module_paths() == ["pkg/cache.py", "pkg/queue.py", "broken.py"]
+    assert relative.module("pkg/queue.py") == table.module_ids[1]
+    assert table.module_paths()[0] == "/checkout/pkg/cache.py"
+    assert relative.intern("pkg/cache.py") == relative.file[0]
+    assert relative.symbol_name(relative.module_ids[0]) == "cache.py"
+
+
+def test_find_tiers():
+    table = make_table()
+
+    # Functions rank before methods within a tier
+    assert names(table, table.find("get")) == [
+        ("get", "exact"),
+        ("get", "exact"),
+        ("get_store", "prefix"),
+        ("get_entry", "prefix"),
+    ]
+    assert [table.path(symbol) for symbol, _ in table.find("get", limit=2)] == [
+        "/checkout/pkg/cache.py",
+        "/checkout/pkg/queue.py",
+    ]
+    # Case-insensitive; substrings follow prefixes
+    assert names(table, table.find("cache")) == [
+        ("CACHE_TTL", "prefix"),
+        ("cache.py", "prefix"),
+        ("DiskCache", "substring"),
+        ("make_cache", "substring"),
+    ]
+    assert names(table, table.find("JobQeue")) == [("JobQueue", "fuzzy")]
+    # Import rows are not symbols
+    assert table.find("json") == []
+
+
+def test_find_filters_by_owner_and_kind():
+    table = make_table()
+
+    assert [
+        table.record(symbol)["path"] for symbol, _ in table.find("JobQueue.get")
+    ] == ["/checkout/pkg/queue.py"]
+    assert names(table, table.find("cache", kind=FUNCTION)) == [
+        ("make_cache", "substring")
+    ]
+    assert names(table, table.find("get", limit=1)) == [("get", "exact")]
+
+
+def test_symbol_index_persists_tables():
+    table = make_table().relative_to("/checkout")
+    SymbolIndex().set("rev:1", table, repo="github.com/org/repo")
+
+    loaded = SymbolIndex().get("rev:1")
+
+    assert loaded.module_paths() == table.module_paths()
+    assert SymbolIndex().clear_repository("github.com/org/repo") == 1
+    assert SymbolIndex().get("rev:1") is None
@@ -1,16 +1,146 @@
+import hashlib
 import logging
+import multiprocessing
 import os
-from typing import Any, Dict, List, Optional
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
 
 from code_context_analyzer.analyzer import Analyzer
+from code_context_analyzer.analyzer.discovery import EXTENSION_MAP
 
+from utils.cache import get_store
 from utils.formatter import CustomFormatter
+from utils.metrics import metrics, span
+from utils.overview import OverviewScanner
+from utils.parsers import PARSERS, module_rows
+from utils.pathfilter import PathFilter
+from utils.repository import apply_diff, list_blobs
+from utils.settings import DEFAULT_CONFIG
+from utils.symbols import SymbolTable
 
 logger = logging.getLogger(__name__)
 
+# Bump to invalidate stored per-file parse results when parsers change
+PARSER_VERSION = 3
+
+LANGUAGES = {ext: lang for lang, exts in EXTENSION_MAP.items() for ext in exts}
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def git_blob_sha(file_path: str) -> str:
+    """Hash a file the way `git hash-object` does."""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def parse_file(fpath: str, lang: str) -> Dict[str, Any]:
+    """
+    Parse one file, tolerating failures like the base Analyzer does. The
+    result holds the module's symbol rows (see utils.symbols) and the parse
+    error, if any; this compact form is what crosses the process pool and
+    what the parse cache stores.
+    """
+    try:
+        module = PARSERS[lang].parse_file(fpath)
+    except Exception as e:
+        return {"rows": [], "error": str(e)}
+    return {"rows": module_rows(module), "error": module.get("error")}
+
+
+def parse_chunk(chunk: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Parse a chunk of files inside a pool worker."""
+    return [parse_file(fpath, lang) for fpath, lang in chunk]
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Return the process-wide parse pool, starting it on first use. Workers
+    stay warm across requests. Returns None when parallel parsing is off.
+    """
+    global _parse_pool
+    workers = DEFAULT_CONFIG["parse_workers"] or os.cpu_count() or 1
+    if workers <= 1:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # Forking a threaded server is unsafe; start clean interpreters
+            methods = multiprocessing.get_all_start_methods()
+            method = "forkserver" if "forkserver" in methods else "spawn"
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method),
+            )
+            logger.info(f"Started parse pool with {workers} {method} workers")
+        return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(cancel_futures=True)
+            _parse_pool = None
+
+
+def chunk_by_size(
+    files: List[Tuple[str, str]], chunk_bytes: int
+) -> List[List[Tuple[str, str]]]:
+    """Split files into consecutive chunks of roughly chunk_bytes each."""
+    chunks: List[List[Tuple[str, str]]] = []
+    current: List[Tuple[str, str]] = []
+    current_bytes = 0
+    for fpath, lang in files:
+        try:
+            size = os.path.getsize(fpath)
+        except OSError:
+            size = 0
+        if current and current_bytes + size > chunk_bytes:
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append((fpath, lang))
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
 
 class CustomAnalyzer(Analyzer):
 
+    def __init__(
+        self,
+        path: str,
+        max_files: int,
+        ignore_tests: bool = True,
+        ignore: Optional[List[str]] = None,
+        revision: Optional[str] = None,
+        repo_root: Optional[str] = None,
+        repo_key: Optional[str] = None,
+        include_patterns: Optional[List[str]] = None,
+        exclude_patterns: Optional[List[str]] = None,
+        max_depth: Optional[int] = None,
+    ):
+        super().__init__(path, max_files, ignore_tests=ignore_tests, ignore=ignore)
+        # Gitignore-style patterns, relative to path
+        self.include_patterns = include_patterns or []
+        self.exclude_patterns = exclude_patterns or []
+        # Directory levels below path to descend into; None for no limit
+        self.max_depth = max_depth
+        self.path_filter: Optional[PathFilter] = None
+        # Commit checked out at repo_root; lets unchanged files skip reading
+        self.revision = revision
+        self.repo_root = repo_root or path
+        # Identifies the repository across commits for incremental diffs
+        self.repo_key = repo_key
+        self.stats: Dict[str, int] = {}
+        # Symbols of the last analysis, for the symbol index
+        self.table: Optional[SymbolTable] = None
+
     def get_formatter(self, name: str = None):
         logger.debug("Getting custom formatter")
         return CustomFormatter(
@@ -25,65 +155,226 @@ class CustomAnalyzer(Analyzer):
         try:
             logger.info("Starting code analysis")
 
-            # Apply filters if specified
-            # if self.include_patterns or self.exclude_patterns or self.target_path:
-            #     self._apply_filters()
+            self._apply_filters(path)
 
-            result = super().run_analysis(path)
+            table = self.parse_symbols(path)
+            with span("format") as format_span:
+                result = self.get_formatter().format(table)
+                format_span.add(
+                    chars=sum(
+                        len(result[name])
+                        for name in ("heading", "tree", "dependencies", "details")
+                        if name in result
+                    )
+                )
+            columns, chars = table.nbytes()
             logger.info(
-                f"Analysis completed. Files processed: {len(result) if result else 0}"
+                f"Analysis completed. Files processed: {len(table.module_ids)} "
+                f"(parsed {self.stats.get('files_parsed', 0)}, "
+                f"reused {self.stats.get('files_reused', 0)}); "
+                f"{len(table)} symbols in {columns} bytes + {chars} characters"
             )
             return result
         except Exception as e:
             logger.error(f"Analysis failed: {str(e)}")
             raise
 
-    def generate_overview(self) -> Dict[str, Any]:
-        """Generate a high-level overview of the repository."""
+    def parse_symbols(self, path: str = None) -> SymbolTable:
+        """Discover and parse files into a SymbolTable, without formatting."""
+        with span("analyze") as analyze_span:
+            self.table = self.parse_files(self.discover_files(path or self.path))
+            analyze_span.add(symbols=len(self.table), **self.stats)
+        return self.table
+
+    def discover_files(self, path: str) -> List[Tuple[str, str]]:
+        """
+        List (path, language) pairs to analyze, like the base discoverer
+        (same order, languages and max_files budget), but walking the tree
+        once with excluded directories pruned before they are listed and
+        nothing below max_depth entered.
+        """
+        if self.path_filter is None or self.path_filter.root != os.path.realpath(path):
+            self._apply_filters(path)
+
+        files = []
+        for rel_path, entry in self.path_filter.walk(self.max_depth):
+            if len(files) >= self.max_files:
+                break
+            ext = os.path.splitext(entry.name)[1].lower()
+            files.append(
+                (os.path.join(self.path_filter.root, rel_path), LANGUAGES.get(ext))
+            )
+        return files
+
+    def parse_files(self, files: List[Tuple[str, str]]) -> SymbolTable:
+        """
+        Parse files into a SymbolTable, reusing stored results for file
+        contents seen before.
+
+        Parse results are stored by parser version, language and git blob
+        SHA, so a file is only re-parsed when its content changed. The
+        output is identical to parsing every file from scratch.
+        """
+        candidates = [(fpath, lang) for fpath, lang in files if PARSERS.get(lang)]
+        store = None
+        if DEFAULT_CONFIG["parse_cache"]:
+            store = get_store(
+                "parsed", max_bytes=DEFAULT_CONFIG["parse_cache_max_bytes"]
+            )
+
+        if store is None:
+            self.stats = {"files_parsed": len(candidates), "files_reused": 0}
+            return self._build_table(candidates, self.parse_many(candidates))
+
+        blobs = self._blob_shas([fpath for fpath, _ in candidates])
+        keys = {
+            fpath: f"{PARSER_VERSION}:{lang}:{blobs[fpath]}"
+            for fpath, lang in candidates
+        }
+        stored = store.get_many(list(set(keys.values())))
+
+        missing: Dict[str, Tuple[str, str]] = {}
+        for fpath, lang in candidates:
+            key = keys[fpath]
+            if key not in stored and key not in missing:
+                missing[key] = (fpath, lang)
+
+        fresh = dict(zip(missing, self.parse_many(list(missing.values()))))
+        parsed = [
+            stored[keys[fpath]] if keys[fpath] in stored else fresh[keys[fpath]]
+            for fpath, _ in candidates
+        ]
+
+        store.set_many(fresh)
+        self.stats = {
+            "files_parsed": len(fresh),
+            "files_reused": len(candidates) - len(fresh),
+        }
+        metrics.cache_result("parse", True, self.stats["files_reused"])
+        metrics.cache_result("parse", False, self.stats["files_parsed"])
+        return self._build_table(candidates, parsed)
+
+    @staticmethod
+    def _build_table(
+        candidates: List[Tuple[str, str]], parsed: List[Dict[str, Any]]
+    ) -> SymbolTable:
+        table = SymbolTable()
+        for (fpath, _), module in zip(candidates, parsed):
+            table.add_module(fpath, module["rows"], module.get("error"))
+        return table
+
+    def parse_many(self, files: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Parse files in order. Large batches are spread over the process pool
+        in chunks sized by file bytes; results are merged back in input
+        order so the report stays deterministic.
+        """
+        pool = None
+        if len(files) >= DEFAULT_CONFIG["parse_parallel_min_files"]:
+            pool = get_parse_pool()
+        if pool is None:
+            return parse_chunk(files)
+
+        chunks = chunk_by_size(files, DEFAULT_CONFIG["parse_chunk_bytes"])
         try:
-            logger.info("Generating repository overview")
+            parsed = []
+            for result in pool.map(parse_chunk, chunks):
+                parsed.extend(result)
+            return parsed
+        except BrokenProcessPool as e:
+            logger.error(f"Parse pool broke, parsing serially: {str(e)}")
+            shutdown_parse_pool()
+            return parse_chunk(files)
 
-            # Get basic repository information
-            overview = {
-                "file_count": self._count_files(),
-                "language_breakdown": self._get_language_breakdown(),
-                "main_directories": self._get_main_directories(),
-                "build_tools": self._detect_build_tools(),
-                "dependencies": self._detect_dependencies(),
-            }
+    def _blob_shas(self, fpaths: List[str]) -> Dict[str, str]:
+        """Blob SHA per file, from git metadata where possible."""
+        revision_blobs = self._revision_blobs()
+        root = os.path.realpath(self.repo_root)
 
-            return overview
+        shas = {}
+        for fpath in fpaths:
+            rel_path = os.path.relpath(fpath, root).replace(os.sep, "/")
+            sha = revision_blobs.get(rel_path)
+            if sha is None:
+                sha = git_blob_sha(fpath)
+            shas[fpath] = sha
+        return shas
+
+    def _revision_blobs(self) -> Dict[str, str]:
+        """
+        Blob map of self.revision. It is derived from the previously analyzed
+        commit of the same repository with `git diff A..B` when possible, and
+        from `git ls-tree` otherwise.
+        """
+        if not self.revision:
+            return {}
+        manifests = get_store(
+            "manifests", max_bytes=DEFAULT_CONFIG["parse_cache_max_bytes"]
+        )
+        if manifests is None:
+            return {}
+
+        blobs = manifests.get(self.revision)
+        if blobs is None:
+            latest_key = f"latest:{self.repo_key}" if self.repo_key else None
+            previous = manifests.get(latest_key) if latest_key else None
+            if previous and previous != self.revision:
+                base = manifests.get(previous)
+                if base is not None:
+                    try:
+                        blobs = apply_diff(
+                            self.repo_root, previous, self.revision, base
+                        )
+                    except (subprocess.SubprocessError, OSError, ValueError) as e:
+                        # e.g. the previous commit was pruned after a force-push
+                        logger.info(f"Could not diff from {previous}: {str(e)}")
+            if blobs is None:
+                try:
+                    blobs = list_blobs(self.repo_root, self.revision)
+                except (subprocess.SubprocessError, OSError, ValueError) as e:
+                    logger.warning(
+                        f"Could not list blobs for {self.revision}: {str(e)}"
+                    )
+                    return {}
+            manifests.set(self.revision, blobs)
+
+        if self.repo_key:
+            manifests.set(f"latest:{self.repo_key}", self.revision)
+        return blobs
+
+    def generate_overview(self, from_git: bool = False) -> Dict[str, Any]:
+        """
+        Generate a high-level overview of the repository. With `from_git`,
+        it is read from the objects of self.revision in self.repo_root
+        (which may be a bare mirror) instead of the working tree.
+        """
+        try:
+            logger.info("Generating repository overview")
+            scanner = OverviewScanner(
+                self.path,
+                ignore_patterns=self.ignore,
+                ignore_tests=self.ignore_tests,
+                include_patterns=self.include_patterns,
+                exclude_patterns=self.exclude_patterns,
+            )
+            if from_git and self.revision:
+                return scanner.scan_git(self.repo_root, self.revision)
+            return scanner.scan()
         except Exception as e:
             logger.error(f"Overview generation failed: {str(e)}")
             return {"error": str(e)}
 
-    def _apply_filters(self) -> None:
-        """Apply include/exclude patterns and target path filters."""
-        # This would need to be implemented based on the base Analyzer capabilities
-        # For now, this is a placeholder for the filtering logic
-        pass
-
-    def _count_files(self) -> int:
-        """Count files in the repository."""
-        # Implementation would depend on the base class
-        return 0
-
-    def _get_language_breakdown(self) -> Dict[str, int]:
-        """Get breakdown of files by language."""
-        # Implementation would depend on the base class
-        return {}
-
-    def _get_main_directories(self) -> List[str]:
-        """Get main directories in the repository."""
-        # Implementation would depend on the base class
-        return []
-
-    def _detect_build_tools(self) -> List[str]:
-        """Detect build tools used in the repository."""
-        # Implementation would depend on the base class
-        return []
-
-    def _detect_dependencies(self) -> Dict[str, List[str]]:
-        """Detect dependencies in the repository."""
-        # Implementation would depend on the base class
-        return {}
+    def _apply_filters(self, path: Optional[str] = None) -> None:
+        """Compile include/exclude, .gitignore and ignore patterns once."""
+        self.path_filter = PathFilter(
+            path or self.path,
+            include_patterns=self.include_patterns,
+            exclude_patterns=self.exclude_patterns,
+            ignore_patterns=self.ignore,
+            ignore_tests=self.ignore_tests,
+            repo_root=self.repo_root,
+        )
+        if self.path_filter.frameworks:
+            logger.info(
+                f"Detected frameworks: {', '.join(sorted(self.path_filter.frameworks))}"
+            )
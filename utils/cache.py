@@ -1,62 +1,529 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
 import time
-from typing import Any, Dict, Optional
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+from utils.metrics import current_span, metrics, span
+from utils.repository import normalize_repo_url
 from utils.settings import DEFAULT_CONFIG
 
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of cached analysis results changes
+CACHE_KEY_VERSION = 2
+
+# Keys per statement; stays under SQLite's bound parameter limit
+BATCH_SIZE = 500
+
+_stores: Dict[str, "DiskCache"] = {}
+_stores_lock = threading.Lock()
+
+
+def build_cache_key(
+    repo_url: str, branch: str, revision: Optional[str], params: Dict[str, Any]
+) -> str:
+    """
+    Build a content-addressed cache key.
+
+    The key is the resolved commit SHA plus a canonical hash of the
+    normalized repo URL and every analysis parameter, so any URL spelling
+    or branch of one repository that resolves to the same commit shares
+    one entry. Forks that share the commit do not: results name their
+    repository, and clear_repository on one must not leave entries served
+    to the other. When the revision cannot be resolved (e.g. a dirty local
+    checkout) the normalized repo URL and branch are used instead, and the
+    entry only goes stale through the TTL.
+    """
+    repo = normalize_repo_url(repo_url)
+    canonical = json.dumps(
+        {"version": CACHE_KEY_VERSION, "repo": repo, **params},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    params_hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+    prefix = revision or f"{repo}@{branch}"
+    return f"{prefix}:{params_hash}"
+
+
+def serialize(value: Any) -> bytes:
+    """Serialize a JSON-compatible value to compact UTF-8 bytes."""
+    return json.dumps(value, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class DiskCache:
+    """
+    SQLite-backed cache tier shared by every worker process on the host.
+
+    Values are stored as zlib-compressed JSON. The database runs in WAL mode
+    so readers never block the writer, and each process opens its own
+    connection. Entries are evicted by TTL and, when `max_bytes` is set, by
+    least-recent access until the compressed total fits.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "analysis",
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Never share a connection across a fork
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                repo TEXT,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_repo ON entries (repo)")
+        conn.commit()
+        self._conn = conn
+        self._pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value if present and not expired."""
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        return json.loads(zlib.decompress(entry[0]))
+
+    def get_entry(self, key: str) -> Optional[Tuple[bytes, float, Optional[str]]]:
+        """
+        Get the compressed payload, creation time and repository tag for
+        key, refreshing its access time.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created, repo FROM entries "
+                "WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            value, created, repo = row
+            if self.ttl is not None and now - created > self.ttl:
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+                conn.commit()
+                return None
+            conn.execute(
+                "UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                (now, self.namespace, key),
+            )
+            conn.commit()
+            return value, created, repo
+
+    def set(self, key: str, value: Any, repo: Optional[str] = None) -> None:
+        """Store a JSON-compatible value."""
+        self.set_raw(key, zlib.compress(serialize(value)), repo=repo)
+
+    def set_raw(self, key: str, payload: bytes, repo: Optional[str] = None) -> None:
+        """Store an already compressed payload."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(namespace, key, repo, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.namespace, key, repo, payload, len(payload), now, now),
+            )
+            conn.commit()
+            if self.max_bytes:
+                self._evict_locked(conn)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get every present, unexpired value among keys in one transaction."""
+        return {
+            key: json.loads(zlib.decompress(payload))
+            for key, payload in self.get_many_raw(keys).items()
+        }
+
+    def get_many_raw(self, keys: List[str]) -> Dict[str, bytes]:
+        """Like get_many, returning the stored payloads as they are."""
+        found: Dict[str, bytes] = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for start in range(0, len(keys), BATCH_SIZE):
+                batch = keys[start : start + BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, value, created FROM entries "
+                    f"WHERE namespace = ? AND key IN ({placeholders})",
+                    (self.namespace, *batch),
+                )
+                for key, value, created in rows:
+                    if self.ttl is not None and now - created > self.ttl:
+                        continue
+                    found[key] = value
+
+            hits = list(found)
+            for start in range(0, len(hits), BATCH_SIZE):
+                batch = hits[start : start + BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(
+                    f"UPDATE entries SET accessed = ? "
+                    f"WHERE namespace = ? AND key IN ({placeholders})",
+                    (now, self.namespace, *batch),
+                )
+            conn.commit()
+        return found
+
+    def set_many(self, items: Dict[str, Any], repo: Optional[str] = None) -> None:
+        """Store several JSON-compatible values in one transaction."""
+        self.set_many_raw(
+            {key: zlib.compress(serialize(value)) for key, value in items.items()},
+            repo=repo,
+        )
+
+    def set_many_raw(self, items: Dict[str, bytes], repo: Optional[str] = None) -> None:
+        """Like set_many, storing the payloads as they are."""
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (self.namespace, key, repo, payload, len(payload), now, now)
+            for key, payload in items.items()
+        ]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO entries "
+                "(namespace, key, repo, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+            if self.max_bytes:
+                self._evict_locked(conn)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+            conn.commit()
+
+    def delete_repository(self, repo: str) -> int:
+        """Delete every entry tagged with repo."""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND repo = ?",
+                (self.namespace, repo),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def clear(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "DELETE FROM entries WHERE namespace = ?", (self.namespace,)
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def sweep_expired(self) -> int:
+        """Delete every expired entry in this namespace."""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND created < ?",
+                (self.namespace, time.time() - self.ttl),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            (total,) = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+            return total
+
+    def _evict_locked(self, conn: sqlite3.Connection) -> None:
+        (total,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace = ?",
+            (self.namespace,),
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+
+        rows = conn.execute(
+            "SELECT key, size FROM entries WHERE namespace = ? ORDER BY accessed",
+            (self.namespace,),
+        )
+        to_delete = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            to_delete.append((self.namespace, key))
+            total -= size
+        conn.executemany(
+            "DELETE FROM entries WHERE namespace = ? AND key = ?", to_delete
+        )
+        conn.commit()
+
+
+def get_store(
+    namespace: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None
+) -> Optional[DiskCache]:
+    """
+    Return the process-wide DiskCache for a namespace, or None when the disk
+    cache is disabled. Every namespace shares one SQLite file in cache_dir.
+    """
+    if not DEFAULT_CONFIG["disk_cache"]:
+        return None
+    with _stores_lock:
+        store = _stores.get(namespace)
+        if store is None:
+            store = DiskCache(
+                os.path.join(DEFAULT_CONFIG["cache_dir"], "cache.sqlite3"),
+                namespace=namespace,
+                ttl=ttl,
+                max_bytes=max_bytes,
+            )
+            _stores[namespace] = store
+        return store
+
 
 class AnalysisCache:
-    """Simple in-memory cache for analysis results."""
+    """
+    Two-tier cache for analysis results.
 
-    def __init__(self):
+    The memory tier is an O(1) LRU bounded by entry count and by the total
+    serialized size of its values. Misses fall through to a DiskCache that
+    survives restarts and is shared by every worker process on the host;
+    disk hits are promoted back into memory. Safe to call from executor
+    threads, so the event loop never waits on SQLite.
+    """
+
+    def __init__(self, disk: Optional[DiskCache] = None):
         self.config = DEFAULT_CONFIG
-        self.cache: Dict[str, Dict[str, Any]] = {}
-        self.timestamps: Dict[str, float] = {}
+        self.max_bytes = self.config["cache_memory_max_bytes"]
+        # key -> (value, size in bytes, created timestamp, repository tag)
+        self.cache: (
+            "OrderedDict[str, Tuple[Dict[str, Any], int, float, Optional[str]]]"
+        ) = OrderedDict()
+        self.total_bytes = 0
+        self.last_sweep = time.time()
+        # Guards the memory tier
+        self._lock = threading.RLock()
+
+        if disk is None:
+            disk = get_store(
+                "analysis",
+                ttl=self.config["cache_ttl"],
+                max_bytes=self.config["cache_disk_max_bytes"],
+            )
+        self.disk = disk
 
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         """Get item from cache if it exists and isn't expired."""
-        if key not in self.cache:
-            return None
+        with span("cache", op="get") as cache_span:
+            value, tier = self._get(key)
+            cache_span.label(result=tier)
+        metrics.cache_result("analysis", value is not None)
+        return value
 
-        # Check if item is expired
-        if time.time() - self.timestamps[key] > self.config["cache_ttl"]:
+    def _get(self, key: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """The value and the tier that answered: memory, disk or miss."""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                value, _, created, _ = entry
+                if time.time() - created <= self.config["cache_ttl"]:
+                    self.cache.move_to_end(key)
+                    return value, "memory"
+        if entry is not None:
+            # Expired
             self.delete(key)
-            return None
+            return None, "miss"
 
-        return self.cache[key]
+        if self.disk is None:
+            return None, "miss"
 
-    def set(self, key: str, value: Dict[str, Any]) -> None:
-        """Set item in cache with timestamp."""
-        # Check cache size and remove oldest if needed
-        if len(self.cache) >= self.config["max_cache_size"]:
-            oldest_key = min(self.timestamps.keys(), key=lambda k: self.timestamps[k])
-            self.delete(oldest_key)
+        try:
+            entry = self.disk.get_entry(key)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Disk cache read failed: {str(e)}")
+            return None, "miss"
+        if entry is None:
+            return None, "miss"
 
-        self.cache[key] = value
-        self.timestamps[key] = time.time()
+        try:
+            payload = zlib.decompress(entry[0])
+            value = json.loads(payload)
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"Dropping corrupt disk cache entry {key}: {str(e)}")
+            self.delete(key)
+            return None, "miss"
+        current_span().add(bytes=len(entry[0]))
+        # Tagged like a fresh set, so clear_repository also drops the copy
+        self._store(key, value, len(payload), created=entry[1], repo=entry[2])
+        return value, "disk"
+
+    def set(
+        self, key: str, value: Dict[str, Any], repo_url: Optional[str] = None
+    ) -> None:
+        """Set item in both tiers, optionally tagged with its repository."""
+        with span("cache", op="set") as cache_span:
+            payload = serialize(value)
+            repo = normalize_repo_url(repo_url) if repo_url else None
+            self._store(key, value, len(payload), repo=repo)
+
+            if self.disk is not None:
+                try:
+                    compressed = zlib.compress(payload)
+                    self.disk.set_raw(key, compressed, repo=repo)
+                    cache_span.add(bytes=len(compressed))
+                except (sqlite3.Error, OSError) as e:
+                    logger.warning(f"Disk cache write failed: {str(e)}")
+
+        self._maybe_sweep()
+
+    def _store(
+        self,
+        key: str,
+        value: Dict[str, Any],
+        size: int,
+        created: Optional[float] = None,
+        repo: Optional[str] = None,
+    ) -> None:
+        """Insert into the memory tier and evict least recently used entries."""
+        with self._lock:
+            self.delete_memory(key)
+            if size > self.max_bytes:
+                # Too big for memory; it still lives on disk
+                return
+
+            self.cache[key] = (value, size, created or time.time(), repo)
+            self.total_bytes += size
+
+            while self.cache and (
+                self.total_bytes > self.max_bytes
+                or len(self.cache) > self.config["max_cache_size"]
+            ):
+                oldest_key = next(iter(self.cache))
+                self.delete_memory(oldest_key)
+
+    def _maybe_sweep(self) -> None:
+        """Drop expired entries at most once per sweep interval."""
+        now = time.time()
+        if now - self.last_sweep < self.config["cache_sweep_interval"]:
+            return
+        self.last_sweep = now
+        self.sweep_expired()
+
+    def sweep_expired(self) -> int:
+        """Remove expired entries from both tiers."""
+        cutoff = time.time() - self.config["cache_ttl"]
+        with self._lock:
+            expired = [
+                key
+                for key, (_, _, created, _) in self.cache.items()
+                if created < cutoff
+            ]
+            for key in expired:
+                self.delete_memory(key)
+
+        count = len(expired)
+        if self.disk is not None:
+            try:
+                count += self.disk.sweep_expired()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Disk cache sweep failed: {str(e)}")
+        return count
+
+    def delete_memory(self, key: str) -> None:
+        """Delete item from the memory tier only."""
+        with self._lock:
+            entry = self.cache.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry[1]
 
     def delete(self, key: str) -> None:
         """Delete item from cache."""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.timestamps:
-            del self.timestamps[key]
+        self.delete_memory(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Disk cache delete failed: {str(e)}")
 
     def clear_repository(self, repo_url: str) -> int:
         """Clear all cache entries for a repository."""
-        count = 0
-        keys_to_delete = [
-            key for key in self.cache.keys() if key.startswith(f"{repo_url}:")
-        ]
+        repo = normalize_repo_url(repo_url)
+        with self._lock:
+            # The memory tier is bounded, so a scan is cheap
+            keys_to_delete = [
+                key for key, entry in self.cache.items() if entry[3] == repo
+            ]
+            for key in keys_to_delete:
+                self.delete_memory(key)
+        count = len(keys_to_delete)
 
-        for key in keys_to_delete:
-            self.delete(key)
-            count += 1
+        if self.disk is not None:
+            try:
+                count = max(count, self.disk.delete_repository(repo))
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Disk cache clear failed: {str(e)}")
 
         return count
 
     def clear_all(self) -> int:
         """Clear all cache entries."""
-        count = len(self.cache)
-        self.cache.clear()
-        self.timestamps.clear()
+        with self._lock:
+            count = len(self.cache)
+            self.cache.clear()
+            self.total_bytes = 0
+        if self.disk is not None:
+            try:
+                count = max(count, self.disk.clear())
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Disk cache clear failed: {str(e)}")
         return count
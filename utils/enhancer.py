@@ -2,9 +2,17 @@
 AIEnhancer: async, robust wrapper around Ollama HTTP API (instead of CLI subprocess).
 
 Features:
-- non-blocking async HTTP calls via httpx
+- non-blocking async HTTP calls via httpx, optionally through a shared
+  pooled OllamaClient
 - timeout and retries with exponential backoff
 - robust JSON extraction from model output (with fallback to raw text)
+- streaming generation with token progress, stopping as soon as the
+  top-level JSON object closes
+- map-reduce mode for large repositories: packages are summarized
+  concurrently, then one reduce prompt builds the final report from the
+  summaries
+- every prompt output is memoized by model, template version and content
+  hash, so re-enhancement only pays for the packages that changed
 - flexible configuration: model name, host, timeout, retries
 - sync wrapper for legacy environments
 """
@@ -12,16 +20,165 @@ Features:
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
 import logging
 import re
+from contextlib import aclosing, asynccontextmanager
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 
 import httpx
 
+from utils.cache import get_store
+from utils.formatter import (
+    MODULE_MARKERS,
+    estimate_tokens,
+    split_dependencies,
+    split_details,
+)
+from utils.metrics import current_span, metrics, span
+from utils.ollama import OllamaClient
+from utils.settings import DEFAULT_CONFIG
+
 logger = logging.getLogger(__name__)
 
+# Receives the number of tokens generated so far
+TokenProgress = Callable[[int], Awaitable[None]]
+
+# Bump when a prompt template changes, so memoized outputs are not reused
+MAP_PROMPT_VERSION = 2
+REPORT_PROMPT_VERSION = 2
+
+# Checkouts live in random repo_session_* directories; keep those names out
+# of content hashes
+SESSION_NAME_RE = re.compile(r"repo_session_\w+")
+
+
+def split_units(details: str, max_chars: int) -> List[Tuple[str, str]]:
+    """
+    Split `details` into (package, text) units for the map step: one per
+    package, except that packages longer than max_chars are split into
+    groups of whole modules, each repeating the package name.
+    """
+    units: List[Tuple[str, str]] = []
+    for package, text in split_details(details):
+        if len(text) <= max_chars:
+            units.append((package, text))
+            continue
+
+        first, *lines = text.splitlines()
+        # Drop the package totals, which would change with every module
+        header = first.split(" (", 1)[0]
+        modules: List[List[str]] = []
+        for line in lines:
+            if line.startswith(MODULE_MARKERS) or not modules:
+                modules.append([line])
+            else:
+                modules[-1].append(line)
+
+        batch: List[str] = []
+        size = len(header)
+        for module in modules:
+            block = "\n".join(module)
+            # Besides the size cap, cut before modules whose name hashes to a
+            # boundary, so adding or removing one module only re-keys the
+            # units around it instead of shifting every later boundary
+            boundary = (
+                size >= max_chars // 2
+                and hashlib.sha256(module[0].encode()).digest()[0] % 4 == 0
+            )
+            if batch and (boundary or size + len(block) > max_chars):
+                units.append((package, "\n".join([header, *batch])))
+                batch, size = [], len(header)
+            batch.append(block)
+            size += len(block) + 1
+        if batch:
+            units.append((package, "\n".join([header, *batch])))
+    return units
+
+
+def content_hash(*parts: str) -> str:
+    """SHA-256 over the given texts, with checkout directory names masked."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(SESSION_NAME_RE.sub("repo_session", part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class JsonObjectScanner:
+    """
+    Incremental scanner that finds the end of the first complete top-level
+    JSON object in streamed text, ignoring braces inside strings. Leading
+    chatter or code fences before the object are skipped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> bool:
+        """Consume more text; return True once a complete object is seen."""
+        self.text += chunk
+        while self.end is None and self._pos < len(self.text):
+            char = self.text[self._pos]
+            if self.start is None:
+                if char == "{":
+                    self.start = self._pos
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close()
+            self._pos += 1
+        return self.end is not None
+
+    def _close(self) -> None:
+        candidate = self.text[self.start : self._pos + 1]
+        try:
+            json.loads(candidate)
+        except ValueError:
+            # A stray brace in prose; the real object may start inside the
+            # rejected text, so rescan from just after the stray brace
+            self._pos = self.start
+            self.start = None
+            self._in_string = False
+            self._escape = False
+            return
+        self.end = self._pos + 1
+
+    @property
+    def obj_text(self) -> Optional[str]:
+        if self.end is None:
+            return None
+        return self.text[self.start : self.end]
+
 
 @dataclass
 class AIEnhancer:
@@ -31,39 +188,192 @@ class AIEnhancer:
     retries: int = 2  # retry attempts
     retry_backoff: float = 1.5  # exponential backoff multiplier
     max_response_chars: Optional[int] = 200_000
-
-    async def enhance(self, base_report: Dict[str, Any]) -> Dict[str, Any]:
+    stream: bool = True  # consume the token stream instead of one response
+    progress_every: int = 16  # report streaming progress every N tokens
+    client: Optional[OllamaClient] = None  # shared pool; per-call client if None
+    mode: str = "auto"  # "single", "map_reduce", or "auto" (by prompt size)
+    max_prompt_chars: int = 24_000  # auto mode switches to map-reduce above this
+    map_concurrency: int = 4  # package summaries generated at once
+    cache: bool = True  # memoize prompt outputs in the persistent unit cache
+
+    async def enhance(
+        self, base_report: Dict[str, Any], progress: Optional[TokenProgress] = None
+    ) -> Dict[str, Any]:
         """
         Async entrypoint to enrich base_report using Ollama API.
+        `progress`, if given, is awaited with the running token count while
+        the response streams in.
 
-        Returns a dict containing:
-          - report_tree: original report
+        Returns a dict containing (the base report itself is not repeated;
+        it stays in the heading/tree/details sections next to it):
           - enhanced_summary: parsed JSON or {"text": raw}
           - raw_ai: raw model output
+          - units: how many prompts were answered from the cache
           - error: error message if something failed
         """
         prompt = self._build_prompt(base_report)
+        if self.mode == "map_reduce" or (
+            self.mode == "auto" and len(prompt) > self.max_prompt_chars
+        ):
+            return await self.enhance_map_reduce(base_report, progress)
+
+        key = self._unit_key(
+            "report",
+            REPORT_PROMPT_VERSION,
+            base_report.get("heading", ""),
+            base_report.get("tree", ""),
+            base_report.get("dependencies", ""),
+            base_report.get("details", ""),
+        )
+        try:
+            raw, parsed, cached = await self._memoized(key, prompt, progress)
+        except Exception as exc:
+            return {**self._failure(exc), "units": {"total": 1}}
+        return {
+            "enhanced_summary": parsed,
+            "raw_ai": raw,
+            "units": {"total": 1, "cached": int(cached), "generated": int(not cached)},
+        }
+
+    async def enhance_map_reduce(
+        self, base_report: Dict[str, Any], progress: Optional[TokenProgress] = None
+    ) -> Dict[str, Any]:
+        """
+        Summarize each unit of `details` (a package, or a group of modules of
+        an oversized package) with bounded concurrency, then build the
+        six-key report from the summaries with one reduce prompt.
+
+        Every prompt is memoized by model, template version and content
+        hash, so re-enhancing a repository only pays for the units that
+        changed, and for the reduce step when any of them did.
+        """
+        project = base_report.get("heading", "").split("\n", 1)[0]
+        units = split_units(base_report.get("details", ""), self.max_prompt_chars)
+        dependencies = split_dependencies(base_report.get("dependencies", ""))
+        semaphore = asyncio.Semaphore(self.map_concurrency)
+        tokens = {"map": 0, "reduce": 0}
+        stats = {"total": len(units), "cached": 0, "generated": 0}
+
+        async def report(phase: str, count: int) -> None:
+            tokens[phase] = count
+            if progress:
+                await progress(tokens["map"] + tokens["reduce"])
+
+        async def summarize(package: str, text: str) -> Dict[str, Any]:
+            imports = "\n".join(dependencies.get(package, [])) or "None"
+            key = self._unit_key(
+                "package", MAP_PROMPT_VERSION, project, package, imports, text
+            )
+            # Units stream concurrently; each adds its own delta to the total
+            seen = 0
+
+            async def unit_progress(count: int) -> None:
+                nonlocal seen
+                delta, seen = count - seen, count
+                await report("map", tokens["map"] + delta)
+
+            async with semaphore:
+                try:
+                    _, summary, cached = await self._memoized(
+                        key,
+                        self._build_chunk_prompt(project, package, text, imports),
+                        unit_progress,
+                    )
+                except Exception as exc:
+                    logger.warning("Summary of package %s failed: %s", package, exc)
+                    return {"package": package, "error": str(exc)}
+            stats["cached" if cached else "generated"] += 1
+            return summary
+
+        summaries = await asyncio.gather(
+            *(summarize(package, text) for package, text in units)
+        )
+
+        summary_text = "\n".join(
+            json.dumps(summary, ensure_ascii=False) for summary in summaries
+        )
+        prompt = self._build_prompt(
+            base_report, details=summary_text, details_label="Package Summaries"
+        )
+        key = self._unit_key(
+            "reduce",
+            REPORT_PROMPT_VERSION,
+            base_report.get("heading", ""),
+            base_report.get("tree", ""),
+            base_report.get("dependencies", ""),
+            summary_text,
+        )
+
+        async def reduce_progress(count: int) -> None:
+            await report("reduce", count)
 
+        try:
+            raw, parsed, cached = await self._memoized(key, prompt, reduce_progress)
+        except Exception as exc:
+            return {**self._failure(exc), "units": stats}
+        logger.info(
+            "Enhanced %d units: %d cached, %d generated, reduce %s",
+            stats["total"],
+            stats["cached"],
+            stats["generated"],
+            "cached" if cached else "generated",
+        )
+        return {
+            "enhanced_summary": parsed,
+            "raw_ai": raw,
+            "units": {**stats, "reduce_cached": cached},
+        }
+
+    def _unit_key(self, kind: str, version: int, *parts: str) -> str:
+        return f"{self.model}:{kind}-v{version}:{content_hash(*parts)}"
+
+    async def _memoized(
+        self, key: str, prompt: str, progress: Optional[TokenProgress] = None
+    ) -> Tuple[str, Any, bool]:
+        """
+        Answer a prompt from the persistent unit cache, or generate it and
+        store the result. Returns the raw and parsed output and whether it
+        came from the cache.
+        """
+        store = (
+            get_store("ai_units", max_bytes=DEFAULT_CONFIG["ai_cache_max_bytes"])
+            if self.cache
+            else None
+        )
+        loop = asyncio.get_running_loop()
+        entry = await loop.run_in_executor(None, store.get, key) if store else None
+        if store:
+            metrics.cache_result("ai_units", entry is not None)
+        if entry is not None:
+            return entry["raw"], entry["parsed"], True
+
+        with span("enhance", model=self.model):
+            raw, parsed = await self._generate(prompt, progress)
+        # Output that is not JSON is served once but never reused
+        if store and not (isinstance(parsed, dict) and set(parsed) == {"text"}):
+            await loop.run_in_executor(
+                None, store.set, key, {"raw": raw, "parsed": parsed}
+            )
+        return raw, parsed, False
+
+    async def _generate(
+        self, prompt: str, progress: Optional[TokenProgress] = None
+    ) -> Tuple[str, Any]:
+        """Run one prompt with retries; return the raw and parsed output."""
         attempt = 0
         last_exc: Optional[Exception] = None
 
         while attempt <= self.retries:
             try:
-                raw = await self._call_ollama_api(prompt)
-                parsed = self._parse_ai_output(raw)
-                return {
-                    "report_tree": base_report,
-                    "enhanced_summary": parsed,
-                    "raw_ai": raw,
-                }
+                raw = await self._call_ollama_api(prompt, progress)
+                return raw, self._parse_ai_output(raw)
             except Exception as exc:
                 last_exc = exc
                 attempt += 1
                 if attempt <= self.retries:
                     wait_for = self.retry_backoff**attempt
                     logger.warning(
-                        # "AIEnhancer attempt %d/%d failed: %s — retrying in %.1fs",
-                        str(exc),
+                        "AIEnhancer attempt %d/%d failed: %s — retrying in %.1fs",
                         attempt,
                         self.retries,
                         exc,
@@ -71,11 +381,13 @@ class AIEnhancer:
                     )
                     await asyncio.sleep(wait_for)
 
+        raise last_exc or RuntimeError("Unknown error")
+
+    def _failure(self, exc: Exception) -> Dict[str, Any]:
         # If we reach here, all retries failed
-        err_msg = str(last_exc) if last_exc else "Unknown error"
+        err_msg = str(exc) or "Unknown error"
         logger.error("AIEnhancer failed after retries: %s", err_msg)
         return {
-            "report_tree": base_report,
             "enhanced_summary": {"error": err_msg},
             "raw_ai": None,
             "error": err_msg,
@@ -85,10 +397,17 @@ class AIEnhancer:
         """Sync wrapper for environments without asyncio."""
         return asyncio.run(self.enhance(base_report))
 
-    def _build_prompt(self, base_report: Dict[str, Any]) -> str:
+    def _build_prompt(
+        self,
+        base_report: Dict[str, Any],
+        details: Optional[str] = None,
+        details_label: str = "Module Details",
+    ) -> str:
         heading = base_report.get("heading", "")
         tree = base_report.get("tree", "")
-        details = base_report.get("details", "")
+        dependencies = base_report.get("dependencies", "") or "Not available"
+        if details is None:
+            details = base_report.get("details", "")
 
         """
         Placeholder for your custom prompt builder.
@@ -113,7 +432,11 @@ class AIEnhancer:
 
         {tree}
 
-        **Module Details:**
+        **Module Dependencies (computed from import statements):**
+
+        {dependencies}
+
+        **{details_label}:**
 
         {details}
 
@@ -137,6 +460,7 @@ class AIEnhancer:
 
         4. **Inter_module_relationships_workflows:**  
            - Describe how major components interact or depend on each other (e.g., how scheduling generation, validation, scoring, and tracking integrate).  
+           - Base dependencies and entry points on the computed Module Dependencies; explain them rather than guessing others.  
            - Highlight entry points such as command-line scripts, views, or management commands.
 
         5. **metadata_for_AI_parsing:**  
@@ -160,12 +484,55 @@ class AIEnhancer:
             """
         return prompt
 
-    async def _call_ollama_api(self, prompt: str) -> str:
+    def _build_chunk_prompt(
+        self, project: str, package: str, details: str, imports: str = "None"
+    ) -> str:
+        """
+        Map prompt: summarize a single package for the reduce step. Only the
+        project title is included, not the repo-wide counts, so the prompt
+        of an unchanged package stays the same when other packages change.
+        """
+        prompt = f"""
+        You are an AI assistant summarizing one package of a larger project so that a later step can write the full project report.
+
+        **Project:**
+
+        {project}
+
+        **Package `{package}` Details:**
+
+        {details}
+
+        **Imports between `{package}` and other packages (computed, importer -> imported):**
+
+        {imports}
+
+        ---
+
+        I don't want any extra texts, **The output MUST be a valid JSON object** with the following keys:
+
+        1. **package:** the package path, exactly `{package}`.
+        2. **responsibility:** one or two sentences on the package's role or domain.
+        3. **key_components:** list of the most important classes, functions and constants, each with a short description (e.g. "Class ScoreEngine: scores assignments").
+        4. **relationships:** list of the other packages this package imports or is imported by, from the computed imports above, and any external frameworks it extends, with a short reason.
+        5. **entry_points:** list of scripts, commands, views or other entry points defined here (empty list if none).
+
+        Keep it concise; it will be combined with the summaries of the other packages.
+            """
+        return prompt
+
+    async def _call_ollama_api(
+        self, prompt: str, progress: Optional[TokenProgress] = None
+    ) -> str:
         """
         Call Ollama HTTP API asynchronously.
         Endpoint: POST /api/generate
         Docs: https://github.com/ollama/ollama/blob/main/docs/api.md
         """
+        current_span().add(prompt_tokens=estimate_tokens(prompt))
+        if self.stream:
+            return await self._stream_ollama_api(prompt, progress)
+
         url = f"{self.ollama_host}/api/generate"
 
         payload = {
@@ -174,8 +541,8 @@ class AIEnhancer:
             "stream": False,  # easier parsing: whole response at once
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            resp = await client.post(url, json=payload)
+        async with self._session() as client:
+            resp = await client.post(url, json=payload, timeout=self.timeout)
 
         if resp.status_code != 200:
             raise RuntimeError(f"Ollama API error {resp.status_code}: {resp.text}")
@@ -184,6 +551,9 @@ class AIEnhancer:
 
         # Ollama API returns {"response": "..."} when stream=False
         output = data.get("response", "")
+        current_span().add(
+            response_tokens=data.get("eval_count") or estimate_tokens(output)
+        )
         if self.max_response_chars and len(output) > self.max_response_chars:
             logger.warning(
                 "Truncating AI response from %d to %d chars",
@@ -194,6 +564,72 @@ class AIEnhancer:
 
         return output
 
+    @asynccontextmanager
+    async def _session(self) -> AsyncIterator[httpx.AsyncClient]:
+        """
+        Yield an HTTP client for one generation: the shared pool (after
+        waiting for a per-model slot) or a throwaway client.
+        """
+        if self.client is None:
+            async with httpx.AsyncClient(timeout=self.timeout) as client:
+                yield client
+            return
+        async with self.client.slot(self.model) as client:
+            yield client
+
+    async def _stream_ollama_api(
+        self, prompt: str, progress: Optional[TokenProgress] = None
+    ) -> str:
+        """
+        Consume Ollama's NDJSON token stream. Generation is abandoned as soon
+        as the top-level JSON object closes; closing the connection makes
+        Ollama stop generating, so trailing chatter is never paid for.
+        """
+        url = f"{self.ollama_host}/api/generate"
+        payload = {"model": self.model, "prompt": prompt, "stream": True}
+
+        scanner = JsonObjectScanner()
+        tokens = 0
+        async with self._session() as client:
+            async with client.stream(
+                "POST", url, json=payload, timeout=self.timeout
+            ) as resp:
+                if resp.status_code != 200:
+                    body = (await resp.aread()).decode("utf-8", errors="replace")
+                    raise RuntimeError(f"Ollama API error {resp.status_code}: {body}")
+
+                # Close the line iterator on an early break, not at GC time
+                async with aclosing(resp.aiter_lines()) as lines:
+                    async for line in lines:
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise RuntimeError(f"Ollama API error: {chunk['error']}")
+
+                        tokens += 1
+                        if scanner.feed(chunk.get("response", "")):
+                            logger.debug("JSON object complete after %d tokens", tokens)
+                            break
+                        if chunk.get("done"):
+                            break
+                        if (
+                            self.max_response_chars
+                            and len(scanner.text) > self.max_response_chars
+                        ):
+                            logger.warning(
+                                "Stopping AI response at %d chars",
+                                self.max_response_chars,
+                            )
+                            break
+                        if progress and tokens % self.progress_every == 0:
+                            await progress(tokens)
+
+        current_span().add(response_tokens=tokens)
+        if progress:
+            await progress(tokens)
+        return scanner.obj_text or scanner.text
+
     def _parse_ai_output(self, response: Optional[str]) -> Any:
         """
         Try to parse AI response as JSON, fallback to {"text": response}.
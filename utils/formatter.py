@@ -1,55 +1,639 @@
 import logging
-from typing import Any, Dict, List
+import os
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from code_context_analyzer.formatters.default import LegacyCodeFormatter
 
+from utils.imports import ImportGraph, package_of
+from utils.settings import DEFAULT_CONFIG
+from utils.symbols import CLASS, CONSTANT, FUNCTION, METHOD, SymbolTable
+
+try:
+    import tiktoken
+except ImportError:  # Optional; token counts fall back to an estimate
+    tiktoken = None
+
 logger = logging.getLogger(__name__)
 
+PACKAGE_MARKER = "├── Package: "
+MODULE_MARKERS = ("│   ├── Module: ", "│   └── Module: ")
+DEPENDENCY_ARROW = " -> "
+
+# Lines per list in the dependencies section; the rest is counted, not shown
+MAX_PACKAGE_EDGES = 40
+MAX_LISTED_MODULES = 10
+
+MIN_PAGE_TOKENS = 256
+
+# Without a tokenizer: one token per run of up to 8 letters or 3 digits,
+# per other visible character, per newline and per run of spaces. BPE
+# vocabularies merge more than this, so the estimate errs high.
+TOKEN_RE = re.compile(r"[A-Za-z]{1,8}|\d{1,3}|\n| {2,}|\S")
+
+_encoder: Any = None
+
+
+def _get_encoder() -> Any:
+    """The configured tiktoken encoding, or False when it is unavailable."""
+    global _encoder
+    if _encoder is None:
+        _encoder = False
+        if tiktoken is not None:
+            try:
+                _encoder = tiktoken.get_encoding(DEFAULT_CONFIG["token_encoding"])
+            except Exception as e:
+                logger.warning(
+                    f"Tokenizer {DEFAULT_CONFIG['token_encoding']} unavailable, "
+                    f"estimating token counts: {str(e)}"
+                )
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    encoder = _get_encoder()
+    return f"tiktoken:{encoder.name}" if encoder else "estimate"
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of text, exact when tiktoken is installed."""
+    encoder = _get_encoder()
+    if encoder:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(TOKEN_RE.findall(text))
+
+
+def split_details(details: str) -> List[Tuple[str, str]]:
+    """
+    Split the formatter's `details` block into (package, text) chunks, one
+    per "Package:" section. Code fences and the project header are dropped.
+    """
+    chunks: List[Tuple[str, str]] = []
+    current: Optional[List[str]] = None
+    name = ""
+    for line in details.splitlines():
+        if line.startswith(PACKAGE_MARKER):
+            if current:
+                chunks.append((name, "\n".join(current).strip()))
+            name = line[len(PACKAGE_MARKER) :].split(" (", 1)[0].strip() or "Root"
+            current = [line]
+        elif current is not None and line.strip() != "```":
+            current.append(line)
+    if current:
+        chunks.append((name, "\n".join(current).strip()))
+    return chunks
+
+
+def split_dependencies(dependencies: str) -> Dict[str, List[str]]:
+    """
+    Package dependency lines ("importer -> imported (n)") of the formatter's
+    `dependencies` section, listed under both packages of each line.
+    """
+    by_package: Dict[str, List[str]] = {}
+    for line in dependencies.splitlines():
+        if DEPENDENCY_ARROW not in line or ":" in line:
+            continue
+        importer, _, rest = line.partition(DEPENDENCY_ARROW)
+        imported = rest.rsplit(" (", 1)[0]
+        for package in dict.fromkeys((importer.strip(), imported.strip())):
+            by_package.setdefault(package, []).append(line.strip())
+    return by_package
+
+
+def _split_lines(text: str, budget: int) -> List[str]:
+    """Split text at line boundaries into pieces of at most budget tokens."""
+    pieces: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in text.splitlines():
+        tokens = estimate_tokens(line) + 1
+        if tokens > budget:
+            # A single overlong line; cut it, it cannot be paged otherwise
+            cut = budget * 2
+            while cut > 1 and estimate_tokens(line[:cut]) + 4 > budget:
+                cut //= 2
+            line = line[:cut] + "..."
+            tokens = estimate_tokens(line) + 1
+        if current and size + tokens > budget:
+            pieces.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def _split_package(text: str, budget: int) -> List[str]:
+    """Split one package section into whole-module pieces within budget."""
+    if estimate_tokens(text) <= budget:
+        return [text]
+
+    first, *lines = text.splitlines()
+    header = f"{first.split(' (', 1)[0]} (continued)"
+    modules: List[List[str]] = []
+    for line in lines:
+        if line.startswith(MODULE_MARKERS) or not modules:
+            modules.append([line])
+        else:
+            modules[-1].append(line)
+
+    pieces: List[str] = []
+    current = [first]
+    size = estimate_tokens(first) + 1
+    room = budget - estimate_tokens(header) - 1
+    for module in modules:
+        block = "\n".join(module)
+        tokens = estimate_tokens(block) + 1
+        if tokens > room:
+            parts = _split_lines(block, room)
+        else:
+            parts = [block]
+        for part in parts:
+            part_tokens = estimate_tokens(part) + 1
+            if size + part_tokens > budget:
+                pieces.append("\n".join(current))
+                current, size = [header], estimate_tokens(header) + 1
+            current.append(part)
+            size += part_tokens
+    pieces.append("\n".join(current))
+    return pieces
+
+
+def first_page_room(token_budget: int) -> int:
+    """Most tokens that can be reserved on the first page of a report."""
+    return token_budget - MIN_PAGE_TOKENS // 2
+
+
+def paginate_block(title: str, text: str, token_budget: int) -> List[str]:
+    """
+    Lay text out as pages of at most token_budget tokens, each a fenced
+    block under a `## title:` header, split at line boundaries.
+    """
+    if token_budget < MIN_PAGE_TOKENS:
+        raise ValueError(f"token_budget must be at least {MIN_PAGE_TOKENS}")
+    wrapper = f"## {title}:\n```\n```"
+    room = token_budget - estimate_tokens(wrapper) - 2
+    # Wrap long lines at spaces first so that _split_lines need not cut them
+    lines: List[str] = []
+    for line in text.splitlines():
+        current = ""
+        for word in line.split(" "):
+            candidate = f"{current} {word}" if current else word
+            if current and estimate_tokens(candidate) + 1 > room:
+                lines.append(current)
+                candidate = word
+            current = candidate
+        lines.append(current)
+    return [
+        f"## {title}:\n```\n{piece}\n```"
+        for piece in _split_lines("\n".join(lines), room)
+    ]
+
+
+def paginate(report: Dict[str, Any], token_budget: int, reserved: int = 0) -> List[str]:
+    """
+    Lay a formatted report out as pages of at most token_budget tokens.
+
+    The first page starts with the heading, the tree and the module
+    dependencies; packages follow in the report's `ranking` order (most
+    important first), split at module boundaries when a package does not
+    fit a page. `reserved` tokens are kept free on the first page for
+    content sent alongside it; see first_page_room() for how much can be.
+    """
+    if token_budget < MIN_PAGE_TOKENS:
+        raise ValueError(f"token_budget must be at least {MIN_PAGE_TOKENS}")
+    if reserved > first_page_room(token_budget):
+        raise ValueError(
+            f"Cannot reserve {reserved} of {token_budget} tokens on the first page"
+        )
+
+    sections = split_details(report.get("details", ""))
+    order = {
+        item["package"]: rank for rank, item in enumerate(report.get("ranking", []))
+    }
+    sections.sort(key=lambda section: order.get(section[0], len(order)))
+
+    wrappers = {
+        "tree": "## Tree Structure:\n```\n```",
+        "dependencies": "## Module Dependencies:\n```\n```",
+        "details": "## Detailed Description:\n```\n```",
+    }
+    overhead = {kind: estimate_tokens(text) + 2 for kind, text in wrappers.items()}
+
+    units: List[Tuple[str, str]] = []
+    heading = report.get("heading", "").strip()
+    if heading:
+        units.append(("heading", heading))
+    room = token_budget - max(overhead.values())
+    for kind in ("tree", "dependencies"):
+        lines = [
+            line for line in report.get(kind, "").splitlines() if line.strip() != "```"
+        ]
+        units.extend((kind, piece) for piece in _split_lines("\n".join(lines), room))
+    for _, text in sections:
+        units.extend(("details", piece) for piece in _split_package(text, room))
+
+    pages: List[List[Tuple[str, str]]] = [[]]
+    size = reserved
+    kinds = set()
+    for kind, text in units:
+        tokens = estimate_tokens(text) + 1
+        extra = overhead.get(kind, 0) if kind not in kinds else 0
+        if (pages[-1] or size) and size + tokens + extra > token_budget:
+            pages.append([])
+            size, kinds = 0, set()
+            extra = overhead.get(kind, 0)
+        pages[-1].append((kind, text))
+        size += tokens + extra
+        kinds.add(kind)
+    # The first page is kept even when the reserved content fills it
+    return [_render_page(page) for page in pages]
+
+
+def _render_page(units: List[Tuple[str, str]]) -> str:
+    parts: List[str] = []
+    titles = {
+        "tree": "Tree Structure",
+        "dependencies": "Module Dependencies",
+        "details": "Detailed Description",
+    }
+    for kind in ("heading", "tree", "dependencies", "details"):
+        texts = [text for unit_kind, text in units if unit_kind == kind]
+        if not texts:
+            continue
+        body = "\n".join(texts)
+        if kind == "heading":
+            parts.append(body)
+        else:
+            parts.append(f"## {titles[kind]}:\n```\n{body}\n```")
+    return "\n\n".join(parts)
+
 
 class CustomFormatter(LegacyCodeFormatter):
-    def format(self, parsed_data: List[Dict[str, Any]]) -> Dict[str, str]:
-        """Generate the complete markup report with improved structure."""
-        if not parsed_data:
+    def format(self, table: SymbolTable) -> Dict[str, Any]:
+        """
+        Generate the report as separate heading, tree, dependencies and
+        details sections, collected from iter_sections(). No combined copy
+        is kept; readers join the sections themselves.
+        """
+        if not len(table):
             logger.warning("No data to format")
             return {
                 "heading": "No Data",
                 "tree": "No directory structure available",
                 "details": "No code details available",
-                "full": "No data to generate report",
+                "truncated": False,
             }
 
-        self.parsed_data = parsed_data
+        sections: Dict[str, List[str]] = {
+            "heading": [],
+            "tree": [],
+            "dependencies": [],
+            "details": [],
+        }
+        size = 0
+        truncated = False
+        for name, text in self.iter_sections(table):
+            if self.truncate_total and size + len(text) > self.truncate_total:
+                # Stop generating instead of rendering everything and cutting
+                logger.warning(
+                    f"Report truncated at {size} of {self.truncate_total} characters"
+                )
+                sections["details"].append("... (truncated due to length)\n```")
+                truncated = True
+                break
+            sections[name].append(text)
+            size += len(text) + 1
+
+        return {
+            "heading": "\n".join(sections["heading"]),
+            "tree": "\n".join(sections["tree"]),
+            "dependencies": "\n".join(sections["dependencies"]),
+            "details": "\n".join(sections["details"]),
+            "truncated": truncated,
+            "ranking": self._rank_packages(),
+        }
+
+    def iter_sections(self, table: SymbolTable) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (section, text) pairs in report order: the heading, the tree,
+        the module dependencies, then the details one package at a time, so
+        consumers can stop early or write the sections out without holding
+        the whole report.
+        """
+        self.table = table
+        self.graph = ImportGraph.of(table)
         self.project_name = self._extract_project_name()
+        self._root = os.path.commonpath(table.module_paths())
+        # Modules that failed to parse are listed without members
+        for module_id, error in table.errors.items():
+            logger.debug(f"Could not parse {table.path(module_id)}: {error}")
 
-        heading = self._generate_heading()
-        tree = self._generate_tree()
-        description = self._generate_detailed_description()
+        yield "heading", self._generate_heading()
+        yield "tree", self._generate_tree()
+        yield "dependencies", self._generate_dependencies()
+        yield "details", f"```\n{self.project_name}/"
 
-        # Create structured output
-        full_report = f"{heading}\n\n## Tree Structure:\n{tree}\n\n## Detailed Description:\n{description}"
+        packages: Dict[str, List[int]] = {}
+        for module in table.modules():
+            packages.setdefault(self._package_path(module), []).append(module)
+        for package_path, modules in sorted(packages.items()):
+            yield "details", self._describe_package(package_path, modules)
+        yield "details", "```"
 
-        # Apply truncation if needed
-        if self.truncate_total and len(full_report) > self.truncate_total:
-            logger.warning(
-                f"Report truncated from {len(full_report)} to {self.truncate_total} characters"
-            )
-            allowed_length = self.truncate_total
-            truncated_report = (
-                full_report[:allowed_length] + "\n\n... (truncated due to length)"
+    def describe_modules(
+        self, table: SymbolTable, modules: Optional[List[int]] = None
+    ) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (module, text) with each module's details rendered on its own,
+        under its package line, as the report would show it.
+        """
+        self.table = table
+        self._root = os.path.commonpath(table.module_paths())
+        for module in table.modules() if modules is None else modules:
+            yield module, self._describe_package(self._package_path(module), [module])
+
+    def _extract_project_name(self) -> str:
+        if not len(self.table):
+            return "unknown_project"
+        first_path = self.table.path(self.table.module_ids[0])
+        temp_dir = os.path.basename(os.path.dirname(first_path))
+        if temp_dir.startswith("repo_session_"):
+            return temp_dir
+        return "project"
+
+    def _generate_heading(self) -> str:
+        table = self.table
+        return (
+            f"# Project '{self.project_name}' Summary\n"
+            f"**{len(table.module_ids)}** file(s), "
+            f"**{table.count(CLASS)}** class(es), "
+            f"**{table.count(FUNCTION)}** function(s), "
+            f"**{table.count(CONSTANT)}** constant(s)\n"
+        )
+
+    def _package_path(self, module: int) -> str:
+        return os.path.dirname(os.path.relpath(self.table.path(module), self._root))
+
+    def _generate_tree(self) -> str:
+        """Directory tree, as upstream, with the common root computed once."""
+        table = self.table
+        dir_structure: Dict[str, List[str]] = {}
+        for module in table.modules():
+            classes = [table.symbol_name(c) for c in table.members(module, CLASS)]
+            file_display = os.path.basename(table.path(module))
+            if classes:
+                file_display += f" ({', '.join(classes[:self.depth])}"
+                if len(classes) > self.depth:
+                    file_display += f", +{len(classes) - self.depth} more)"
+                else:
+                    file_display += ")"
+            dir_structure.setdefault(self._package_path(module), []).append(
+                file_display
             )
-            return {
-                "heading": heading,
-                "tree": tree,
-                "details": description,
-                "full": truncated_report,
-                "truncated": True,
-                "original_length": len(full_report),
-            }
 
-        return {
-            "heading": heading,
-            "tree": tree,
-            "details": description,
-            "full": full_report,
-            "truncated": False,
+        tree_lines = ["```", f"{self.project_name}/"]
+        sorted_dirs = sorted(dir_structure)
+        for i, dir_name in enumerate(sorted_dirs):
+            is_last_dir = i == len(sorted_dirs) - 1
+            file_prefix = "    " if is_last_dir else "│   "
+            if dir_name != ".":
+                tree_lines.append(("└── " if is_last_dir else "├── ") + dir_name + "/")
+            files = dir_structure[dir_name]
+            for j, file_name in enumerate(files):
+                is_last_file = j == len(files) - 1
+                tree_lines.append(
+                    file_prefix + ("└── " if is_last_file else "├── ") + file_name
+                )
+        tree_lines.append("```")
+        return "\n".join(tree_lines)
+
+    def _describe_package(self, package_path: str, modules: List[int]) -> str:
+        """One package of the detailed description, in the upstream layout."""
+        table = self.table
+        members = {
+            module: {
+                kind: list(table.members(module, kind))
+                for kind in (CONSTANT, FUNCTION, CLASS)
+            }
+            for module in modules
         }
+        lines = []
+        package_name = package_path if package_path != "." else "Root"
+        class_count = sum(len(m[CLASS]) for m in members.values())
+        function_count = sum(len(m[FUNCTION]) for m in members.values())
+        constant_count = sum(len(m[CONSTANT]) for m in members.values())
+        lines.append(
+            f"\n{PACKAGE_MARKER}{package_name} "
+            f"({len(modules)} modules, {class_count} classes, "
+            f"{function_count} functions, {constant_count} constants)"
+        )
+
+        for i, module in enumerate(modules):
+            last_module = i == len(modules) - 1
+            lines.append(
+                f"{MODULE_MARKERS[last_module]}{os.path.basename(table.path(module))}"
+            )
+            member_prefix = "│       └── " if last_module else "│   │   ├── "
+
+            constants = members[module][CONSTANT]
+            if constants:
+                names = [table.symbol_name(const) for const in constants]
+                lines.append(
+                    f"{member_prefix}Constants ({len(constants)}): "
+                    f"{', '.join(names[:self.depth])}"
+                )
+                if len(constants) > self.depth:
+                    lines.append(
+                        f"{member_prefix}  ... and {len(constants) - self.depth} more"
+                    )
+
+            functions = members[module][FUNCTION]
+            if functions:
+                lines.append(f"{member_prefix}Functions ({len(functions)}):")
+                shown = functions[: self.depth]
+                for j, func in enumerate(shown):
+                    last = last_module and j == len(shown) - 1
+                    item_prefix = "│           └── " if last else "│   │   │   ├── "
+                    lines.append(f"{item_prefix}{self._signature(func)}")
+                    doc = table.symbol_doc(func)
+                    if self.doc_chars > 0 and doc:
+                        doc_prefix = (
+                            "│               └── " if last else "│   │   │   │   ├── "
+                        )
+                        lines.append(f"{doc_prefix}{self._format_docstring(doc)}")
+                if len(functions) > self.depth:
+                    more_prefix = (
+                        "│           └── " if last_module else "│   │   │   ├── "
+                    )
+                    lines.append(
+                        f"{more_prefix}... and "
+                        f"{len(functions) - self.depth} more functions"
+                    )
+
+            classes = members[module][CLASS]
+            if classes:
+                lines.append(f"{member_prefix}Classes ({len(classes)}):")
+                shown = classes[: self.depth]
+                for k, cls in enumerate(shown):
+                    last = last_module and k == len(shown) - 1
+                    item_prefix = "│           └── " if last else "│   │   │   ├── "
+                    bases = table.symbol_bases(cls)
+                    base_str = f" ({', '.join(bases)})" if bases else ""
+                    lines.append(f"{item_prefix}{table.symbol_name(cls)}{base_str}:")
+
+                    detail_prefix = (
+                        "│               └── " if last else "│   │   │   │   ├── "
+                    )
+                    doc = table.symbol_doc(cls)
+                    if self.doc_chars > 0 and doc:
+                        lines.append(f"{detail_prefix}{self._format_docstring(doc)}")
+
+                    methods = list(table.members(cls, METHOD))
+                    if methods:
+                        lines.append(f"{detail_prefix}Methods ({len(methods)}):")
+                        previewed = methods[: self.method_preview]
+                        for m, method in enumerate(previewed):
+                            last_method = last and m == len(previewed) - 1
+                            method_prefix = (
+                                "│                   └── "
+                                if last_method
+                                else "│   │   │   │   │   ├── "
+                            )
+                            lines.append(f"{method_prefix}{self._signature(method)}")
+                            doc = table.symbol_doc(method)
+                            if self.doc_chars > 0 and doc:
+                                method_doc_prefix = (
+                                    "│                       └── "
+                                    if last_method
+                                    else "│   │   │   │   │   │   ├── "
+                                )
+                                lines.append(
+                                    f"{method_doc_prefix}"
+                                    f"{self._format_docstring(doc)}"
+                                )
+                        if len(methods) > self.method_preview:
+                            more_prefix = (
+                                "│                   └── "
+                                if last
+                                else "│   │   │   │   │   ├── "
+                            )
+                            lines.append(
+                                f"{more_prefix}... and "
+                                f"{len(methods) - self.method_preview} more methods"
+                            )
+                if len(classes) > self.depth:
+                    more_prefix = (
+                        "│           └── " if last_module else "│   │   │   ├── "
+                    )
+                    lines.append(
+                        f"{more_prefix}... and "
+                        f"{len(classes) - self.depth} more classes"
+                    )
+        return "\n".join(lines)
+
+    def _signature(self, symbol: int) -> str:
+        sig = self.table.symbol_sig(symbol)
+        return f"{self.table.symbol_name(symbol)}{sig if sig is not None else '()'}"
+
+    def _generate_dependencies(self) -> str:
+        """
+        Module dependencies computed from the import graph: entry points,
+        the most imported modules, imports between packages and external
+        imports. Long lists are cut deterministically, largest first.
+        """
+        graph = self.graph
+        lines = [
+            "```",
+            f"Import graph: {len(graph)} modules, "
+            f"{graph.edge_count()} internal imports",
+        ]
+        if graph.entry_points:
+            entry_points = [graph.paths[i] for i in graph.entry_points]
+            lines.append(f"Entry points: {self._listing(entry_points)}")
+        most_imported = [
+            f"{graph.paths[i]} ({graph.fan_in(i)})"
+            for i in graph.most_imported(len(graph))
+        ]
+        if most_imported:
+            lines.append(f"Most imported: {self._listing(most_imported)}")
+
+        edges = sorted(
+            graph.package_edges().items(), key=lambda item: (-item[1], item[0])
+        )
+        if edges:
+            lines.append("Package dependencies (importer -> imported, imports):")
+            for (importer, imported), count in edges[:MAX_PACKAGE_EDGES]:
+                lines.append(f"{importer}{DEPENDENCY_ARROW}{imported} ({count})")
+            if len(edges) > MAX_PACKAGE_EDGES:
+                lines.append(
+                    f"... and {len(edges) - MAX_PACKAGE_EDGES} more package dependencies"
+                )
+        external = sorted(graph.external.items(), key=lambda item: (-item[1], item[0]))
+        if external:
+            names = [f"{name} ({count})" for name, count in external]
+            lines.append(f"External imports: {self._listing(names)}")
+        lines.append("```")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _listing(items: List[str]) -> str:
+        listing = ", ".join(items[:MAX_LISTED_MODULES])
+        if len(items) > MAX_LISTED_MODULES:
+            listing += f", +{len(items) - MAX_LISTED_MODULES} more"
+        return listing
+
+    def _rank_packages(self) -> List[Dict[str, Any]]:
+        """
+        Order packages by importance for budgeted output: packages with
+        entry points first, then by fan-in (modules elsewhere importing
+        from the package, plus classes elsewhere deriving from its classes)
+        and by size in modules and symbols.
+        """
+        table, graph = self.table, self.graph
+        packages: Dict[str, Dict[str, Any]] = {}
+        owners: Dict[str, str] = {}
+        module_packages = [package_of(path) for path in graph.paths]
+        for module, name in zip(table.module_ids, module_packages):
+            stats = packages.setdefault(
+                name,
+                {
+                    "package": name,
+                    "modules": 0,
+                    "symbols": 0,
+                    "fan_in": 0,
+                    "entry_points": [],
+                },
+            )
+            stats["modules"] += 1
+            classes = list(table.members(module, CLASS))
+            stats["symbols"] += len(classes)
+            stats["symbols"] += sum(1 for _ in table.members(module, FUNCTION))
+            stats["symbols"] += sum(
+                len(list(table.members(c, METHOD))) for c in classes
+            )
+            for cls in classes:
+                owners.setdefault(table.symbol_name(cls), name)
+
+        for i in graph.entry_points:
+            packages[module_packages[i]]["entry_points"].append(
+                os.path.basename(graph.paths[i])
+            )
+        for name, importers in graph.package_fan_in().items():
+            packages[name]["fan_in"] += importers
+        for module, name in zip(table.module_ids, module_packages):
+            for cls in table.members(module, CLASS):
+                for base in table.symbol_bases(cls):
+                    owner = owners.get(base.rsplit(".", 1)[-1])
+                    if owner and owner != name:
+                        packages[owner]["fan_in"] += 1
+
+        for stats in packages.values():
+            stats["score"] = (
+                20 * bool(stats["entry_points"])
+                + 5 * stats["fan_in"]
+                + stats["modules"]
+                + stats["symbols"]
+            )
+        return sorted(packages.values(), key=lambda s: (-s["score"], s["package"]))
@@ -0,0 +1,310 @@
+import os
+import posixpath
+from array import array
+from collections import Counter, deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.symbols import FUNCTION, IMPORT, SymbolTable
+
+# Modules that usually start a program
+ENTRY_POINT_MODULES = {
+    "__main__.py",
+    "main.py",
+    "app.py",
+    "cli.py",
+    "manage.py",
+    "server.py",
+    "wsgi.py",
+    "asgi.py",
+    "index.js",
+    "main.js",
+    "app.js",
+    "server.js",
+}
+
+PYTHON_EXTENSIONS = (".py", ".pyw", ".pyx", ".pxd", ".pyi")
+JS_EXTENSIONS = (".js", ".jsx", ".mjs", ".cjs")
+
+
+def package_of(path: str) -> str:
+    """Package (directory) of a module path, as named in the report."""
+    directory = posixpath.dirname(path)
+    return directory if directory not in ("", ".") else "Root"
+
+
+class ImportGraph:
+    """
+    Intra-repository import graph of one SymbolTable.
+
+    Nodes are module ordinals (positions in table.module_ids). Edges are
+    stored in CSR form: the modules imported by module i are
+    targets[offsets[i]:offsets[i + 1]], sorted and deduplicated, and the
+    reverse arrays hold the modules importing it. Imports that do not
+    resolve to an analyzed file count as external, by top-level name.
+    """
+
+    def __init__(self, table: SymbolTable):
+        # Relative to the modules' common root, as the report names them
+        self.paths, self._root_name = self._relative_paths(table)
+        self._by_path = {path: i for i, path in enumerate(self.paths)}
+        self._python_names = self._python_module_names()
+
+        edges: List[List[int]] = []
+        self.external: Counter = Counter()
+        for i, module in enumerate(table.module_ids):
+            targets = set()
+            for symbol in table.module_symbols(module):
+                if table.kind[symbol] != IMPORT:
+                    continue
+                resolved = self._resolve(
+                    i, table.symbol_name(symbol), table.symbol_bases(symbol)
+                )
+                if resolved:
+                    targets.update(resolved)
+                else:
+                    self.external[self._external_name(table.symbol_name(symbol))] += 1
+            targets.discard(i)
+            edges.append(sorted(targets))
+
+        self.offsets, self.targets = self._csr(edges)
+        reverse: List[List[int]] = [[] for _ in edges]
+        for source, targets in enumerate(edges):
+            for target in targets:
+                reverse[target].append(source)
+        self.reverse_offsets, self.reverse_targets = self._csr(reverse)
+        self.entry_points = [
+            i
+            for i, module in enumerate(table.module_ids)
+            if posixpath.basename(self.paths[i]) in ENTRY_POINT_MODULES
+            or any(
+                table.symbol_name(function) == "main"
+                for function in table.members(module, FUNCTION)
+            )
+        ]
+
+    @classmethod
+    def of(cls, table: SymbolTable) -> "ImportGraph":
+        """The table's graph, built on first use and cached with the table."""
+        graph = table.derived.get("imports")
+        if graph is None:
+            graph = table.derived["imports"] = cls(table)
+        return graph
+
+    @staticmethod
+    def _csr(lists: List[List[int]]) -> Tuple[array, array]:
+        offsets = array("I", [0])
+        targets = array("I")
+        for items in lists:
+            targets.extend(items)
+            offsets.append(len(targets))
+        return offsets, targets
+
+    @staticmethod
+    def _relative_paths(table: SymbolTable) -> Tuple[List[str], str]:
+        """Module paths relative to their common root, and the root's name."""
+        paths = table.module_paths()
+        if not paths:
+            return [], ""
+        root = os.path.commonpath(paths)
+        if len(paths) == 1:
+            root = os.path.dirname(root)
+        if root:
+            paths = [os.path.relpath(path, root) for path in paths]
+        return [path.replace(os.sep, "/") for path in paths], os.path.basename(root)
+
+    # Resolution
+
+    def _python_module_names(self) -> Dict[str, List[int]]:
+        """
+        Dotted names under which each Python module can be imported: its
+        path from the repository root, and its path from the outermost
+        directory that is not a package (e.g. below src/), so both
+        namespace packages and src layouts resolve. When the analyzed root
+        is itself a package, names start with the root's name.
+        """
+        packages = {
+            posixpath.dirname(path)
+            for path in self.paths
+            if posixpath.basename(path).startswith("__init__.")
+        }
+        prefix = []
+        if "" in packages and self._root_name:
+            prefix = [self._root_name]
+            packages = {
+                posixpath.join(self._root_name, p).rstrip("/") for p in packages
+            }
+        names: Dict[str, List[int]] = {}
+        for i, path in enumerate(self.paths):
+            stem, ext = posixpath.splitext(path)
+            if ext not in PYTHON_EXTENSIONS:
+                continue
+            parts = prefix + stem.split("/")
+            if parts[-1] == "__init__":
+                parts.pop()
+            anchor = len(parts) - 1
+            while anchor > 0 and "/".join(parts[:anchor]) in packages:
+                anchor -= 1
+            for start in {0, anchor}:
+                if parts[start:]:
+                    names.setdefault(".".join(parts[start:]), []).append(i)
+        return names
+
+    def _resolve(self, source: int, spec: str, names: List[str]) -> List[int]:
+        path = self.paths[source]
+        ext = posixpath.splitext(path)[1]
+        if ext in JS_EXTENSIONS:
+            return self._resolve_js(path, spec)
+        if ext not in PYTHON_EXTENSIONS:
+            return []
+
+        level = len(spec) - len(spec.lstrip("."))
+        if level:
+            directory = posixpath.dirname(path).split("/") if "/" in path else []
+            if level - 1 > len(directory):
+                return []
+            base = directory[: len(directory) - (level - 1)]
+            module = spec[level:]
+            if module:
+                base += module.split(".")
+            found = [
+                target
+                for name in names
+                for target in [self._python_path(base + [name])]
+                if target is not None
+            ]
+            if not found:
+                target = self._python_path(base)
+                if target is not None:
+                    found.append(target)
+            return found
+
+        found = [
+            target
+            for name in names
+            for target in [self._python_name(source, f"{spec}.{name}")]
+            if target is not None
+        ]
+        if not found:
+            target = self._python_name(source, spec)
+            if target is not None:
+                found.append(target)
+        return found
+
+    def _python_path(self, parts: List[str]) -> Optional[int]:
+        stem = "/".join(parts)
+        for ext in PYTHON_EXTENSIONS:
+            for candidate in (f"{stem}{ext}", f"{stem}/__init__{ext}"):
+                target = self._by_path.get(candidate.lstrip("/"))
+                if target is not None:
+                    return target
+        return None
+
+    def _python_name(self, source: int, dotted: str) -> Optional[int]:
+        candidates = self._python_names.get(dotted)
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        # Prefer the candidate closest to the importing module
+        source_dir = posixpath.dirname(self.paths[source])
+
+        def distance(target: int) -> Tuple[int, str]:
+            target_dir = posixpath.dirname(self.paths[target])
+            common = (
+                posixpath.commonpath([source_dir, target_dir])
+                if source_dir and target_dir
+                else ""
+            )
+            return -len(common), self.paths[target]
+
+        return min(candidates, key=distance)
+
+    def _resolve_js(self, path: str, spec: str) -> List[int]:
+        if not spec.startswith("."):
+            return []
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(path), spec))
+        candidates = [base]
+        candidates += [base + ext for ext in JS_EXTENSIONS]
+        candidates += [f"{base}/index{ext}" for ext in JS_EXTENSIONS]
+        for candidate in candidates:
+            target = self._by_path.get(candidate)
+            if target is not None:
+                return [target]
+        return []
+
+    @staticmethod
+    def _external_name(spec: str) -> str:
+        if spec.startswith("."):
+            return spec
+        if spec.startswith("@"):
+            return "/".join(spec.split("/")[:2])
+        return spec.split("/")[0].split(".")[0]
+
+    # Queries
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def imports(self, i: int) -> array:
+        """Modules that module i imports."""
+        return self.targets[self.offsets[i] : self.offsets[i + 1]]
+
+    def dependents(self, i: int) -> array:
+        """Modules that import module i."""
+        return self.reverse_targets[
+            self.reverse_offsets[i] : self.reverse_offsets[i + 1]
+        ]
+
+    def fan_out(self, i: int) -> int:
+        return self.offsets[i + 1] - self.offsets[i]
+
+    def fan_in(self, i: int) -> int:
+        return self.reverse_offsets[i + 1] - self.reverse_offsets[i]
+
+    def transitive_dependents(self, i: int) -> List[int]:
+        """Every module that imports module i directly or indirectly, nearest first."""
+        seen = {i}
+        order = []
+        queue = deque([i])
+        while queue:
+            for source in self.dependents(queue.popleft()):
+                if source not in seen:
+                    seen.add(source)
+                    order.append(source)
+                    queue.append(source)
+        return order
+
+    def package_edges(self) -> Counter:
+        """Import edges between different packages, by (importer, imported)."""
+        packages = [package_of(path) for path in self.paths]
+        edges: Counter = Counter()
+        for source in range(len(self.paths)):
+            for target in self.imports(source):
+                if packages[source] != packages[target]:
+                    edges[packages[source], packages[target]] += 1
+        return edges
+
+    def package_fan_in(self) -> Counter:
+        """Per package, the modules of other packages importing from it."""
+        packages = [package_of(path) for path in self.paths]
+        importers: Dict[str, set] = {}
+        for target in range(len(self.paths)):
+            for source in self.dependents(target):
+                if packages[source] != packages[target]:
+                    importers.setdefault(packages[target], set()).add(source)
+        return Counter({package: len(found) for package, found in importers.items()})
+
+    def most_imported(self, limit: int) -> Iterator[int]:
+        ranked = sorted(
+            range(len(self.paths)), key=lambda i: (-self.fan_in(i), self.paths[i])
+        )
+        return (i for i in ranked[:limit] if self.fan_in(i))
+
+    def most_importing(self, limit: int) -> Iterator[int]:
+        ranked = sorted(
+            range(len(self.paths)), key=lambda i: (-self.fan_out(i), self.paths[i])
+        )
+        return (i for i in ranked[:limit] if self.fan_out(i))
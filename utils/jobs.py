@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.settings import DEFAULT_CONFIG
+from utils.singleflight import ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+JobFunction = Callable[[ProgressCallback], Awaitable[Any]]
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    """Record of one submitted job; kept after completion for polling."""
+
+    id: str
+    kind: str
+    description: Dict[str, Any]
+    fn: JobFunction
+    status: str = QUEUED
+    stage: str = "Queued"
+    progress: float = 0.0
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+    done: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def status_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 1),
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            **self.description,
+        }
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue drained by a fixed set of worker tasks.
+
+    submit() returns immediately with a job id; workers run the jobs in
+    submission order and record stage, percent, result and error on the
+    Job, which stays available for `ttl` seconds after it finishes. Jobs
+    can be cancelled while queued or running.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queued: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.config = DEFAULT_CONFIG
+        self.workers = workers or self.config["job_workers"]
+        self.max_queued = max_queued or self.config["job_queue_size"]
+        self.ttl = ttl if ttl is not None else self.config["job_ttl"]
+        self.jobs: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start the workers on the running loop; called on first submit."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Cancel every job and worker."""
+        for job in self.jobs.values():
+            if job.status not in FINISHED:
+                self.cancel(job.id)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def submit(
+        self,
+        kind: str,
+        fn: JobFunction,
+        description: Optional[Dict[str, Any]] = None,
+    ) -> Job:
+        self.start()
+        self._prune()
+        job = Job(uuid.uuid4().hex, kind, description or {}, fn)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(
+                f"Job queue is full ({self.max_queued} jobs waiting); retry later"
+            )
+        self.jobs[job.id] = job
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        if job.task is not None:
+            # The worker records the cancellation once the task unwinds
+            job.task.cancel()
+        else:
+            # Still queued; the worker skips it when dequeued
+            self._finish(job, CANCELLED, stage="Cancelled")
+        return job
+
+    async def wait(self, job: Job, timeout: float) -> bool:
+        """Wait up to timeout seconds for job to finish; True if it has."""
+        if job.done.is_set():
+            return True
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        counts = {status: 0 for status in (QUEUED, RUNNING, *FINISHED)}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {**counts, "workers": self.workers, "max_queued": self.max_queued}
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status == QUEUED:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        async def publish(
+            value: float, total: Optional[float] = None, message: Optional[str] = None
+        ) -> None:
+            job.progress = 100 * value / (total or 100)
+            if message:
+                job.stage = message
+
+        job.status = RUNNING
+        job.started = time.time()
+        job.task = asyncio.create_task(job.fn(publish))
+        try:
+            result = await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            job.task.cancel()
+            self._finish(job, CANCELLED, stage="Cancelled")
+            # The job's task may finish first even when the worker itself
+            # is being stopped; only the worker's own request re-raises
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            self._finish(job, FAILED, error=str(e))
+        else:
+            if isinstance(result, dict) and result.get("error"):
+                self._finish(job, FAILED, error=str(result["error"]), result=result)
+            else:
+                self._finish(job, SUCCEEDED, result=result, stage="Complete")
+        finally:
+            job.task = None
+
+    def _finish(
+        self,
+        job: Job,
+        status: str,
+        result: Any = None,
+        error: Optional[str] = None,
+        stage: Optional[str] = None,
+    ) -> None:
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if stage:
+            job.stage = stage
+        if status == SUCCEEDED:
+            job.progress = 100.0
+        job.done.set()
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than the retention period."""
+        cutoff = time.time() - self.ttl
+        for job_id in [
+            job.id
+            for job in self.jobs.values()
+            if job.finished is not None and job.finished < cutoff
+        ]:
+            del self.jobs[job_id]
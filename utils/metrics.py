@@ -0,0 +1,376 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+    600.0,
+)
+
+STAGE_DURATION = "cca_stage_duration_seconds"
+STAGE_ERRORS = "cca_stage_errors_total"
+CACHE_REQUESTS = "cca_cache_requests_total"
+
+HELP = {
+    STAGE_DURATION: "Wall time of pipeline stages",
+    STAGE_ERRORS: "Stage runs that raised",
+    CACHE_REQUESTS: "Cache lookups by cache and result",
+    "cca_stage_bytes_cloned_total": "Bytes added to repository mirrors",
+    "cca_stage_files_parsed_total": "Files parsed",
+    "cca_stage_files_reused_total": "Files answered from the parse cache",
+    "cca_stage_symbols_total": "Symbols extracted",
+    "cca_stage_chars_total": "Characters of formatted reports",
+    "cca_stage_prompt_tokens_total": "Prompt tokens sent to the Ollama host",
+    "cca_stage_response_tokens_total": "Response tokens received from the Ollama host",
+    "cca_stage_bytes_total": "Payload bytes read or written by the cache",
+    "cca_stage_inputs_total": "Texts sent to the embeddings endpoint",
+    "cca_stage_running": "Requests running per scheduler stage",
+    "cca_stage_queued": "Requests waiting per scheduler stage",
+    "cca_jobs": "Background jobs by status",
+    "cca_ollama_in_flight": "Ollama requests running per model",
+    "cca_ollama_waiting": "Ollama requests waiting per model",
+    "cca_in_flight_analyses": "Distinct analyses running",
+    "cca_cache_memory_entries": "Entries in the in-memory analysis cache",
+    "cca_cache_memory_bytes": "Serialized bytes in the in-memory analysis cache",
+    "cca_process_resident_memory_bytes": "Resident set size of the server process",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in items
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate, interpolating linearly within the bucket, like PromQL."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class Span:
+    """
+    One run of a stage within a request. Counts added to it become
+    counters labelled like the stage when the span ends.
+    """
+
+    def __init__(self, stage: str, labels: Dict[str, Any]):
+        self.stage = stage
+        self.labels = labels
+        self.counts: Dict[str, float] = {}
+        self.attributes: Dict[str, Any] = {}
+        self.started = time.time()
+        self.duration: Optional[float] = None
+        self.outcome = "ok"
+
+    def add(self, **counts: float) -> None:
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def set(self, **attributes: Any) -> None:
+        """Attach details that are logged with the span but not aggregated."""
+        self.attributes.update(attributes)
+
+    def label(self, **labels: Any) -> None:
+        """Refine the span's labels once they are known, e.g. a cache result."""
+        self.labels.update(labels)
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            **self.labels,
+            "started": round(self.started, 3),
+            "duration": round(self.duration or 0.0, 6),
+            "outcome": self.outcome,
+            **self.counts,
+            **self.attributes,
+        }
+
+
+class _NullSpan(Span):
+    """Stands in for the current span outside of any span."""
+
+    def __init__(self):
+        super().__init__("", {})
+
+    def add(self, **counts: float) -> None:
+        pass
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def label(self, **labels: Any) -> None:
+        pass
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("cca_span", default=None)
+_null_span = _NullSpan()
+
+
+class Metrics:
+    """
+    Process-wide counters, gauges and stage duration histograms, plus a
+    ring buffer of the most recent spans. Safe to update from executor
+    threads; read by the /metrics route and the get_server_stats tool.
+    """
+
+    def __init__(self, recent_spans: Optional[int] = None):
+        self.started = time.time()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self.spans: Deque[Dict[str, Any]] = deque(
+            maxlen=recent_spans or DEFAULT_CONFIG["metrics_recent_spans"]
+        )
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def cache_result(self, cache: str, hit: bool, count: int = 1) -> None:
+        if count:
+            self.inc(
+                CACHE_REQUESTS, count, cache=cache, result="hit" if hit else "miss"
+            )
+
+    @contextmanager
+    def span(self, stage: str, **labels: Any) -> Iterator[Span]:
+        """
+        Time a stage. The span is also the current span of the block, so
+        code further down can add counts to it without a reference.
+        """
+        span = Span(stage, labels)
+        token = _current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.outcome = "error"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            _current.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        # Spans wrap in-memory cache hits too: label once, lock once
+        labels = _labels({"stage": span.stage, **span.labels})
+        record = span.record()
+        with self._lock:
+            key = (STAGE_DURATION, labels)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(span.duration)
+            if span.outcome == "error":
+                key = (STAGE_ERRORS, labels)
+                self.counters[key] = self.counters.get(key, 0) + 1
+            for name, value in span.counts.items():
+                key = (f"cca_stage_{name}_total", labels)
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.spans.append(record)
+
+    # Reading
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [
+                (key, list(h.counts), h.sum, h.count, h.buckets)
+                for key, h in histograms
+            ]
+
+        lines: List[str] = []
+        seen = set()
+
+        def header(name: str, kind: str) -> None:
+            if name not in seen:
+                seen.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {name} {HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        header("cca_uptime_seconds", "gauge")
+        lines.append(f"cca_uptime_seconds {time.time() - self.started:.3f}")
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), value in gauges:
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(labels, ("le", f"{bound:g}"))
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            le = _format_labels(labels, ("le", "+Inf"))
+            lines.append(f"{name}_bucket{le} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, recent: int = 20) -> Dict[str, Any]:
+        """Per-stage timings and counts, cache hit ratios and recent spans."""
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {
+                key: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95))
+                for key, h in self.histograms.items()
+            }
+            spans = list(self.spans)[-recent:] if recent > 0 else []
+
+        stages: Dict[str, Dict[str, Any]] = {}
+        for (name, labels), (count, total, p50, p95) in sorted(histograms.items()):
+            if name != STAGE_DURATION:
+                continue
+            label_map = dict(labels)
+            stage = stages.setdefault(
+                label_map.pop("stage"),
+                {"runs": 0, "errors": 0, "total_seconds": 0.0, "by_labels": []},
+            )
+            stage["runs"] += count
+            stage["total_seconds"] = round(stage["total_seconds"] + total, 6)
+            stage["by_labels"].append(
+                {
+                    **label_map,
+                    "runs": count,
+                    "mean_seconds": round(total / count, 6) if count else None,
+                    "p50_seconds": round(p50, 6) if p50 is not None else None,
+                    "p95_seconds": round(p95, 6) if p95 is not None else None,
+                }
+            )
+
+        caches: Dict[str, Dict[str, Any]] = {}
+        for (name, labels), value in sorted(counters.items()):
+            label_map = dict(labels)
+            if name == CACHE_REQUESTS:
+                cache = caches.setdefault(label_map["cache"], {"hit": 0, "miss": 0})
+                cache[label_map["result"]] = cache.get(label_map["result"], 0) + value
+            elif name.startswith("cca_stage_") and "stage" in label_map:
+                stage = stages.setdefault(
+                    label_map["stage"],
+                    {"runs": 0, "errors": 0, "total_seconds": 0.0, "by_labels": []},
+                )
+                if name == STAGE_ERRORS:
+                    stage["errors"] += value
+                else:
+                    count = name[len("cca_stage_") : -len("_total")]
+                    stage[count] = stage.get(count, 0) + value
+        for cache in caches.values():
+            lookups = cache["hit"] + cache["miss"]
+            cache["hit_ratio"] = round(cache["hit"] / lookups, 4) if lookups else None
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "stages": stages,
+            "caches": caches,
+            "recent_spans": spans,
+        }
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current resident set size of this process, where /proc is available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+# Shared by every module of the server, like the disk cache stores
+metrics = Metrics()
+
+
+def span(stage: str, **labels: Any):
+    """Time a stage in the process-wide registry; see Metrics.span."""
+    return metrics.span(stage, **labels)
+
+
+def current_span() -> Span:
+    """The innermost span of the running task or thread, or a no-op span."""
+    return _current.get() or _null_span
@@ -0,0 +1,453 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from dataclasses import dataclass
+from functools import partial
+from typing import (
+    IO,
+    AsyncContextManager,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from utils.metrics import span
+from utils.repository import (
+    get_head_revision,
+    is_partial_clone,
+    is_remote_url,
+    normalize_repo_url,
+    run_git,
+)
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+FETCHED_MARKER = "cca-fetched"
+USED_MARKER = "cca-last-used"
+SIZE_MARKER = "cca-size"
+
+# Branches and tags only; a plain --mirror would also fetch refs/pull/*
+FETCH_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+
+
+@dataclass
+class Checkout:
+    """A working tree handed out by the MirrorPool for one request."""
+
+    repo_url: str
+    path: str
+    revision: Optional[str]
+    mirror: Optional[str] = None
+    temporary: bool = False
+    # Shared flock held while the worktree is in use, so eviction skips it
+    in_use: Optional[IO] = None
+
+
+class MirrorPool:
+    """
+    Pool of bare mirrors, one per remote, updated with incremental fetches.
+
+    Each request gets a detached worktree of the resolved commit instead of a
+    fresh clone. A per-repository lock (a thread lock plus an flock on a
+    sidecar file, so it also holds across worker processes) ensures that
+    concurrent requests for the same repository fetch only once. When the
+    mirrors outgrow `max_bytes` the least recently used ones are evicted.
+
+    Requests that only need a subtree get a sparse worktree. If no mirror
+    exists yet, theirs is created blobless, so only the blobs that are
+    checked out are downloaded; it is completed the first time a request
+    needs the whole tree.
+
+    Local paths that are not URLs are analyzed in place, as before.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.config = DEFAULT_CONFIG
+        self.root = root or self.config["mirror_dir"]
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else self.config["mirror_max_bytes"]
+        )
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def mirror_path(self, repo_url: str) -> str:
+        digest = hashlib.sha256(normalize_repo_url(repo_url).encode()).hexdigest()
+        return os.path.join(self.root, f"{digest[:24]}.git")
+
+    @contextmanager
+    def lock(self, mirror: str, blocking: bool = True) -> Iterator[bool]:
+        """Hold the thread and process lock for one mirror."""
+        with self._locks_guard:
+            thread_lock = self._locks.setdefault(mirror, threading.Lock())
+
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(f"{mirror}.lock", "a") as lock_file:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                try:
+                    fcntl.flock(lock_file, flags)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+    def ensure_mirror(self, repo_url: str, blobless: bool = False) -> str:
+        """
+        Create or incrementally update the bare mirror for repo_url. With
+        `blobless`, a new mirror is cloned without blobs; otherwise a
+        blobless mirror is completed.
+        """
+        mirror = self.mirror_path(repo_url)
+        requested_at = time.time()
+
+        with self.lock(mirror), span("clone", op="fetch") as clone_span:
+            size_before = self._recorded_size(mirror)
+            if not os.path.isdir(mirror):
+                logger.info(
+                    f"Creating {'blobless ' if blobless else ''}mirror for {repo_url}"
+                )
+                clone_span.label(op="clone")
+                tmp = tempfile.mkdtemp(prefix="mirror_", dir=self.root)
+                clone = ["clone", "--bare", "--quiet"]
+                if blobless:
+                    clone.append("--filter=blob:none")
+                try:
+                    run_git(
+                        [*clone, repo_url, tmp],
+                        timeout=self.config["clone_timeout"],
+                    )
+                    self._set_refspecs(tmp)
+                    os.rename(tmp, mirror)
+                except BaseException:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    raise
+            elif not blobless and is_partial_clone(mirror):
+                logger.info(f"Fetching all blobs for {repo_url}")
+                clone_span.label(op="complete")
+                self._complete(mirror)
+            elif self._last_fetch(mirror) < requested_at:
+                # Nobody fetched while we waited for the lock
+                logger.info(f"Fetching updates for {repo_url}")
+                self._migrate_mirror(mirror)
+                run_git(
+                    ["fetch", "--prune", "--quiet", "origin"],
+                    cwd=mirror,
+                    timeout=self.config["clone_timeout"],
+                )
+            else:
+                logger.debug(f"Mirror for {repo_url} was fetched while waiting")
+                clone_span.label(op="reuse")
+
+            self._touch(mirror, FETCHED_MARKER)
+            self._touch(mirror, USED_MARKER)
+            size = self._record_size(mirror)
+            clone_span.add(bytes_cloned=max(size - size_before, 0))
+
+        self.evict(keep=mirror)
+        return mirror
+
+    def acquire(
+        self, repo_url: str, branch: str, sparse_paths: Optional[List[str]] = None
+    ) -> Checkout:
+        """
+        Check out repo_url@branch into a fresh detached worktree. With
+        `sparse_paths`, only those directories (and the files directly in
+        their parents) are checked out.
+        """
+        if not is_remote_url(repo_url):
+            if not os.path.isdir(repo_url):
+                raise ValueError(f"Invalid local path: {repo_url}")
+            path = os.path.abspath(repo_url)
+            return Checkout(repo_url, path, get_head_revision(path))
+
+        # Keep the repo_session_ prefix; the formatter derives the project
+        # name from it
+        path = tempfile.mkdtemp(prefix="repo_session_")
+        try:
+            with self._pinned_mirror(repo_url, bool(sparse_paths)) as pinned:
+                mirror, in_use = pinned
+                revision = self.resolve(mirror, branch)
+                with span("clone", op="worktree"):
+                    if sparse_paths:
+                        self._add_sparse_worktree(mirror, path, revision, sparse_paths)
+                    else:
+                        run_git(
+                            ["worktree", "add", "--detach", "--force", path, revision],
+                            cwd=mirror,
+                            timeout=self.config["clone_timeout"],
+                        )
+                self._touch(mirror, USED_MARKER)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        return Checkout(
+            repo_url, path, revision, mirror=mirror, temporary=True, in_use=in_use
+        )
+
+    def acquire_bare(self, repo_url: str, branch: str) -> Checkout:
+        """
+        Hand out the bare mirror itself, with repo_url@branch resolved, for
+        readers that only need git objects. No worktree is created; the
+        mirror is protected from eviction until release().
+        """
+        # Blobless when cloned for this: only the blobs read are fetched,
+        # and an existing blobless mirror is never completed here
+        with self._pinned_mirror(repo_url, blobless=True) as (mirror, in_use):
+            revision = self.resolve(mirror, branch)
+            self._touch(mirror, USED_MARKER)
+        return Checkout(repo_url, mirror, revision, mirror=mirror, in_use=in_use)
+
+    @contextmanager
+    def _pinned_mirror(self, repo_url: str, blobless: bool) -> Iterator[Tuple[str, IO]]:
+        """
+        Ensure the mirror for repo_url and hold its lock, with a shared lock
+        on its .use file that keeps evict() away until the caller closes
+        the file. On error the file is closed here. A mirror evicted between
+        the fetch and taking the lock is fetched again once.
+        """
+        for _ in range(2):
+            mirror = self.ensure_mirror(repo_url, blobless=blobless)
+            in_use = open(f"{mirror}.use", "a")
+            try:
+                with self.lock(mirror):
+                    if os.path.isdir(mirror):
+                        fcntl.flock(in_use, fcntl.LOCK_SH)
+                        yield mirror, in_use
+                        return
+            except BaseException:
+                in_use.close()
+                raise
+            in_use.close()
+            logger.info(f"Mirror for {repo_url} was evicted; fetching it again")
+        raise RuntimeError(f"Mirror for {repo_url} was evicted twice")
+
+    def release(self, checkout: Checkout) -> None:
+        """Remove a worktree handed out by acquire()."""
+        if not checkout.temporary:
+            if checkout.in_use is not None:
+                checkout.in_use.close()
+            return
+        try:
+            with self.lock(checkout.mirror):
+                run_git(
+                    ["worktree", "remove", "--force", checkout.path],
+                    cwd=checkout.mirror,
+                )
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.warning(f"Failed to remove worktree {checkout.path}: {str(e)}")
+            shutil.rmtree(checkout.path, ignore_errors=True)
+            with self.lock(checkout.mirror):
+                run_git(["worktree", "prune"], cwd=checkout.mirror)
+        finally:
+            if checkout.in_use is not None:
+                checkout.in_use.close()
+
+    def _add_sparse_worktree(
+        self, mirror: str, path: str, revision: str, sparse_paths: List[str]
+    ) -> None:
+        # Check out after narrowing, so a blobless mirror fetches only the
+        # blobs inside the cone
+        run_git(
+            ["worktree", "add", "--detach", "--no-checkout", "--force", path, revision],
+            cwd=mirror,
+        )
+        run_git(["sparse-checkout", "set", "--cone", "--", *sparse_paths], cwd=path)
+        run_git(
+            ["checkout", "--quiet", "--detach", revision],
+            cwd=path,
+            timeout=self.config["clone_timeout"],
+        )
+
+    @contextmanager
+    def open(self, repo_url: str, branch: str) -> Iterator[Checkout]:
+        checkout = self.acquire(repo_url, branch)
+        try:
+            yield checkout
+        finally:
+            self.release(checkout)
+
+    @asynccontextmanager
+    async def open_async(
+        self,
+        repo_url: str,
+        branch: str,
+        admission: Optional[AsyncContextManager] = None,
+        bare: bool = False,
+        sparse_paths: Optional[List[str]] = None,
+    ) -> AsyncIterator[Checkout]:
+        """
+        Like open(), with the git work running off the event loop. If given,
+        `admission` is held while the worktree is being checked out. With
+        `bare`, the mirror is handed out instead of a worktree; with
+        `sparse_paths`, the worktree only contains those directories.
+        """
+        loop = asyncio.get_running_loop()
+        if bare:
+            acquire = partial(self.acquire_bare, repo_url, branch)
+        else:
+            acquire = partial(self.acquire, repo_url, branch, sparse_paths)
+        async with admission or nullcontext():
+            checkout = await loop.run_in_executor(None, acquire)
+        try:
+            yield checkout
+        finally:
+            await loop.run_in_executor(None, self.release, checkout)
+
+    def resolve(self, mirror: str, branch: str) -> str:
+        """Resolve a branch, tag or SHA to a commit inside a mirror."""
+        try:
+            return run_git(
+                ["rev-parse", "--verify", f"{branch}^{{commit}}"], cwd=mirror
+            )
+        except subprocess.CalledProcessError:
+            raise ValueError(f"Unknown branch or revision: {branch}")
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Delete least recently used mirrors until the pool fits max_bytes."""
+        if not self.max_bytes or not os.path.isdir(self.root):
+            return []
+
+        mirrors = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.endswith(".git"):
+                mirrors.append(
+                    (
+                        self._marker_time(entry.path, USED_MARKER),
+                        self._recorded_size(entry.path),
+                        entry.path,
+                    )
+                )
+
+        total = sum(size for _, size, _ in mirrors)
+        evicted = []
+        for _, size, mirror in sorted(mirrors):
+            if total <= self.max_bytes:
+                break
+            if mirror == keep:
+                continue
+            # Skip mirrors that another request is fetching or has checked out
+            with self.lock(mirror, blocking=False) as locked:
+                if not locked or not self._try_evict(mirror):
+                    continue
+            total -= size
+            evicted.append(mirror)
+        return evicted
+
+    def _try_evict(self, mirror: str) -> bool:
+        with open(f"{mirror}.use", "a") as in_use:
+            try:
+                fcntl.flock(in_use, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            logger.info(f"Evicting mirror {mirror}")
+            shutil.rmtree(mirror, ignore_errors=True)
+            return True
+
+    def _set_refspecs(self, mirror: str) -> None:
+        """Make later fetches update branches and tags only."""
+        run_git(
+            ["config", "--replace-all", "remote.origin.fetch", FETCH_REFSPECS[0]],
+            cwd=mirror,
+        )
+        for refspec in FETCH_REFSPECS[1:]:
+            run_git(["config", "--add", "remote.origin.fetch", refspec], cwd=mirror)
+
+    def _migrate_mirror(self, mirror: str) -> None:
+        """Narrow a mirror created with `clone --mirror` to branches and tags."""
+        try:
+            run_git(["config", "--get", "remote.origin.mirror"], cwd=mirror)
+        except subprocess.CalledProcessError:
+            return
+        logger.info(f"Dropping pull request refs from {mirror}")
+        self._set_refspecs(mirror)
+        run_git(["config", "--unset", "remote.origin.mirror"], cwd=mirror)
+        refs = run_git(["for-each-ref", "--format=%(refname)"], cwd=mirror)
+        stale = [
+            ref
+            for ref in refs.splitlines()
+            if not ref.startswith(("refs/heads/", "refs/tags/"))
+        ]
+        if stale:
+            subprocess.run(
+                ["git", "update-ref", "--stdin"],
+                cwd=mirror,
+                input="".join(f"delete {ref}\n" for ref in stale),
+                capture_output=True,
+                text=True,
+                timeout=self.config["clone_timeout"],
+                check=True,
+            )
+
+    def _complete(self, mirror: str) -> None:
+        """Turn a blobless mirror into a full one with `git fetch --refetch`."""
+        blob_filter = run_git(
+            ["config", "--get", "remote.origin.partialclonefilter"], cwd=mirror
+        )
+        run_git(["config", "--unset", "remote.origin.partialclonefilter"], cwd=mirror)
+        try:
+            run_git(
+                ["fetch", "--refetch", "--prune", "--quiet", "origin"],
+                cwd=mirror,
+                timeout=self.config["clone_timeout"],
+            )
+        except BaseException:
+            # Still missing blobs; keep fetching lazily until the next attempt
+            run_git(
+                ["config", "remote.origin.partialclonefilter", blob_filter],
+                cwd=mirror,
+            )
+            raise
+        run_git(["config", "--unset", "remote.origin.promisor"], cwd=mirror)
+
+    def _touch(self, mirror: str, marker: str) -> None:
+        with open(os.path.join(mirror, marker), "a"):
+            pass
+        os.utime(os.path.join(mirror, marker))
+
+    def _marker_time(self, mirror: str, marker: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(mirror, marker))
+        except OSError:
+            return 0.0
+
+    def _last_fetch(self, mirror: str) -> float:
+        return self._marker_time(mirror, FETCHED_MARKER)
+
+    def _record_size(self, mirror: str) -> int:
+        size = 0
+        for dirpath, _, filenames in os.walk(mirror):
+            for filename in filenames:
+                try:
+                    size += os.lstat(os.path.join(dirpath, filename)).st_size
+                except OSError:
+                    pass
+        with open(os.path.join(mirror, SIZE_MARKER), "w") as f:
+            f.write(str(size))
+        return size
+
+    def _recorded_size(self, mirror: str) -> int:
+        try:
+            with open(os.path.join(mirror, SIZE_MARKER)) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
@@ -22,6 +22,16 @@ class AnalysisRequest(BaseModel):
     )
 
 
+class BatchTarget(BaseModel):
+    """One repository or directory of an analyze_batch call."""
+
+    repo_url: str = Field(..., description="GitHub URL or local path to repository")
+    branch: str = Field("main", description="Branch to analyze")
+    directory: Optional[str] = Field(
+        None, description="Directory within the repository; whole repository if omitted"
+    )
+
+
 class EnhancementRequest(BaseModel):
     """Request model for AI enhancement."""
 
@@ -48,7 +58,7 @@ class AnalysisResult(BaseModel):
     error: Optional[str] = Field(None, description="Error message if analysis failed")
 
     class Config:
-        schema_extra = {
+        json_schema_extra = {
             "example": {
                 "status": "success",
                 "repository": {
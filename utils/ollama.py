@@ -0,0 +1,99 @@
+import asyncio
+import importlib.util
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClient:
+    """
+    Long-lived, pooled HTTP client for the Ollama host.
+
+    One instance is shared by the whole server and closed by its lifespan.
+    Connections are kept alive and capped, HTTP/2 is used when the `h2`
+    package is installed, and a FIFO semaphore per model bounds in-flight
+    generations so a burst of requests queues fairly instead of piling onto
+    the GPU host at once.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        max_inflight_per_model: Optional[int] = None,
+    ):
+        self.config = DEFAULT_CONFIG
+        self.host = host or self.config["ollama_host"]
+        self.limits = httpx.Limits(
+            max_connections=max_connections or self.config["ollama_max_connections"],
+            max_keepalive_connections=max_keepalive
+            or self.config["ollama_max_keepalive"],
+            keepalive_expiry=keepalive_expiry or self.config["ollama_keepalive_expiry"],
+        )
+        self.max_inflight_per_model = (
+            max_inflight_per_model or self.config["ollama_max_inflight_per_model"]
+        )
+        self.http2 = importlib.util.find_spec("h2") is not None
+        self._http: Optional[httpx.AsyncClient] = None
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._waiting: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The shared client, created on first use."""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=self.host,
+                limits=self.limits,
+                http2=self.http2,
+                timeout=self.config["enhancer_timeout"],
+            )
+        return self._http
+
+    @asynccontextmanager
+    async def slot(self, model: str) -> AsyncIterator[httpx.AsyncClient]:
+        """Wait for a free generation slot for model, then yield the client."""
+        semaphore = self._slots.get(model)
+        if semaphore is None:
+            semaphore = self._slots[model] = asyncio.Semaphore(
+                self.max_inflight_per_model
+            )
+        if semaphore.locked():
+            logger.info(f"Waiting for a free generation slot for {model}")
+
+        self._waiting[model] = self._waiting.get(model, 0) + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[model] -= 1
+
+        self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        try:
+            yield self.http
+        finally:
+            self._in_flight[model] -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """In-flight and queued generations per model."""
+        return {
+            model: {
+                "in_flight": self._in_flight.get(model, 0),
+                "waiting": self._waiting.get(model, 0),
+            }
+            for model in self._slots
+        }
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,422 @@
+import json
+import logging
+import os
+import re
+import subprocess
+import time
+import tomllib
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from code_context_analyzer.analyzer.discovery import EXTENSION_MAP
+
+from utils.pathfilter import PathFilter
+from utils.repository import fetch_blobs, is_partial_clone, list_tree, read_blobs
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_LANGUAGES = {
+    ext: lang for lang, exts in EXTENSION_MAP.items() for ext in exts
+}
+SHEBANG_LANGUAGES = {
+    "python": "python",
+    "python3": "python",
+    "node": "javascript",
+    "bash": "shell",
+    "sh": "shell",
+    "zsh": "shell",
+    "ruby": "ruby",
+    "php": "php",
+    "perl": "perl",
+}
+# Lines are counted for classified files up to this size; bytes always are
+MAX_LINE_COUNT_BYTES = 1 << 20
+# Extensionless blobs up to this size are read from git to check for a shebang
+SHEBANG_PROBE_BYTES = 64 << 10
+
+
+def parse_requirements(text: str) -> List[str]:
+    names = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("-"):
+            continue
+        names.append(_requirement_name(line))
+    return names
+
+
+def parse_pyproject(text: str) -> List[str]:
+    data = tomllib.loads(text)
+    project = data.get("project", {})
+    names = [_requirement_name(req) for req in project.get("dependencies", [])]
+    for extra in project.get("optional-dependencies", {}).values():
+        names.extend(_requirement_name(req) for req in extra)
+    poetry = data.get("tool", {}).get("poetry", {})
+    names.extend(name for name in poetry.get("dependencies", {}) if name != "python")
+    for group in poetry.get("group", {}).values():
+        names.extend(group.get("dependencies", {}))
+    return names
+
+
+def parse_pipfile(text: str) -> List[str]:
+    data = tomllib.loads(text)
+    return [*data.get("packages", {}), *data.get("dev-packages", {})]
+
+
+def parse_package_json(text: str) -> List[str]:
+    data = json.loads(text)
+    names = []
+    for section in ("dependencies", "devDependencies", "peerDependencies"):
+        names.extend(data.get(section) or {})
+    return names
+
+
+def parse_composer_json(text: str) -> List[str]:
+    data = json.loads(text)
+    return [
+        name
+        for section in ("require", "require-dev")
+        for name in data.get(section) or {}
+        if "/" in name
+    ]
+
+
+def parse_go_mod(text: str) -> List[str]:
+    names = []
+    in_block = False
+    for line in text.splitlines():
+        line = line.split("//", 1)[0].strip()
+        if line.startswith("require ("):
+            in_block = True
+        elif in_block and line == ")":
+            in_block = False
+        elif in_block and line:
+            names.append(line.split()[0])
+        elif line.startswith("require "):
+            names.append(line.split()[1])
+    return names
+
+
+def parse_cargo_toml(text: str) -> List[str]:
+    data = tomllib.loads(text)
+    names = []
+    for section in ("dependencies", "dev-dependencies", "build-dependencies"):
+        names.extend(data.get(section, {}))
+    names.extend(data.get("workspace", {}).get("dependencies", {}))
+    return names
+
+
+def parse_pom_xml(text: str) -> List[str]:
+    root = ElementTree.fromstring(text)
+    names = []
+    for dependency in root.iter():
+        if not dependency.tag.endswith("}dependency") and dependency.tag != (
+            "dependency"
+        ):
+            continue
+        fields = {child.tag.rsplit("}", 1)[-1]: child.text for child in dependency}
+        if fields.get("groupId") and fields.get("artifactId"):
+            names.append(f"{fields['groupId']}:{fields['artifactId']}")
+    return names
+
+
+def parse_gemfile(text: str) -> List[str]:
+    return re.findall(r"""^\s*gem\s+['"]([^'"]+)['"]""", text, flags=re.MULTILINE)
+
+
+# Build file name -> (build tool, ecosystem, dependency parser or None)
+BUILD_FILES: Dict[str, Tuple[str, str, Optional[Callable[[str], List[str]]]]] = {
+    "pyproject.toml": ("pyproject", "python", parse_pyproject),
+    "setup.py": ("setuptools", "python", None),
+    "setup.cfg": ("setuptools", "python", None),
+    "requirements.txt": ("pip", "python", parse_requirements),
+    "Pipfile": ("pipenv", "python", parse_pipfile),
+    "poetry.lock": ("poetry", "python", None),
+    "uv.lock": ("uv", "python", None),
+    "package.json": ("npm", "javascript", parse_package_json),
+    "yarn.lock": ("yarn", "javascript", None),
+    "pnpm-lock.yaml": ("pnpm", "javascript", None),
+    "go.mod": ("go modules", "go", parse_go_mod),
+    "Cargo.toml": ("cargo", "rust", parse_cargo_toml),
+    "pom.xml": ("maven", "java", parse_pom_xml),
+    "build.gradle": ("gradle", "java", None),
+    "build.gradle.kts": ("gradle", "java", None),
+    "Gemfile": ("bundler", "ruby", parse_gemfile),
+    "composer.json": ("composer", "php", parse_composer_json),
+    "CMakeLists.txt": ("cmake", "cpp", None),
+    "Makefile": ("make", "make", None),
+    "Dockerfile": ("docker", "docker", None),
+}
+
+
+def parse_manifest(name: str, text: str) -> List[str]:
+    """Dependency names declared in a build file, or [] if unparseable."""
+    parser = BUILD_FILES.get(name, (None, None, None))[2]
+    if parser is None:
+        return []
+    try:
+        return [dep for dep in parser(text) if dep]
+    except (ValueError, TypeError, AttributeError, ElementTree.ParseError) as e:
+        logger.debug(f"Could not parse {name}: {str(e)}")
+        return []
+
+
+def _requirement_name(requirement: str) -> str:
+    return re.split(r"[\s\[<>=!~;@(]", requirement.strip(), maxsplit=1)[0]
+
+
+class OverviewTotals:
+    """Running totals of an overview, fed one file at a time."""
+
+    def __init__(
+        self, max_manifests: int, count_lines: bool = True, count_bytes: bool = True
+    ):
+        self.max_manifests = max_manifests
+        self.count_lines = count_lines
+        self.count_bytes = count_bytes
+        self.languages: Dict[str, Dict[str, int]] = {}
+        self.top_level: Counter = Counter()
+        self.build_tools = set()
+        self.dependencies: Dict[str, set] = {}
+        self.manifests = 0
+        self.file_count = self.total_bytes = self.total_lines = 0
+
+    def wants_manifest(self, name: str) -> bool:
+        """Whether the contents of a file with this name should be parsed."""
+        build = BUILD_FILES.get(name)
+        return bool(build and build[2] and self.manifests < self.max_manifests)
+
+    def add(
+        self,
+        rel_dir: str,
+        name: str,
+        size: Optional[int],
+        language: Optional[str],
+        lines: int = 0,
+        manifest: Optional[str] = None,
+    ) -> None:
+        size = size or 0
+        self.file_count += 1
+        self.total_bytes += size
+        self.top_level[rel_dir.split("/", 1)[0] if rel_dir else ""] += 1
+
+        build = BUILD_FILES.get(name)
+        if build:
+            self.build_tools.add(build[0])
+            if manifest is not None:
+                self.manifests += 1
+                deps = parse_manifest(name, manifest)
+                self.dependencies.setdefault(build[1], set()).update(deps)
+
+        if language is None:
+            return
+        stats = self.languages.setdefault(
+            language, {"files": 0, "bytes": 0, "lines": 0}
+        )
+        stats["files"] += 1
+        stats["bytes"] += size
+        stats["lines"] += lines
+        self.total_lines += lines
+
+    def result(self, elapsed: float) -> Dict[str, Any]:
+        weight = "bytes" if self.count_bytes else "files"
+        ranked = sorted(self.languages.items(), key=lambda item: -item[1][weight])
+        if not self.count_lines:
+            ranked = [(lang, {**stats, "lines": None}) for lang, stats in ranked]
+        if not self.count_bytes:
+            ranked = [(lang, {**stats, "bytes": None}) for lang, stats in ranked]
+        return {
+            "file_count": self.file_count,
+            "total_bytes": self.total_bytes if self.count_bytes else None,
+            "total_lines": self.total_lines if self.count_lines else None,
+            "language_breakdown": {lang: stats["files"] for lang, stats in ranked},
+            "languages": dict(ranked),
+            "main_directories": [
+                name
+                for name, _ in sorted(
+                    self.top_level.items(), key=lambda item: (-item[1], item[0])
+                )
+                if name
+            ],
+            "build_tools": sorted(self.build_tools),
+            "dependencies": {
+                ecosystem: sorted(names)
+                for ecosystem, names in sorted(self.dependencies.items())
+            },
+            "scan_seconds": round(elapsed, 3),
+        }
+
+
+class OverviewScanner:
+    """
+    Repository overview built from a single `os.scandir` pass.
+
+    Every directory is listed once by PathFilter.walk(); ignored, vendored
+    and (optionally) test trees are pruned before they are entered. File
+    sizes come from the directory entries, lines are counted for classified
+    source files, and build files are parsed for their dependency lists.
+
+    scan_git() builds the same overview from a commit's tree in a (bare)
+    repository, without a working tree.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        ignore_patterns: Optional[List[str]] = None,
+        ignore_tests: bool = True,
+        include_patterns: Optional[List[str]] = None,
+        exclude_patterns: Optional[List[str]] = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.filter_args = {
+            "include_patterns": include_patterns,
+            "exclude_patterns": exclude_patterns,
+            "ignore_patterns": ignore_patterns,
+            "ignore_tests": ignore_tests,
+        }
+        self.max_manifests = DEFAULT_CONFIG["overview_max_manifests"]
+
+    def scan(self) -> Dict[str, Any]:
+        started = time.perf_counter()
+        totals = OverviewTotals(self.max_manifests)
+
+        for rel_path, entry in PathFilter(self.root, **self.filter_args).walk():
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                size = entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+
+            manifest = None
+            if totals.wants_manifest(entry.name):
+                manifest = self._read_text(entry.path)
+            language, lines = self._classify(entry, size)
+            rel_dir = rel_path.rpartition("/")[0]
+            totals.add(rel_dir, entry.name, size, language, lines, manifest)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Overview of {totals.file_count} files took {elapsed:.3f}s")
+        return totals.result(elapsed)
+
+    def scan_git(self, repo_path: str, revision: str) -> Dict[str, Any]:
+        """
+        Overview of `revision` from `git ls-tree -r -l`. Only the blobs of
+        build files and of small extensionless files (for their shebang)
+        are read; lines are not counted.
+
+        In a blobless partial clone the tree is listed without sizes, so
+        bytes are not counted and shebangs are not probed either; the
+        build files' blobs are fetched in a single request.
+        """
+        started = time.perf_counter()
+        partial = is_partial_clone(repo_path)
+        totals = OverviewTotals(
+            self.max_manifests, count_lines=False, count_bytes=not partial
+        )
+
+        # Frameworks and .gitignore files are not visible without a worktree
+        path_filter = PathFilter(
+            self.root, use_gitignore=False, detect=False, **self.filter_args
+        )
+        skipped_dirs: Dict[str, bool] = {"": False}
+        files = []
+        wanted = set()
+        manifests = 0
+        for rel_path, sha, size in list_tree(repo_path, revision, sizes=not partial):
+            rel_dir, _, name = rel_path.rpartition("/")
+            if self._skip_tree_dir(path_filter, rel_dir, skipped_dirs):
+                continue
+            if path_filter.skip_file(rel_path, []):
+                continue
+            # Contents are fetched in one batch, so budget manifests up front
+            manifest = totals.wants_manifest(name) and manifests < self.max_manifests
+            manifests += manifest
+            dot = name.rfind(".")
+            ext = name[dot:].lower() if dot > 0 else ""
+            if manifest or (not ext and 0 < (size or 0) <= SHEBANG_PROBE_BYTES):
+                wanted.add(sha)
+            files.append((rel_dir, name, sha, size, ext, manifest))
+
+        if wanted and partial:
+            try:
+                fetch_blobs(repo_path, sorted(wanted))
+            except (subprocess.SubprocessError, OSError) as e:
+                # cat-file still fetches them lazily, one at a time
+                logger.warning(f"Could not prefetch build files: {str(e)}")
+        blobs = read_blobs(repo_path, sorted(wanted)) if wanted else {}
+        for rel_dir, name, sha, size, ext, manifest in files:
+            language = EXTENSION_LANGUAGES.get(ext)
+            if language is None and not ext and sha in blobs:
+                language = self._shebang_language(blobs[sha])
+            text = None
+            if manifest:
+                text = blobs.get(sha, b"").decode("utf-8", errors="replace")
+            totals.add(rel_dir, name, size, language, manifest=text)
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Overview of {totals.file_count} files at {revision[:12]} "
+            f"took {elapsed:.3f}s"
+        )
+        return totals.result(elapsed)
+
+    def _skip_tree_dir(
+        self, path_filter: PathFilter, rel_dir: str, skipped: Dict[str, bool]
+    ) -> bool:
+        """Whether rel_dir or any of its parents is pruned (memoized)."""
+        if rel_dir in skipped:
+            return skipped[rel_dir]
+        parent = rel_dir.rpartition("/")[0]
+        skip = self._skip_tree_dir(
+            path_filter, parent, skipped
+        ) or path_filter.skip_dir(rel_dir, [])
+        skipped[rel_dir] = skip
+        return skip
+
+    def _classify(self, entry: os.DirEntry, size: int) -> Tuple[Optional[str], int]:
+        """Language of a file (by extension, else shebang) and its line count."""
+        dot = entry.name.rfind(".")
+        ext = entry.name[dot:].lower() if dot > 0 else ""
+        language = EXTENSION_LANGUAGES.get(ext)
+        if (language is None and ext) or not size or size > MAX_LINE_COUNT_BYTES:
+            return language, 0
+        try:
+            # Raw descriptors: much cheaper than open() across 50k files
+            fd = os.open(entry.path, os.O_RDONLY)
+            try:
+                data = os.read(fd, size)
+            finally:
+                os.close(fd)
+        except OSError:
+            return language, 0
+
+        if language is None:
+            language = self._shebang_language(data)
+            if language is None:
+                return None, 0
+        return language, data.count(b"\n") + (1 if data[-1:] not in b"\n" else 0)
+
+    @staticmethod
+    def _shebang_language(data: bytes) -> Optional[str]:
+        if not data.startswith(b"#!"):
+            return None
+        words = data[2:].split(b"\n", 1)[0].decode("utf-8", "replace").split()
+        if not words:
+            return None
+        interpreter = os.path.basename(words[0])
+        if interpreter == "env" and len(words) > 1:
+            interpreter = words[1]
+        interpreter = re.sub(r"[\d.]+$", "", interpreter) or interpreter
+        return SHEBANG_LANGUAGES.get(interpreter)
+
+    @staticmethod
+    def _read_text(path: str) -> str:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return ""
@@ -0,0 +1,197 @@
+import ast
+import bisect
+import re
+from pathlib import Path
+from typing import Any, Dict, List
+
+from code_context_analyzer.analyzer.parsers.js_parser import (
+    RE_CLASS,
+    RE_EXPORT_FN,
+    RE_FN,
+    JSParser,
+)
+from code_context_analyzer.analyzer.parsers.python_parser import PythonParser
+
+from utils.symbols import CLASS, CONSTANT, FUNCTION, IMPORT, METHOD, Row
+
+# Static ES module imports and re-exports
+RE_IMPORT_FROM = re.compile(
+    r"""(?:^|[;\s])(?:import|export)\s+(?:[\w$*{}\s,]+?\s+from\s+)?['"]([^'"\n]+)['"]"""
+)
+# CommonJS require() and dynamic import()
+RE_REQUIRE = re.compile(
+    r"""(?<![\w$.])(?:require|import)\s*\(\s*['"]([^'"\n]+)['"]\s*\)"""
+)
+
+
+class LinePythonParser(PythonParser):
+    """The upstream Python parser, recording the line of every symbol."""
+
+    def parse_file(self, path: str) -> Dict[str, Any]:
+        source = Path(path).read_text(encoding="utf-8")
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            return {"path": path, "error": "syntax_error"}
+
+        module = {"path": path, "classes": [], "functions": [], "constants": []}
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                methods = [
+                    {
+                        "name": m.name,
+                        "sig": self._sig_from_function(m),
+                        "doc": ast.get_docstring(m),
+                        "line": m.lineno,
+                    }
+                    for m in node.body
+                    if isinstance(m, ast.FunctionDef)
+                ]
+                module["classes"].append(
+                    {
+                        "name": node.name,
+                        "bases": [ast.unparse(b) for b in node.bases],
+                        "doc": ast.get_docstring(node),
+                        "methods": methods,
+                        "line": node.lineno,
+                    }
+                )
+            elif isinstance(node, ast.FunctionDef):
+                module["functions"].append(
+                    {
+                        "name": node.name,
+                        "sig": self._sig_from_function(node),
+                        "doc": ast.get_docstring(node),
+                        "line": node.lineno,
+                    }
+                )
+            elif isinstance(node, ast.Assign):
+                # Top-level constants heuristic: UPPERCASE names
+                for target in node.targets:
+                    if isinstance(target, ast.Name) and target.id.isupper():
+                        module["constants"].append(
+                            {"name": target.id, "line": node.lineno}
+                        )
+        module["imports"] = self._imports(tree)
+        return module
+
+    @staticmethod
+    def _imports(tree: ast.Module) -> List[Dict[str, Any]]:
+        """
+        Every import statement, including those inside functions and
+        conditional blocks. Relative imports keep their leading dots.
+        """
+        imports = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    imports.append(
+                        {"module": alias.name, "names": [], "line": node.lineno}
+                    )
+            elif isinstance(node, ast.ImportFrom):
+                imports.append(
+                    {
+                        "module": "." * node.level + (node.module or ""),
+                        "names": [alias.name for alias in node.names],
+                        "line": node.lineno,
+                    }
+                )
+        imports.sort(key=lambda item: item["line"])
+        return imports
+
+
+class LineJSParser(JSParser):
+    """The upstream JS heuristics, recording the line of every match."""
+
+    def parse_file(self, path: str) -> Dict[str, Any]:
+        text = Path(path).read_text(encoding="utf-8", errors="ignore")
+        line_starts = [0]
+        line_starts.extend(i + 1 for i, char in enumerate(text) if char == "\n")
+
+        def line_of(offset: int) -> int:
+            return bisect.bisect_right(line_starts, offset)
+
+        module = {"path": path, "classes": [], "functions": []}
+        for m in RE_CLASS.finditer(text):
+            module["classes"].append(
+                {"name": m.group(1), "methods": [], "line": line_of(m.start())}
+            )
+        for pattern in (RE_FN, RE_EXPORT_FN):
+            for m in pattern.finditer(text):
+                module["functions"].append(
+                    {"name": m.group(1), "line": line_of(m.start())}
+                )
+        imports = [
+            (m.start(1), m.group(1))
+            for pattern in (RE_IMPORT_FROM, RE_REQUIRE)
+            for m in pattern.finditer(text)
+        ]
+        module["imports"] = [
+            {"module": spec, "names": [], "line": line_of(start)}
+            for start, spec in sorted(imports)
+        ]
+        return module
+
+
+PARSERS = {
+    "python": LinePythonParser(),
+    "javascript": LineJSParser(),
+}
+
+
+def module_rows(module: Dict[str, Any]) -> List[Row]:
+    """
+    Flatten a parser's module dict into symbol rows (see utils.symbols):
+    constants, then functions, then each class followed by its methods,
+    then imports.
+    """
+    rows: List[Row] = []
+    for const in module.get("constants", []):
+        if isinstance(const, dict):
+            rows.append(
+                [CONSTANT, const["name"], -1, const.get("line"), None, None, None]
+            )
+        else:
+            rows.append([CONSTANT, str(const), -1, None, None, None, None])
+    for func in module.get("functions", []):
+        rows.append(
+            [
+                FUNCTION,
+                func["name"],
+                -1,
+                func.get("line"),
+                func.get("sig"),
+                func.get("doc"),
+                None,
+            ]
+        )
+    for cls in module.get("classes", []):
+        class_row = len(rows)
+        rows.append(
+            [
+                CLASS,
+                cls["name"],
+                -1,
+                cls.get("line"),
+                None,
+                cls.get("doc"),
+                cls.get("bases", []),
+            ]
+        )
+        for method in cls.get("methods", []):
+            rows.append(
+                [
+                    METHOD,
+                    method["name"],
+                    class_row,
+                    method.get("line"),
+                    method.get("sig"),
+                    method.get("doc"),
+                    None,
+                ]
+            )
+    for item in module.get("imports", []):
+        rows.append(
+            [IMPORT, item["module"], -1, item["line"], None, None, item["names"]]
+        )
+    return rows
@@ -0,0 +1,394 @@
+import fnmatch
+import logging
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+from code_context_analyzer.analyzer.discovery import (
+    DEFAULT_IGNORE_PATTERNS,
+    FRAMEWORK_IGNORE_PATTERNS,
+    FRAMEWORK_INDICATORS,
+    TEST_FILE_PATTERNS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Vendored and generated trees, pruned even when no ignore pattern matches
+VENDORED_DIRS = {
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "bower_components",
+    "vendor",
+    "third_party",
+    "third-party",
+    "site-packages",
+    "Pods",
+    ".tox",
+    ".nox",
+    ".venv",
+    "venv",
+    "__pycache__",
+}
+TEST_DIRS = {"test", "tests", "__tests__", "spec", "specs"}
+GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def compile_patterns(patterns: Iterable[str]) -> Optional[Pattern]:
+    """
+    Compile ignore patterns into one regex with the discoverer's fnmatch
+    semantics; a trailing "/" matches the directory and anything below it.
+    """
+    regexes = []
+    for pattern in patterns:
+        if not pattern:
+            continue
+        if pattern.endswith("/"):
+            pattern = pattern.rstrip("/")
+            regexes.append(fnmatch.translate(f"{pattern}/*"))
+        regexes.append(fnmatch.translate(pattern))
+    return re.compile("|".join(regexes)) if regexes else None
+
+
+def translate_gitignore(
+    pattern: str, subtree: bool = False
+) -> Optional[Tuple[str, bool]]:
+    """
+    Translate one gitignore line into (regex, negated). The regex matches a
+    path relative to the .gitignore's directory, with a trailing "/" when
+    the path is a directory; returns None for blank lines and comments.
+    With `subtree`, it also matches every path below a matching directory.
+    """
+    pattern = pattern.rstrip("\n")
+    if not pattern.strip() or pattern.startswith("#"):
+        return None
+    if not pattern.endswith("\\ "):
+        pattern = pattern.rstrip()
+    negated = pattern.startswith("!")
+    if negated:
+        pattern = pattern[1:]
+    elif pattern.startswith(("\\!", "\\#")):
+        pattern = pattern[1:]
+
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # A slash anywhere but the end anchors the pattern to its directory
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    if not pattern:
+        return None
+
+    regex = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif char == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif char == "?":
+            regex.append("[^/]")
+            i += 1
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex.append(re.escape(char))
+                i += 1
+                continue
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+            i = end + 1
+        elif char == "\\" and i + 1 < len(pattern):
+            regex.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            regex.append(re.escape(char))
+            i += 1
+
+    body = "".join(regex)
+    if not anchored:
+        body = f"(?:.*/)?{body}"
+    if subtree:
+        return body + ("/.*" if dir_only else "(?:/.*)?"), negated
+    # Directory paths carry a trailing "/"; dir-only patterns require it
+    return body + ("/" if dir_only else "/?"), negated
+
+
+class GitIgnoreRules:
+    """
+    Ordered gitignore rules from one source, compiled into a single regex.
+
+    The alternatives are joined in reverse order, so the first alternative
+    that matches is the last matching rule, as in git. `base` is the
+    directory the rules apply to, relative to the repository root. With
+    `subtree`, a rule matching a directory also matches everything below
+    it, which is how include patterns are checked against files.
+    """
+
+    def __init__(self, lines: Iterable[str], base: str = "", subtree: bool = False):
+        self.base = f"{base.strip('/')}/" if base.strip("/") else ""
+        rules = [
+            rule
+            for rule in (translate_gitignore(line, subtree) for line in lines)
+            if rule
+        ]
+        self.negated: List[bool] = []
+        alternatives = []
+        for index, (regex, negated) in enumerate(reversed(rules)):
+            alternatives.append(f"(?P<r{index}>{regex})")
+            self.negated.append(negated)
+        self.regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    def __bool__(self) -> bool:
+        return self.regex is not None
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if re-included by a "!" rule, else None."""
+        if self.regex is None or not rel_path.startswith(self.base):
+            return None
+        subject = rel_path[len(self.base) :] + ("/" if is_dir else "")
+        match = self.regex.fullmatch(subject)
+        if match is None:
+            return None
+        return not self.negated[int(match.lastgroup[1:])]
+
+    @classmethod
+    def from_file(cls, path: str, base: str = "") -> "GitIgnoreRules":
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return cls(f.read().splitlines(), base)
+        except OSError:
+            return cls([], base)
+
+
+def detect_frameworks(root: str) -> Set[str]:
+    """
+    Cheap framework detection using the discoverer's indicators, looking
+    only at the root and its direct subdirectories instead of `rglob`-ing
+    the whole tree once per indicator.
+    """
+    try:
+        children = [entry.name for entry in os.scandir(root) if entry.is_dir()]
+    except OSError:
+        return set()
+
+    def candidates(pattern: str) -> Iterator[str]:
+        if pattern.startswith("*/"):
+            for child in children:
+                yield os.path.join(root, child, pattern[2:])
+        else:
+            yield os.path.join(root, pattern)
+
+    def present(indicator: dict) -> bool:
+        for path in candidates(indicator["path"]):
+            if indicator["type"] == "dir":
+                if os.path.isdir(path):
+                    return True
+                continue
+            if not os.path.isfile(path):
+                continue
+            keywords = indicator.get("content")
+            if not keywords:
+                return True
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+            if any(keyword in content for keyword in keywords):
+                return True
+        return False
+
+    return {
+        framework
+        for framework, indicators in FRAMEWORK_INDICATORS.items()
+        # Same threshold as the discoverer, to avoid false positives
+        if sum(present(indicator) for indicator in indicators) >= 2
+    }
+
+
+class PathFilter:
+    """
+    Every include/exclude decision for one analysis root, compiled once.
+
+    A path is dropped, in order of precedence, if it falls outside the
+    `include_patterns`, matches the `exclude_patterns` (gitignore syntax,
+    "!" re-includes), matches the default, framework or `ignore_patterns`
+    globs, is ignored by a .gitignore between the repository root and the
+    path, is vendored, or is a test while `ignore_tests` is set. Only the
+    `exclude_patterns` can re-include an ignored path; a "!" rule in the
+    repository's .gitignore cannot.
+
+    walk() applies the decisions while listing the tree, so pruned
+    directories are never entered.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        include_patterns: Optional[List[str]] = None,
+        exclude_patterns: Optional[List[str]] = None,
+        ignore_patterns: Optional[List[str]] = None,
+        ignore_tests: bool = True,
+        repo_root: Optional[str] = None,
+        use_gitignore: bool = True,
+        detect: bool = True,
+    ):
+        self.root = os.path.realpath(root)
+        self.repo_root = os.path.realpath(repo_root or root)
+        self.prefix = os.path.relpath(self.root, self.repo_root).replace(os.sep, "/")
+        if self.prefix == "." or self.prefix.startswith(".."):
+            self.repo_root, self.prefix = self.root, ""
+        self.ignore_tests = ignore_tests
+        self.use_gitignore = use_gitignore
+
+        self.includes = GitIgnoreRules(include_patterns or [], subtree=True)
+        self.include_prefixes = self._literal_prefixes(include_patterns or [])
+        self.excludes = GitIgnoreRules(exclude_patterns or [])
+
+        frameworks = detect_frameworks(self.root) if detect else set()
+        framework_patterns = [
+            pattern
+            for framework in sorted(frameworks)
+            for pattern in FRAMEWORK_IGNORE_PATTERNS.get(framework, [])
+        ]
+        self.frameworks = frameworks
+        self.ignored = compile_patterns(
+            [*DEFAULT_IGNORE_PATTERNS, *framework_patterns, *(ignore_patterns or [])]
+        )
+        self.tests = compile_patterns(TEST_FILE_PATTERNS)
+        self.gitignores = self._ancestor_gitignores() if use_gitignore else []
+
+    def skip_dir(self, rel_path: str, gitignores: Optional[List] = None) -> bool:
+        name = rel_path.rpartition("/")[2]
+        if name in VENDORED_DIRS or (self.ignore_tests and name in TEST_DIRS):
+            return True
+        if self.include_prefixes is not None and not any(
+            prefix.startswith(f"{rel_path}/") or f"{rel_path}/".startswith(prefix)
+            for prefix in self.include_prefixes
+        ):
+            return True
+        return self._excluded(rel_path, True, gitignores)
+
+    def skip_file(self, rel_path: str, gitignores: Optional[List] = None) -> bool:
+        if self.includes and not self.includes.match(rel_path, False):
+            return True
+        if self._excluded(rel_path, False, gitignores):
+            return True
+        name = rel_path.rpartition("/")[2]
+        return bool(self.ignore_tests and self.tests.match(name))
+
+    def walk(
+        self, max_depth: Optional[int] = None
+    ) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Yield (rel_path, entry) for every kept file in os.walk order: a
+        directory's files first, then its subdirectories, depth first.
+        Directories deeper than max_depth levels below the root are not
+        entered.
+        """
+        stack: List[Tuple[str, int, List[GitIgnoreRules]]] = [("", 0, self.gitignores)]
+        while stack:
+            rel_dir, depth, gitignores = stack.pop()
+            try:
+                entries = list(os.scandir(os.path.join(self.root, rel_dir)))
+            except OSError as e:
+                logger.debug(f"Skipping unreadable directory {rel_dir}: {str(e)}")
+                continue
+
+            if self.use_gitignore and any(e.name == ".gitignore" for e in entries):
+                base = "/".join(filter(None, (self.prefix, rel_dir)))
+                rules = GitIgnoreRules.from_file(
+                    os.path.join(self.root, rel_dir, ".gitignore"), base
+                )
+                if rules:
+                    gitignores = [*gitignores, rules]
+
+            subdirs = []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    # Like os.walk, symlinked directories are not followed
+                    if (
+                        not entry.is_symlink()
+                        and (max_depth is None or depth < max_depth)
+                        and not self.skip_dir(rel_path, gitignores)
+                    ):
+                        subdirs.append(rel_path)
+                elif not self.skip_file(rel_path, gitignores):
+                    yield rel_path, entry
+
+            for rel_path in reversed(subdirs):
+                stack.append((rel_path, depth + 1, gitignores))
+
+    def _excluded(
+        self, rel_path: str, is_dir: bool, gitignores: Optional[List]
+    ) -> bool:
+        verdict = self.excludes.match(rel_path, is_dir)
+        if verdict is not None:
+            return verdict
+        # The caller's ignores come before the repository's own rules
+        if self.ignored.match(rel_path):
+            return True
+        repo_path = f"{self.prefix}/{rel_path}" if self.prefix else rel_path
+        # Deeper .gitignore files take precedence
+        for rules in reversed(gitignores if gitignores is not None else []):
+            verdict = rules.match(repo_path, is_dir)
+            if verdict is not None:
+                return verdict
+        return False
+
+    def _ancestor_gitignores(self) -> List[GitIgnoreRules]:
+        """Rules from .gitignore files between the repository root and root."""
+        rules = []
+        parts = self.prefix.split("/") if self.prefix else []
+        for depth in range(len(parts)):
+            base = "/".join(parts[:depth])
+            path = os.path.join(self.repo_root, base, ".gitignore")
+            if os.path.isfile(path):
+                rules.append(GitIgnoreRules.from_file(path, base))
+        return [r for r in rules if r]
+
+    @staticmethod
+    def _literal_prefixes(patterns: List[str]) -> Optional[List[str]]:
+        """
+        Directory prefixes that every include pattern is confined to, used
+        to prune directories no include can match; None if any pattern can
+        match at any depth.
+        """
+        if not patterns:
+            return None
+        prefixes = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if pattern.startswith("!"):
+                continue
+            dir_only = pattern.endswith("/")
+            body = pattern.rstrip("/")
+            if "/" not in body or body.lstrip("/").startswith("**"):
+                return None
+            parts = body.lstrip("/").split("/")
+            literal = []
+            for part in parts if dir_only else parts[:-1]:
+                if GLOB_CHARS.search(part):
+                    break
+                literal.append(part)
+            prefixes.append("/".join(literal) + "/" if literal else "")
+        if "" in prefixes:
+            return None
+        return prefixes
@@ -0,0 +1,258 @@
+import logging
+import os
+import posixpath
+import re
+import subprocess
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+NULL_SHA = "0" * 40
+# Regular and executable files; symlinks and submodules are not content
+BLOB_MODES = ("100644", "100755")
+SCP_URL_RE = re.compile(r"^(?P<user>[\w.-]+)@(?P<host>[\w.-]+):(?P<path>.+)$")
+REMOTE_SCHEMES = ("http", "https", "ssh", "git", "file")
+
+
+def run_git(
+    args: List[str], cwd: Optional[str] = None, timeout: Optional[float] = None
+) -> str:
+    """Run a git command and return its stripped stdout."""
+    completed = subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        timeout=timeout or DEFAULT_CONFIG["git_timeout"],
+        check=True,
+    )
+    return completed.stdout.strip()
+
+
+def is_remote_url(repo_url: str) -> bool:
+    """Check whether repo_url points at a remote rather than a local path."""
+    if SCP_URL_RE.match(repo_url):
+        return True
+    return urlparse(repo_url).scheme in REMOTE_SCHEMES
+
+
+def normalize_repo_url(repo_url: str) -> str:
+    """
+    Canonical spelling of a repository location.
+
+    `git@github.com:org/repo.git`, `https://GitHub.com/org/repo/` and
+    `https://github.com/org/repo` all normalize to the same string.
+    """
+    url = repo_url.strip()
+    scp = SCP_URL_RE.match(url)
+    if scp:
+        url = f"https://{scp.group('host')}/{scp.group('path')}"
+
+    parsed = urlparse(url)
+    if parsed.scheme in ("http", "https", "ssh", "git"):
+        host = parsed.hostname.lower() if parsed.hostname else ""
+        path = parsed.path.rstrip("/")
+        if path.endswith(".git"):
+            path = path[: -len(".git")]
+        return f"https://{host}{path}"
+    if parsed.scheme == "file":
+        return os.path.abspath(parsed.path).rstrip("/")
+    return os.path.abspath(url).rstrip("/")
+
+
+def normalize_subpath(path: str) -> str:
+    """
+    Normalize a directory inside a repository to a relative POSIX path
+    ("" for the root). Paths that escape the repository are rejected.
+    """
+    normalized = posixpath.normpath(path.replace(os.sep, "/").strip("/") or ".")
+    if normalized == ".":
+        return ""
+    if normalized == ".." or normalized.startswith("../"):
+        raise ValueError(f"Path escapes the repository: {path}")
+    return normalized
+
+
+def resolve_revision(repo_url: str, branch: str) -> Optional[str]:
+    """
+    Resolve repo_url@branch to a commit SHA without cloning.
+
+    Remotes are resolved with `git ls-remote`. Local paths are analyzed in
+    place, so they resolve to HEAD only when the working tree is clean;
+    otherwise None is returned and callers must not treat the tree as
+    content-addressable.
+    """
+    if SHA_RE.match(branch):
+        return branch
+
+    if not is_remote_url(repo_url):
+        return get_head_revision(repo_url)
+
+    refs = [f"refs/heads/{branch}", f"refs/tags/{branch}", f"refs/tags/{branch}^{{}}"]
+    try:
+        output = run_git(["ls-remote", repo_url, *refs])
+    except (subprocess.SubprocessError, OSError) as e:
+        logger.warning(f"Could not resolve {repo_url}@{branch}: {str(e)}")
+        return None
+
+    resolved = {}
+    for line in output.splitlines():
+        sha, _, ref = line.partition("\t")
+        resolved[ref] = sha
+
+    # Prefer the peeled commit for annotated tags
+    for ref in (refs[0], refs[2], refs[1]):
+        if ref in resolved:
+            return resolved[ref]
+    return None
+
+
+def get_head_revision(path: str) -> Optional[str]:
+    """Return the HEAD commit of a clean git checkout rooted at path, else None."""
+    if not os.path.isdir(path):
+        return None
+    try:
+        toplevel = run_git(["rev-parse", "--show-toplevel"], cwd=path)
+        if os.path.realpath(toplevel) != os.path.realpath(path):
+            return None
+        if run_git(["status", "--porcelain", "--untracked-files=normal"], cwd=path):
+            return None
+        return run_git(["rev-parse", "HEAD"], cwd=path)
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+def list_blobs(path: str, revision: str) -> Dict[str, str]:
+    """Map every regular file in revision to its blob SHA (`git ls-tree`)."""
+    output = run_git(["ls-tree", "-r", "-z", "--full-tree", revision], cwd=path)
+    blobs = {}
+    for record in output.split("\0"):
+        if not record:
+            continue
+        meta, _, file_path = record.partition("\t")
+        mode, _, sha = meta.split(" ")
+        if mode in BLOB_MODES:
+            blobs[file_path] = sha
+    return blobs
+
+
+def list_tree(
+    path: str, revision: str, sizes: bool = True
+) -> List[Tuple[str, str, Optional[int]]]:
+    """
+    (path, blob SHA, size) of every regular file in revision (`ls-tree -l`).
+    Without `sizes` the size is None; a partial clone would otherwise
+    fetch every blob, one request at a time, just to report its size.
+    """
+    args = ["ls-tree", "-r", "-z", "--full-tree", revision]
+    if sizes:
+        args.insert(2, "-l")
+    output = run_git(args, cwd=path, timeout=DEFAULT_CONFIG["clone_timeout"])
+    files = []
+    for record in output.split("\0"):
+        if not record:
+            continue
+        meta, _, file_path = record.partition("\t")
+        mode, _, sha, *size = meta.split()
+        if mode in BLOB_MODES:
+            files.append((file_path, sha, int(size[0]) if size else None))
+    return files
+
+
+def is_partial_clone(path: str) -> bool:
+    """Whether the repository at path was cloned with a --filter."""
+    try:
+        run_git(["config", "--get", "remote.origin.partialclonefilter"], cwd=path)
+    except subprocess.CalledProcessError:
+        return False
+    return True
+
+
+def fetch_blobs(path: str, shas: List[str]) -> None:
+    """
+    Fetch blobs of a partial clone from its promisor remote in one request,
+    like git's own lazy fetch, instead of one request per missing blob.
+    """
+    subprocess.run(
+        [
+            "git",
+            "-c",
+            "fetch.negotiationAlgorithm=noop",
+            "fetch",
+            "origin",
+            "--no-tags",
+            "--no-write-fetch-head",
+            "--recurse-submodules=no",
+            "--filter=blob:none",
+            "--stdin",
+        ],
+        cwd=path,
+        input="".join(f"{sha}\n" for sha in shas),
+        capture_output=True,
+        text=True,
+        timeout=DEFAULT_CONFIG["clone_timeout"],
+        check=True,
+    )
+
+
+def read_blobs(path: str, shas: List[str]) -> Dict[str, bytes]:
+    """Read blob contents in one `git cat-file --batch` call."""
+    completed = subprocess.run(
+        ["git", "cat-file", "--batch"],
+        cwd=path,
+        input="".join(f"{sha}\n" for sha in shas).encode(),
+        capture_output=True,
+        timeout=DEFAULT_CONFIG["clone_timeout"],
+        check=True,
+    )
+    output = completed.stdout
+    blobs = {}
+    pos = 0
+    while pos < len(output):
+        newline = output.index(b"\n", pos)
+        header = output[pos:newline].decode().split()
+        pos = newline + 1
+        if len(header) < 3:
+            # "<sha> missing"
+            continue
+        size = int(header[2])
+        blobs[header[0]] = output[pos : pos + size]
+        pos += size + 1
+    return blobs
+
+
+def apply_diff(
+    path: str, old_revision: str, new_revision: str, old_blobs: Dict[str, str]
+) -> Dict[str, str]:
+    """
+    Derive the blob map of new_revision from the one of old_revision using
+    `git diff --raw A..B`, so only added, modified and deleted paths are
+    touched.
+    """
+    output = run_git(
+        [
+            "diff",
+            "--raw",
+            "-z",
+            "--no-renames",
+            "--no-abbrev",
+            old_revision,
+            new_revision,
+        ],
+        cwd=path,
+    )
+    blobs = dict(old_blobs)
+    fields = output.split("\0")
+    for meta, file_path in zip(fields[0::2], fields[1::2]):
+        if not meta.startswith(":"):
+            continue
+        _, new_mode, _, new_sha, status = meta[1:].split(" ")
+        if status == "D" or new_sha == NULL_SHA or new_mode not in BLOB_MODES:
+            blobs.pop(file_path, None)
+        else:
+            blobs[file_path] = new_sha
+    return blobs
@@ -0,0 +1,307 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.cache import get_store
+from utils.enhancer import content_hash
+from utils.formatter import CustomFormatter
+from utils.metrics import metrics, span
+from utils.ollama import OllamaClient
+from utils.settings import DEFAULT_CONFIG
+from utils.symbols import SymbolTable
+
+try:
+    import numpy as np
+except ImportError:  # Optional; semantic search is unavailable without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the text embedded per module changes
+DOCUMENT_VERSION = 1
+
+# Matrices kept memory-mapped at once
+MAX_OPEN_MATRICES = 16
+
+EmbedProgress = Callable[[int, int], Awaitable[None]]
+
+
+def retrieval_available() -> bool:
+    """Whether semantic search is enabled and numpy is installed."""
+    return np is not None and DEFAULT_CONFIG["retrieval"]
+
+
+def module_documents(
+    table: SymbolTable, modules: Optional[List[int]] = None
+) -> List[Tuple[int, str]]:
+    """The text embedded per module: its path, then its formatted details."""
+    return [
+        (module, f"{table.path(module)}\n{text.lstrip()}")
+        for module, text in CustomFormatter().describe_modules(table, modules)
+    ]
+
+
+def normalize(matrix: "np.ndarray") -> "np.ndarray":
+    """Rows scaled to unit length, so dot products are cosine similarities."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def top_k(matrix: "np.ndarray", query: "np.ndarray", k: int) -> List[Tuple[int, float]]:
+    """The k rows most similar to a unit-length query, best first."""
+    if not len(matrix) or k <= 0:
+        return []
+    scores = matrix @ query
+    k = min(k, len(scores))
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return [(int(row), float(scores[row])) for row in best]
+
+
+class Embedder:
+    """
+    Unit-length embeddings from the Ollama host's /api/embed endpoint.
+
+    Texts are sent in batches of `batch_size`, through the shared client's
+    per-model slots. Vectors are memoized in the disk cache by a hash of
+    the model and the text, so a module whose details did not change is
+    embedded once, whichever commit it first appeared in.
+    """
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        model: Optional[str] = None,
+        batch_size: Optional[int] = None,
+    ):
+        self.client = client
+        self.model = model or DEFAULT_CONFIG["embed_model"]
+        self.batch_size = batch_size or DEFAULT_CONFIG["embed_batch_size"]
+
+    @staticmethod
+    def _store():
+        return get_store(
+            "embeddings", max_bytes=DEFAULT_CONFIG["embedding_cache_max_bytes"]
+        )
+
+    async def embed(
+        self,
+        texts: List[str],
+        progress: Optional[EmbedProgress] = None,
+        memoize: bool = True,
+    ) -> "np.ndarray":
+        """One float32 row per text, computing only the missing ones."""
+        keys = [content_hash(self.model, text) for text in texts]
+        loop = asyncio.get_running_loop()
+        store = self._store() if memoize else None
+
+        found: Dict[str, "np.ndarray"] = {}
+        if store is not None:
+            cached = await loop.run_in_executor(
+                None, store.get_many_raw, list(set(keys))
+            )
+            for key, payload in cached.items():
+                found[key] = np.frombuffer(payload, dtype=np.float32)
+
+        text_of = dict(zip(keys, texts))
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if store is not None:
+            metrics.cache_result("embeddings", True, len(keys) - len(missing))
+            metrics.cache_result("embeddings", False, len(missing))
+        if found:
+            logger.info(f"Reusing {len(keys) - len(missing)} of {len(keys)} embeddings")
+        done = 0
+
+        async def run(batch: List[str]) -> None:
+            nonlocal done
+            vectors = await self._request([text_of[key] for key in batch])
+            found.update(zip(batch, vectors))
+            if store is not None:
+                await loop.run_in_executor(
+                    None,
+                    store.set_many_raw,
+                    {key: found[key].tobytes() for key in batch},
+                )
+            done += len(batch)
+            if progress is not None:
+                await progress(done, len(missing))
+
+        await asyncio.gather(
+            *(
+                run(missing[start : start + self.batch_size])
+                for start in range(0, len(missing), self.batch_size)
+            )
+        )
+        if not keys:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    async def _request(self, texts: List[str]) -> "np.ndarray":
+        async with self.client.slot(self.model) as http:
+            with span("embed", model=self.model) as embed_span:
+                embed_span.add(inputs=len(texts))
+                resp = await http.post(
+                    "/api/embed", json={"model": self.model, "input": texts}
+                )
+        if resp.status_code != 200:
+            raise RuntimeError(
+                f"Ollama embeddings error {resp.status_code}: {resp.text}"
+            )
+        embeddings = resp.json().get("embeddings") or []
+        if len(embeddings) != len(texts):
+            raise RuntimeError(
+                f"Ollama returned {len(embeddings)} embeddings for {len(texts)} inputs"
+            )
+        return normalize(np.asarray(embeddings, dtype=np.float32))
+
+    def clear(self) -> int:
+        store = self._store()
+        return store.clear() if store is not None else 0
+
+
+class VectorStore:
+    """
+    Per-commit module embeddings: one .npy matrix per indexed commit and
+    model, opened memory-mapped so a search only pages in the matrix, plus
+    a JSON sidecar naming the module of each row. When the directory
+    outgrows `max_bytes` the least recently used matrices are deleted.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = root or DEFAULT_CONFIG["vector_dir"]
+        self.max_bytes = (
+            max_bytes if max_bytes is not None else DEFAULT_CONFIG["vector_max_bytes"]
+        )
+        self._open: "OrderedDict[str, Tuple[np.ndarray, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _base(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[Tuple["np.ndarray", List[str]]]:
+        """The matrix and row paths stored under key, memory-mapped."""
+        base = self._base(key)
+        with self._lock:
+            found = self._open.get(base)
+            if found is not None:
+                self._open.move_to_end(base)
+                return found
+
+        try:
+            with open(f"{base}.json", encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(f"{base}.npy", mmap_mode="r")
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable vectors {base}: {str(e)}")
+            self._delete(base)
+            return None
+        if matrix.ndim != 2 or len(matrix) != len(meta["paths"]):
+            logger.warning(f"Discarding inconsistent vectors {base}")
+            self._delete(base)
+            return None
+
+        # The sidecar's mtime orders eviction
+        os.utime(f"{base}.json")
+        found = (matrix, meta["paths"])
+        with self._lock:
+            self._open[base] = found
+            while len(self._open) > MAX_OPEN_MATRICES:
+                self._open.popitem(last=False)
+        return found
+
+    def set(
+        self,
+        key: str,
+        matrix: "np.ndarray",
+        paths: List[str],
+        repo: Optional[str] = None,
+    ) -> Tuple["np.ndarray", List[str]]:
+        """Store a matrix and return it reopened memory-mapped."""
+        os.makedirs(self.root, exist_ok=True)
+        base = self._base(key)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(f"{base}.npy{suffix}", "wb") as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        os.replace(f"{base}.npy{suffix}", f"{base}.npy")
+        # Written last, so a readable sidecar implies a complete matrix
+        with open(f"{base}.json{suffix}", "w", encoding="utf-8") as f:
+            json.dump({"key": key, "repo": repo, "paths": paths}, f)
+        os.replace(f"{base}.json{suffix}", f"{base}.json")
+        with self._lock:
+            self._open.pop(base, None)
+
+        self.evict(keep=base)
+        return self.get(key) or (matrix, paths)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(last use, size, base) of every stored matrix."""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".json"):
+                continue
+            base = entry.path[: -len(".json")]
+            try:
+                stat = entry.stat()
+                size = stat.st_size + os.path.getsize(f"{base}.npy")
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, size, base))
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """Delete least recently used matrices until the store fits max_bytes."""
+        if not self.max_bytes:
+            return 0
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, base in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if base == keep:
+                continue
+            logger.info(f"Evicting vectors {base}")
+            self._delete(base)
+            total -= size
+            evicted += 1
+        return evicted
+
+    def _delete(self, base: str) -> None:
+        with self._lock:
+            self._open.pop(base, None)
+        # Open memory maps stay valid after the files are unlinked
+        for ext in (".json", ".npy"):
+            try:
+                os.remove(base + ext)
+            except FileNotFoundError:
+                pass
+
+    def clear_repository(self, repo: str) -> int:
+        """Delete every matrix of a (normalized) repository URL."""
+        deleted = 0
+        for _, _, base in self._entries():
+            try:
+                with open(f"{base}.json", encoding="utf-8") as f:
+                    meta: Dict[str, Any] = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if meta.get("repo") == repo:
+                self._delete(base)
+                deleted += 1
+        return deleted
+
+    def clear(self) -> int:
+        entries = self._entries()
+        for _, _, base in entries:
+            self._delete(base)
+        return len(entries)
@@ -0,0 +1,158 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first
+PRIORITY_OVERVIEW = 0
+PRIORITY_DIRECTORY = 1
+PRIORITY_ANALYSIS = 2
+
+# Receives the number of requests queued for the stage, self included
+WaitCallback = Callable[[int], Awaitable[None]]
+
+
+class OverloadedError(RuntimeError):
+    """Raised when a request is shed instead of queued for a stage."""
+
+
+class StageLimiter:
+    """
+    Concurrency limit for one pipeline stage with a bounded priority queue.
+
+    Up to `limit` holders run at once. Further requests wait in priority
+    order (FIFO within a priority); once `max_waiting` are queued, or a
+    request has waited `max_wait` seconds, it is shed with OverloadedError.
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiting = 0
+        self._queue: List[List[Any]] = []
+        self._seq = itertools.count()
+        self._admitted = 0
+        self._shed = 0
+        self._total_wait = 0.0
+        self._longest_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(
+        self, priority: int = PRIORITY_ANALYSIS, on_wait: Optional[WaitCallback] = None
+    ) -> AsyncIterator[float]:
+        """Hold one slot of the stage; yields the seconds spent queued."""
+        started = time.monotonic()
+        if self._active < self.limit and not self._waiting:
+            self._active += 1
+        else:
+            await self._wait(priority, on_wait)
+        waited = time.monotonic() - started
+        self._admitted += 1
+        self._total_wait += waited
+        self._longest_wait = max(self._longest_wait, waited)
+        try:
+            yield waited
+        finally:
+            self._release()
+
+    async def _wait(self, priority: int, on_wait: Optional[WaitCallback]) -> None:
+        if self._waiting >= self.max_waiting:
+            self._shed += 1
+            raise OverloadedError(
+                f"Server busy: {self._waiting} requests already queued for the "
+                f"{self.name} stage ({self._active} running); retry later"
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._seq), future])
+        self._waiting += 1
+        try:
+            if on_wait:
+                await on_wait(self._waiting)
+            await asyncio.wait_for(future, self.max_wait or None)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self._shed += 1
+                raise OverloadedError(
+                    f"Server busy: waited {self.max_wait:.0f}s for the "
+                    f"{self.name} stage; retry later"
+                ) from None
+            raise
+        finally:
+            self._waiting -= 1
+
+    def _release(self) -> None:
+        # Hand the slot straight to the next live waiter
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "running": self._active,
+            "queued": self._waiting,
+            "max_queued": self.max_waiting,
+            "admitted": self._admitted,
+            "shed": self._shed,
+            "avg_wait": (
+                round(self._total_wait / self._admitted, 3) if self._admitted else 0.0
+            ),
+            "max_wait": round(self._longest_wait, 3),
+        }
+
+
+class Scheduler:
+    """
+    Admission control in front of the clone, parse and enhance stages.
+
+    Each stage has its own concurrency limit so a burst of large
+    repositories cannot exhaust disk, CPU and the Ollama host all at once,
+    and cheap requests (overviews) are admitted ahead of full analyses.
+    """
+
+    STAGES = ("clone", "parse", "enhance")
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        self.config = DEFAULT_CONFIG
+        limits = limits or {
+            stage: self.config[f"{stage}_concurrency"] for stage in self.STAGES
+        }
+        self.stages = {
+            stage: StageLimiter(
+                stage,
+                limits[stage],
+                self.config["stage_max_queued"],
+                self.config["stage_max_wait"],
+            )
+            for stage in self.STAGES
+        }
+
+    def stage(
+        self,
+        name: str,
+        priority: int = PRIORITY_ANALYSIS,
+        on_wait: Optional[WaitCallback] = None,
+    ):
+        return self.stages[name].slot(priority, on_wait)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: limiter.stats() for name, limiter in self.stages.items()}
@@ -17,8 +17,67 @@ DEFAULT_CONFIG = {
     "ignore_patterns": os.getenv("CCA_IGNORE_PATTERNS", "assets,").split(","),
     "model": os.getenv("CCA_MODEL", "deepseek-coder:6.7b"),
     "enhancer_timeout": float(os.getenv("CCA_ENHANCER_TIMEOUT", "300")),
+    "enhancer_stream": os.getenv("CCA_ENHANCER_STREAM", "True").lower() == "true",
+    "enhancer_mode": os.getenv("CCA_ENHANCER_MODE", "auto"),
+    "enhancer_max_prompt_chars": int(
+        os.getenv("CCA_ENHANCER_MAX_PROMPT_CHARS", "24000")
+    ),
+    "enhancer_map_concurrency": int(os.getenv("CCA_ENHANCER_MAP_CONCURRENCY", "4")),
+    "enhancer_expected_tokens": int(os.getenv("CCA_ENHANCER_EXPECTED_TOKENS", "1500")),
     "ollama_host": os.getenv("OLLAMA_HOST", "http://localhost:11434"),
+    "ollama_max_connections": int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16")),
+    "ollama_max_keepalive": int(os.getenv("OLLAMA_MAX_KEEPALIVE", "8")),
+    "ollama_keepalive_expiry": float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60")),
+    "ollama_max_inflight_per_model": int(
+        os.getenv("OLLAMA_MAX_INFLIGHT_PER_MODEL", "2")
+    ),
     "log_level": os.getenv("LOG_LEVEL", "INFO"),
     "max_cache_size": int(os.getenv("MAX_CACHE_SIZE", 500)),
     "cache_ttl": int(os.getenv("CACHE_TTL", "3600")),
+    "cache_memory_max_bytes": int(os.getenv("CACHE_MEMORY_MAX_BYTES", 256 * 2**20)),
+    "cache_sweep_interval": int(os.getenv("CACHE_SWEEP_INTERVAL", "300")),
+    "disk_cache": os.getenv("CCA_DISK_CACHE", "True").lower() == "true",
+    "cache_dir": os.path.expanduser(os.getenv("CCA_CACHE_DIR", "~/.cache/cca-mcp")),
+    "cache_disk_max_bytes": int(os.getenv("CACHE_DISK_MAX_BYTES", 2 * 2**30)),
+    "parse_workers": int(os.getenv("CCA_PARSE_WORKERS", "0")),
+    "parse_parallel_min_files": int(os.getenv("CCA_PARSE_PARALLEL_MIN_FILES", "64")),
+    "parse_chunk_bytes": int(os.getenv("CCA_PARSE_CHUNK_BYTES", 512 * 2**10)),
+    "parse_cache": os.getenv("CCA_PARSE_CACHE", "True").lower() == "true",
+    "parse_cache_max_bytes": int(os.getenv("CCA_PARSE_CACHE_MAX_BYTES", 2**30)),
+    "ai_cache_max_bytes": int(os.getenv("CCA_AI_CACHE_MAX_BYTES", 256 * 2**20)),
+    "mirror_dir": os.path.expanduser(
+        os.getenv("CCA_MIRROR_DIR", "~/.cache/cca-mcp/mirrors")
+    ),
+    "mirror_max_bytes": int(os.getenv("CCA_MIRROR_MAX_BYTES", 20 * 2**30)),
+    "git_timeout": float(os.getenv("CCA_GIT_TIMEOUT", "30")),
+    "clone_timeout": float(os.getenv("CCA_CLONE_TIMEOUT", "1800")),
+    "overview_max_manifests": int(os.getenv("CCA_OVERVIEW_MAX_MANIFESTS", "200")),
+    "clone_concurrency": int(os.getenv("CCA_CLONE_CONCURRENCY", "4")),
+    "parse_concurrency": int(os.getenv("CCA_PARSE_CONCURRENCY", "2")),
+    "enhance_concurrency": int(os.getenv("CCA_ENHANCE_CONCURRENCY", "2")),
+    "stage_max_queued": int(os.getenv("CCA_STAGE_MAX_QUEUED", "32")),
+    "stage_max_wait": float(os.getenv("CCA_STAGE_MAX_WAIT", "600")),
+    "job_workers": int(os.getenv("CCA_JOB_WORKERS", "4")),
+    "job_queue_size": int(os.getenv("CCA_JOB_QUEUE_SIZE", "100")),
+    "job_ttl": int(os.getenv("CCA_JOB_TTL", "3600")),
+    "job_cancel_wait": float(os.getenv("CCA_JOB_CANCEL_WAIT", "10")),
+    "batch_concurrency": int(os.getenv("CCA_BATCH_CONCURRENCY", "4")),
+    "batch_max_targets": int(os.getenv("CCA_BATCH_MAX_TARGETS", "50")),
+    "token_encoding": os.getenv("CCA_TOKEN_ENCODING", "cl100k_base"),
+    "report_pages_max_bytes": int(os.getenv("CCA_REPORT_PAGES_MAX_BYTES", 256 * 2**20)),
+    "symbol_index_max_bytes": int(os.getenv("CCA_SYMBOL_INDEX_MAX_BYTES", 512 * 2**20)),
+    "symbol_index_memory_tables": int(
+        os.getenv("CCA_SYMBOL_INDEX_MEMORY_TABLES", "16")
+    ),
+    "retrieval": os.getenv("CCA_RETRIEVAL", "True").lower() == "true",
+    "embed_model": os.getenv("CCA_EMBED_MODEL", "nomic-embed-text"),
+    "embed_batch_size": int(os.getenv("CCA_EMBED_BATCH_SIZE", "64")),
+    "embedding_cache_max_bytes": int(
+        os.getenv("CCA_EMBEDDING_CACHE_MAX_BYTES", 512 * 2**20)
+    ),
+    "vector_dir": os.path.expanduser(
+        os.getenv("CCA_VECTOR_DIR", "~/.cache/cca-mcp/vectors")
+    ),
+    "vector_max_bytes": int(os.getenv("CCA_VECTOR_MAX_BYTES", 2**30)),
+    "metrics_recent_spans": int(os.getenv("CCA_METRICS_RECENT_SPANS", "200")),
 }
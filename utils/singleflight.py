@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ProgressCallback = Callable[[float, Optional[float], Optional[str]], Awaitable[None]]
+
+
+@dataclass
+class _Call:
+    task: Optional[asyncio.Task] = None
+    subscribers: List[ProgressCallback] = field(default_factory=list)
+    last_progress: Optional[Tuple[float, Optional[float], Optional[str]]] = None
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one shared job.
+
+    The first caller starts the job; later callers await the same task.
+    Every caller passes its own progress callback, and progress reported by
+    the job is mirrored to all of them (late joiners first receive the most
+    recent update). A caller that is cancelled only detaches itself; the
+    shared job is cancelled once every waiter has gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[ProgressCallback], Awaitable[Any]],
+        progress: Optional[ProgressCallback] = None,
+    ) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call()
+
+            async def publish(
+                value: float,
+                total: Optional[float] = None,
+                message: Optional[str] = None,
+            ) -> None:
+                call.last_progress = (value, total, message)
+                for subscriber in list(call.subscribers):
+                    try:
+                        await subscriber(value, total, message)
+                    except Exception as e:
+                        # A disconnected client must not break the shared job
+                        logger.debug(f"Progress subscriber failed: {str(e)}")
+
+            self._calls[key] = call
+            call.task = asyncio.create_task(fn(publish))
+            call.task.add_done_callback(lambda task: self._done(key, call, task))
+        else:
+            logger.info(f"Joining in-flight job {key}")
+
+        call.waiters += 1
+        try:
+            if progress:
+                if call.last_progress:
+                    await progress(*call.last_progress)
+                call.subscribers.append(progress)
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if progress in call.subscribers:
+                call.subscribers.remove(progress)
+            if call.waiters == 0 and not call.task.done():
+                logger.info(f"All waiters left, cancelling job {key}")
+                call.task.cancel()
+                # New callers must start afresh rather than join a dying job
+                self._forget(key, call)
+
+    def _done(self, key: str, call: _Call, task: asyncio.Task) -> None:
+        self._forget(key, call)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter left
+            task.exception()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
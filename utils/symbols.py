@@ -0,0 +1,473 @@
+import bisect
+import difflib
+import heapq
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.cache import get_store
+from utils.metrics import metrics
+from utils.settings import DEFAULT_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MODULE, CLASS, METHOD, FUNCTION, CONSTANT, IMPORT = range(6)
+KIND_NAMES = ("module", "class", "method", "function", "constant", "import")
+# Kinds that are definitions, as opposed to import statements
+SYMBOL_KINDS = KIND_NAMES[:IMPORT]
+
+# One parsed symbol, as produced by utils.parsers and stored in the parse
+# cache: [kind, name, parent, line, sig, doc, bases]. parent is the row
+# index of the enclosing class within the same module, or -1. Import rows
+# hold the imported module in name and the imported names in bases.
+Row = List[Any]
+
+# String id 0 stands for "absent" (None), as opposed to an empty string
+ABSENT = 0
+
+# Bump when the serialized layout of SymbolTable changes
+FORMAT_VERSION = 2
+
+# Order of kinds among equally good matches
+KIND_RANK = {CLASS: 0, FUNCTION: 1, METHOD: 2, CONSTANT: 3, MODULE: 4, IMPORT: 5}
+
+# Names scored with difflib per fuzzy query, picked by shared trigrams
+FUZZY_CANDIDATES = 200
+
+
+def _trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class SymbolTable:
+    """
+    Columnar store of every parsed symbol of one analysis.
+
+    Each symbol is one position in a set of parallel arrays (file, kind,
+    name, parent, line, sig, doc, bases); every string is interned once in
+    a shared pool and referenced by id. Symbols are appended module by
+    module, with a class's methods right after it, so children are a
+    contiguous range. This replaces one nested dict per file, which was the
+    largest per-request allocation in the server.
+    """
+
+    __slots__ = (
+        "strings",
+        "_ids",
+        "file",
+        "kind",
+        "name",
+        "parent",
+        "line",
+        "sig",
+        "doc",
+        "bases",
+        "module_ids",
+        "errors",
+        "_names",
+        "_sorted_names",
+        "_grams",
+        "_paths",
+        "derived",
+    )
+
+    def __init__(self):
+        self.strings: List[Optional[str]] = [None]
+        self._ids: Dict[str, int] = {}
+        self.file = array("I")
+        self.kind = array("B")
+        self.name = array("I")
+        self.parent = array("i")
+        self.line = array("I")
+        self.sig = array("I")
+        self.doc = array("I")
+        self.bases = array("I")
+        # Symbol id of every module, in analysis order
+        self.module_ids = array("I")
+        self.errors: Dict[int, str] = {}
+        # Lookup structures, built on the first query
+        self._names: Optional[Dict[str, List[int]]] = None
+        self._sorted_names: List[str] = []
+        self._grams: Optional[Dict[str, List[int]]] = None
+        self._paths: Optional[Dict[str, int]] = None
+        # Indexes other modules derive from the table (e.g. the import
+        # graph), cached with it; they must not depend on module paths
+        self.derived: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def intern(self, text: Optional[str]) -> int:
+        if text is None:
+            return ABSENT
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = self._ids[text] = len(self.strings)
+            self.strings.append(text)
+        return string_id
+
+    def add_module(
+        self, path: str, rows: List[Row], error: Optional[str] = None
+    ) -> int:
+        """Append one module and its symbol rows; returns the module's id."""
+        module_id = len(self.kind)
+        file_id = self.intern(path)
+        self._append(file_id, MODULE, os.path.basename(path), -1, 0, None, None, None)
+        self.module_ids.append(module_id)
+        if error is not None:
+            self.errors[module_id] = error
+        for kind, name, parent, line, sig, doc, bases in rows:
+            self._append(
+                file_id,
+                kind,
+                name,
+                module_id if parent < 0 else module_id + 1 + parent,
+                line or 0,
+                sig,
+                doc,
+                "\0".join(bases) if bases is not None else None,
+            )
+        return module_id
+
+    def _append(
+        self,
+        file_id: int,
+        kind: int,
+        name: str,
+        parent: int,
+        line: int,
+        sig: Optional[str],
+        doc: Optional[str],
+        bases: Optional[str],
+    ) -> None:
+        self.file.append(file_id)
+        self.kind.append(kind)
+        self.name.append(self.intern(name))
+        self.parent.append(parent)
+        self.line.append(line)
+        self.sig.append(self.intern(sig))
+        self.doc.append(self.intern(doc))
+        self.bases.append(self.intern(bases))
+
+    # Accessors
+
+    def path(self, symbol: int) -> str:
+        return self.strings[self.file[symbol]]
+
+    def symbol_name(self, symbol: int) -> str:
+        return self.strings[self.name[symbol]]
+
+    def symbol_sig(self, symbol: int) -> Optional[str]:
+        return self.strings[self.sig[symbol]]
+
+    def symbol_doc(self, symbol: int) -> Optional[str]:
+        return self.strings[self.doc[symbol]]
+
+    def symbol_bases(self, symbol: int) -> List[str]:
+        bases = self.strings[self.bases[symbol]]
+        return bases.split("\0") if bases else []
+
+    def modules(self) -> Iterator[int]:
+        return iter(self.module_ids)
+
+    def module_paths(self) -> List[str]:
+        return [self.path(module) for module in self.module_ids]
+
+    def members(self, symbol: int, kind: Optional[int] = None) -> Iterator[int]:
+        """Direct children of a module or class, optionally of one kind."""
+        kinds, parents = self.kind, self.parent
+        # A class's methods directly follow it; a module ends at the next one
+        stop = (METHOD,) if kinds[symbol] == CLASS else None
+        for child in range(symbol + 1, len(kinds)):
+            if kinds[child] == MODULE or (stop and kinds[child] not in stop):
+                break
+            if parents[child] == symbol and (kind is None or kinds[child] == kind):
+                yield child
+
+    def count(self, kind: int) -> int:
+        return self.kind.count(kind)
+
+    def record(self, symbol: int) -> Dict[str, Any]:
+        """One symbol as a plain dict, for query responses."""
+        kind = self.kind[symbol]
+        record = {
+            "kind": KIND_NAMES[kind],
+            "name": self.symbol_name(symbol),
+            "path": self.path(symbol),
+            "line": self.line[symbol] or None,
+        }
+        if kind in (METHOD, CLASS):
+            parent = self.parent[symbol]
+            if self.kind[parent] == CLASS:
+                record["parent"] = self.symbol_name(parent)
+        if self.sig[symbol]:
+            record["sig"] = self.symbol_sig(symbol)
+        if self.doc[symbol]:
+            record["doc"] = self.symbol_doc(symbol)
+        if kind == CLASS:
+            record["bases"] = self.symbol_bases(symbol)
+        elif kind == IMPORT:
+            record["names"] = self.symbol_bases(symbol)
+        return record
+
+    def module_symbols(self, module: int) -> range:
+        """Every symbol of a module, after the module itself, in table order."""
+        end = module + 1
+        while end < len(self.kind) and self.kind[end] != MODULE:
+            end += 1
+        return range(module + 1, end)
+
+    def module(self, path: str) -> Optional[int]:
+        """The module with the given path, if it was analyzed."""
+        if self._paths is None:
+            self._paths = {self.path(module): module for module in self.module_ids}
+        return self._paths.get(path)
+
+    def find(
+        self, query: str, kind: Optional[int] = None, limit: int = 20
+    ) -> List[Tuple[int, str]]:
+        """
+        Symbols whose name matches query, best first, as (symbol, match)
+        pairs. Matching is case-insensitive: exact names, then prefixes,
+        then substrings, until limit symbols are found; fuzzy matches are
+        only tried when none of those match. Within a tier, exact-case
+        names, then classes and functions, come first. "Owner.name" only
+        matches members of a class or module named Owner.
+        """
+        if self._names is None:
+            self._build_names()
+        query = query.strip()
+        owner = None
+        if query.lower() not in self._names and "." in query.strip("."):
+            owner, query = query.rsplit(".", 1)
+        needle = query.lower()
+        if not needle:
+            return []
+
+        def accept(symbol: int) -> bool:
+            if kind is not None and self.kind[symbol] != kind:
+                return False
+            if owner is None:
+                return True
+            parent = self.parent[symbol]
+            return parent >= 0 and self.symbol_name(parent).lower() == owner.lower()
+
+        found: List[Tuple[int, str]] = []
+        for tier, names in self._candidates(needle, limit):
+            symbols = [
+                symbol
+                for name in names
+                for symbol in self._names[name]
+                if accept(symbol)
+            ]
+            if tier != "fuzzy":
+                symbols.sort(
+                    key=lambda symbol: (
+                        self.symbol_name(symbol) != query,
+                        KIND_RANK[self.kind[symbol]],
+                        self.path(symbol),
+                        self.line[symbol],
+                    )
+                )
+            for symbol in symbols:
+                found.append((symbol, tier))
+                if len(found) >= limit:
+                    return found
+            if tier == "substring" and found:
+                break
+        return found
+
+    def _candidates(self, needle: str, limit: int) -> Iterator[Tuple[str, List[str]]]:
+        """Lower-cased names per match tier, computed only when reached."""
+        yield "exact", [needle] if needle in self._names else []
+        names = self._sorted_names
+        start = bisect.bisect_left(names, needle)
+        end = bisect.bisect_left(names, needle + "\uffff", start)
+        yield "prefix", [name for name in names[start:end] if name != needle]
+        yield "substring", [
+            name for name in names if needle in name[1:] and not name.startswith(needle)
+        ]
+        # Score only the names sharing the most trigrams with the query
+        if self._grams is None:
+            self._grams = {}
+            for index, name in enumerate(names):
+                for gram in _trigrams(name):
+                    self._grams.setdefault(gram, []).append(index)
+        shared: Dict[int, int] = {}
+        for gram in _trigrams(needle):
+            for index in self._grams.get(gram, ()):
+                shared[index] = shared.get(index, 0) + 1
+        best = heapq.nlargest(FUZZY_CANDIDATES, shared, key=shared.__getitem__)
+        yield "fuzzy", difflib.get_close_matches(
+            needle, [names[index] for index in best], n=limit, cutoff=0.6
+        )
+
+    def _build_names(self) -> None:
+        names: Dict[str, List[int]] = {}
+        kinds = self.kind
+        for symbol, name_id in enumerate(self.name):
+            if kinds[symbol] != IMPORT:
+                names.setdefault(self.strings[name_id].lower(), []).append(symbol)
+        self._names = names
+        self._sorted_names = sorted(names)
+        self._grams = None
+
+    def relative_to(self, root: str) -> "SymbolTable":
+        """
+        A copy whose module paths are relative to root, with "/" separators,
+        so the table outlives the checkout it was parsed from.
+        """
+        table = SymbolTable()
+        table.strings = list(self.strings)
+        table._ids = dict(self._ids)
+        for file_id in set(self.file):
+            path = os.path.relpath(self.strings[file_id], root).replace(os.sep, "/")
+            table._ids.pop(table.strings[file_id], None)
+            table.strings[file_id] = path
+            table._ids[path] = file_id
+        for column in self._columns() + ("module_ids",):
+            setattr(
+                table,
+                column,
+                array(getattr(self, column).typecode, getattr(self, column)),
+            )
+        table.errors = dict(self.errors)
+        table.derived = dict(self.derived)
+        return table
+
+    def to_bytes(self) -> bytes:
+        """Serialize the table; arrays are stored in native byte order."""
+        encoded = [text.encode("utf-8", "surrogatepass") for text in self.strings[1:]]
+        header = json.dumps(
+            {
+                "version": FORMAT_VERSION,
+                "symbols": len(self),
+                "modules": len(self.module_ids),
+                "strings": len(encoded),
+                "errors": {str(k): v for k, v in self.errors.items()},
+            }
+        ).encode("utf-8")
+        parts = [struct.pack("<I", len(header)), header]
+        parts.extend(getattr(self, column).tobytes() for column in self._columns())
+        parts.append(self.module_ids.tobytes())
+        parts.append(array("I", map(len, encoded)).tobytes())
+        parts.extend(encoded)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SymbolTable":
+        (header_size,) = struct.unpack_from("<I", data)
+        offset = 4 + header_size
+        header = json.loads(data[4:offset])
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported symbol table version {header['version']}")
+
+        table = cls()
+        view = memoryview(data)
+
+        def read(column: array, count: int) -> None:
+            nonlocal offset
+            size = column.itemsize * count
+            column.frombytes(view[offset : offset + size])
+            offset += size
+
+        for column in cls._columns():
+            read(getattr(table, column), header["symbols"])
+        read(table.module_ids, header["modules"])
+        lengths = array("I")
+        read(lengths, header["strings"])
+        for length in lengths:
+            text = str(view[offset : offset + length], "utf-8", "surrogatepass")
+            table._ids[text] = len(table.strings)
+            table.strings.append(text)
+            offset += length
+        table.errors = {int(k): v for k, v in header["errors"].items()}
+        return table
+
+    @staticmethod
+    def _columns() -> Tuple[str, ...]:
+        return ("file", "kind", "name", "parent", "line", "sig", "doc", "bases")
+
+    def nbytes(self) -> Tuple[int, int]:
+        """(bytes held by the columns, characters held by the string pool)."""
+        columns = sum(
+            getattr(self, column).itemsize * len(getattr(self, column))
+            for column in self._columns()
+        )
+        return columns, sum(len(text) for text in self.strings[1:])
+
+
+class SymbolIndex:
+    """
+    Per-commit symbol tables of analyzed repositories, so symbol queries
+    never re-clone or re-parse. Tables are persisted in the disk cache and
+    the most recently used ones are kept loaded in memory.
+    """
+
+    def __init__(self, max_tables: Optional[int] = None):
+        self.max_tables = max_tables or DEFAULT_CONFIG["symbol_index_memory_tables"]
+        self.tables: "OrderedDict[str, SymbolTable]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _store():
+        return get_store("symbols", max_bytes=DEFAULT_CONFIG["symbol_index_max_bytes"])
+
+    def get(self, key: str) -> Optional[SymbolTable]:
+        table = self._get(key)
+        metrics.cache_result("symbols", table is not None)
+        return table
+
+    def _get(self, key: str) -> Optional[SymbolTable]:
+        with self._lock:
+            table = self.tables.get(key)
+            if table is not None:
+                self.tables.move_to_end(key)
+                return table
+
+        store = self._store()
+        entry = store.get_entry(key) if store is not None else None
+        if entry is None:
+            return None
+        try:
+            table = SymbolTable.from_bytes(zlib.decompress(entry[0]))
+        except (ValueError, zlib.error, struct.error) as e:
+            logger.warning(f"Discarding unreadable symbol table {key}: {str(e)}")
+            store.delete(key)
+            return None
+        self._remember(key, table)
+        return table
+
+    def set(self, key: str, table: SymbolTable, repo: Optional[str] = None) -> None:
+        self._remember(key, table)
+        store = self._store()
+        if store is not None:
+            store.set_raw(key, zlib.compress(table.to_bytes()), repo=repo)
+
+    def _remember(self, key: str, table: SymbolTable) -> None:
+        with self._lock:
+            self.tables[key] = table
+            self.tables.move_to_end(key)
+            while len(self.tables) > self.max_tables:
+                self.tables.popitem(last=False)
+
+    def clear_repository(self, repo: str) -> int:
+        """Drop every table of a (normalized) repository URL."""
+        with self._lock:
+            # Loaded tables are not tracked per repository; reload lazily
+            self.tables.clear()
+        store = self._store()
+        return store.delete_repository(repo) if store is not None else 0
+
+    def clear(self) -> int:
+        with self._lock:
+            self.tables.clear()
+        store = self._store()
+        return store.clear() if store is not None else 0